@@ -1,27 +1,79 @@
 import streamlit as st
 import os
 import asyncio
+import contextvars
 
 # Local module imports
 from modules.bot import Bot
-from modules.agent import Agent, create_agent, preview_agent, on_message, overview
-from modules.ingestion import ingest
-from modules.constants import OVERVIEW_FILEPATH
-from modules.utils import load_single_document
+from modules.agent import Agent, create_agent, preview_agent, on_message_stream
+from modules.ingest_jobs import get_ingest_service
+from modules.constants import PIPELINE_MODES, SUPPORTED_MODELS, TELEMETRY_METRICS_PORT
+from modules import telemetry
 
-def upload_documents(bot: Bot, file_paths):
-    """Copy files to bot.source_dir and call ingest."""
+def upload_documents(bot: Bot, file_paths) -> str:
+    """Copy files to bot.source_dir and queue a background ingestion; returns the job id."""
     import shutil
     for file_path in file_paths:
         filename = os.path.basename(file_path)
         dest_path = os.path.join(bot.source_dir, filename)
         shutil.copy(file_path, dest_path)
     print("Uploading Complete")
-    ingest(bot.db_dir, bot.source_dir)
-    print("Ingestion Complete")
+    return get_ingest_service().submit(bot.bot_id, bot.db_dir, bot.source_dir)
+
+@st.fragment(run_every=1.0)
+def show_ingest_job():
+    """Progress of the background ingestion job, refreshed every second without rerunning the page."""
+    job_id = st.session_state.get("ingest_job")
+    if job_id is None:
+        return
+    service = get_ingest_service()
+    job = service.get(job_id)
+    if job["status"] in ("queued", "running"):
+        st.progress(min(job["progress"], 1.0))
+        st.caption(
+            f"Ingestion {job['status']}: {job['files_done']}/{job['files_total']} files, "
+            f"{job['chunks']} chunks · {job['files_per_s']:.2f} files/s, "
+            f"{job['chunks_per_s']:.1f} chunks/s, {job['embeddings_per_s']:.1f} embeddings/s"
+        )
+        if job["cancel_requested"]:
+            st.caption("Cancelling after the current file...")
+        elif st.button("Cancel Ingestion"):
+            service.cancel(job_id)
+        return
+    # Rerun the page without this fragment, which stops the polling, and show the outcome once
+    del st.session_state["ingest_job"]
+    st.session_state["ingest_result"] = job
+    st.rerun()
+
+def show_ingest_result(job):
+    """The outcome of a finished ingestion job."""
+    if job["status"] == "done":
+        st.success(f"Files ingested successfully! ({job['files_done']} files, {job['chunks']} chunks "
+                   f"in {job['elapsed']:.1f}s)")
+    elif job["status"] == "failed":
+        st.error(f"Ingestion failed: {job['error']}")
+    else:
+        st.warning("Ingestion cancelled.")
+
+def iterate_events(events):
+    """Drive an async event generator from Streamlit's synchronous script run."""
+    loop = asyncio.new_event_loop()
+    # One context for every step, so telemetry spans opened in one step are still current in the next
+    context = contextvars.copy_context()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(loop.create_task(events.__anext__(), context=context))
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(loop.create_task(events.aclose(), context=context))
+        loop.close()
 
 def main():
     st.title("RAG Agent Demo")
+    if telemetry.enabled and TELEMETRY_METRICS_PORT:
+        telemetry.start_metrics_server(TELEMETRY_METRICS_PORT)
 
     if "bot" not in st.session_state:
         st.session_state["bot"] = Bot()
@@ -33,7 +85,8 @@ def main():
         agent_description = st.text_input("Agent Description", value="RAG agent for Corpotatica.")
         agent_starter = 'Hello! How can I assist you today?'
 
-        model_name = st.selectbox("Model Name", options=["llama3"], index=0)
+        model_name = st.selectbox("Model Name", options=SUPPORTED_MODELS, index=0)
+        pipeline = st.selectbox("Pipeline", options=PIPELINE_MODES, index=0)
 
         create_button = st.button("Create / Load Agent")
 
@@ -49,7 +102,8 @@ def main():
             name=agent_name,
             description=agent_description,
             starter=agent_starter,
-            model=model_name
+            model=model_name,
+            pipeline=pipeline
         )
         asyncio.run(create_agent(new_agent))
         st.success(f"Agent {new_agent.name} created with ID: {new_agent.bot_id}")
@@ -71,8 +125,14 @@ def main():
             with open(file_path, "wb") as f:
                 f.write(file.read())
             local_file_paths.append(file_path)
-        upload_documents(st.session_state["bot"], local_file_paths)
-        st.success("Files ingested successfully!")
+        st.session_state.pop("ingest_result", None)
+        st.session_state["ingest_job"] = upload_documents(st.session_state["bot"], local_file_paths)
+
+    # Ingestion runs in the background, the page only polls it and can be rerun meanwhile
+    if "ingest_job" in st.session_state:
+        show_ingest_job()
+    elif "ingest_result" in st.session_state:
+        show_ingest_result(st.session_state.pop("ingest_result"))
 
     st.write("---")
     st.header("Chat")
@@ -80,13 +140,24 @@ def main():
 
     if st.button("Ask"):
         if user_question.strip():
-            response_data = asyncio.run(on_message(st.session_state["bot"].bot_id, user_question))
             st.write("### Bot Response")
-            st.write(response_data["response"])
-            if response_data["sources"]:
-                with st.expander("Sources"):
-                    for idx, src in enumerate(response_data["sources"], start=1):
-                        st.write(f"**Source {idx}:**\n\n{src[:400]} ...")
+            status = st.empty()
+            answer_box = st.empty()
+            answer = ""
+            events = on_message_stream(st.session_state["bot"].bot_id, user_question)
+            for event in iterate_events(events):
+                if event["type"] == "status":
+                    status.caption(f"{event['stage'].capitalize()}...")
+                elif event["type"] == "token":
+                    answer += event["content"]
+                    answer_box.markdown(answer + "▌")
+                elif event["type"] == "done":
+                    status.caption(" · ".join(f"{stage} {seconds:.2f}s" for stage, seconds in event["timings"].items()))
+                    answer_box.markdown(event["response"])
+                    if event["sources"]:
+                        with st.expander("Sources"):
+                            for idx, preview in enumerate(event["sources"], start=1):
+                                st.write(f"**Source {idx}:**\n\n{preview} ...")
         else:
             st.warning("Please enter a question before asking.")
 
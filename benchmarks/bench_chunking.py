@@ -0,0 +1,73 @@
+"""
+Compare the original chunking (SemanticChunker, then RecursiveCharacterTextSplitter,
+then embedding every chunk) with Chunker in 'semantic' mode (sentence embeddings
+pooled into chunk embeddings) and 'fast' mode (token-sized chunks, embedded once),
+against a local stub embedding server.
+
+Documents are the pages of the bundled attentionisyouallyouneed.pdf, cleaned like
+ingest does, repeated --copies times.
+
+    python -m benchmarks.bench_chunking --copies 5
+"""
+import time
+import argparse
+
+import fitz
+from langchain_ollama import OllamaEmbeddings
+from langchain_experimental.text_splitter import SemanticChunker
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.docstore.document import Document
+
+from modules import constants
+from modules.chunking import Chunker
+from modules.utils import clean_text
+from benchmarks.stub_ollama import StubOllamaServer
+
+
+def load_pages(path: str, copies: int):
+    pages = [clean_text(page.get_text()) for page in fitz.open(path)]
+    return [Document(page_content=text, metadata={'source': path, 'page': i}) for _ in range(copies)
+            for i, text in enumerate(pages)]
+
+
+def original(documents, embeddings):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=constants.CHUNK_SIZE, chunk_overlap=constants.CHUNK_OVERLAP)
+    chunks = splitter.split_documents(SemanticChunker(embeddings).split_documents(documents))
+    embeddings.embed_documents([chunk.page_content for chunk in chunks])
+    return chunks
+
+
+def chunker(mode: str):
+    def run(documents, embeddings):
+        chunks, vectors = Chunker(mode, embeddings).split_documents(documents)
+        if vectors is None:
+            embeddings.embed_documents([chunk.page_content for chunk in chunks])
+        return chunks
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdf', default='attentionisyouallyouneed.pdf')
+    parser.add_argument('--copies', type=int, default=5)
+    args = parser.parse_args()
+
+    documents = load_pages(args.pdf, args.copies)
+    print(f"{len(documents)} pages, {sum(len(d.page_content) for d in documents)} characters")
+    print(f"{'path':<32} {'seconds':>8} {'chunks':>7} {'avg chars':>10} {'requests':>9} {'embedded':>9}")
+    with StubOllamaServer(dim=256) as server:
+        embeddings = OllamaEmbeddings(model='stub', base_url=server.url)
+        for label, run in [('semantic chunker + recursive', original),
+                           ('Chunker semantic (pooled)', chunker('semantic')),
+                           ('Chunker fast (tokens)', chunker('fast'))]:
+            requests, sent = server.requests, server.texts
+            start = time.perf_counter()
+            chunks = run(documents, embeddings)
+            seconds = time.perf_counter() - start
+            avg_chars = sum(len(c.page_content) for c in chunks) / max(len(chunks), 1)
+            print(f"{label:<32} {seconds:8.2f} {len(chunks):7d} {avg_chars:10.0f} "
+                  f"{server.requests - requests:9d} {server.texts - sent:9d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare plain OllamaEmbeddings with BatchedEmbeddings (cold and warm cache)
+against a local stub embedding server.
+
+    python -m benchmarks.bench_embeddings --texts 5000 --duplicates 0.3
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from langchain_ollama import OllamaEmbeddings
+
+from modules.embeddings import BatchedEmbeddings
+from benchmarks.stub_ollama import StubOllamaServer
+
+
+def make_texts(count: int, duplicates: float, seed: int = 0):
+    rng = random.Random(seed)
+    unique = [f"sentence {i} about topic {rng.randint(0, 100)}" for i in range(int(count * (1 - duplicates)) or 1)]
+    return [unique[i] if i < len(unique) else rng.choice(unique) for i in range(count)]
+
+
+def timed(label: str, server: StubOllamaServer, fn, texts):
+    requests, sent = server.requests, server.texts
+    start = time.perf_counter()
+    fn(texts)
+    seconds = time.perf_counter() - start
+    print(f"{label:<28} {seconds:8.2f}s {len(texts) / seconds:10.0f} texts/s "
+          f"{server.requests - requests:6d} requests {server.texts - sent:7d} embedded")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--texts', type=int, default=5000)
+    parser.add_argument('--duplicates', type=float, default=0.3)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts, args.duplicates)
+    with StubOllamaServer() as server, tempfile.TemporaryDirectory() as tmp:
+        plain = OllamaEmbeddings(model='stub', base_url=server.url)
+        timed('ollama, one text per call', server, lambda t: [plain.embed_query(x) for x in t], texts)
+        timed('ollama, single request', server, plain.embed_documents, texts)
+
+        batched = BatchedEmbeddings('stub', batch_size=args.batch_size, max_concurrency=args.concurrency,
+                                    cache_path=os.path.join(tmp, 'cache.sqlite3'), base_url=server.url)
+        timed('batched, cold cache', server, batched.embed_documents, texts)
+        timed('batched, warm cache', server, batched.embed_documents, texts)
+
+
+if __name__ == '__main__':
+    main()
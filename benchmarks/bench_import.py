@@ -0,0 +1,71 @@
+"""
+Import-time report: how long a fresh interpreter takes to import what app.py and
+the HTTP server import, and which packages that time goes to (python -X importtime).
+
+Heavy packages (langchain, Chroma, torch, ...) should only show up once a request
+needs them, so they are listed separately when an import pulls them in.
+
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import modules.ingestion --top 20
+"""
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+# What app.py imports besides streamlit, and the HTTP server
+TARGETS = {
+    'app': 'modules.bot, modules.agent, modules.ingest_jobs, modules.constants, modules.telemetry',
+    'server': 'modules.server',
+}
+HEAVY_PACKAGES = ('langchain', 'langchain_core', 'langchain_community', 'langchain_ollama', 'chromadb',
+                  'torch', 'sentence_transformers', 'numpy', 'jinja2', 'fitz')
+
+
+def import_times(modules: str) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Wall seconds to import modules in a fresh interpreter, and (module, self us, cumulative us) rows."""
+    code = f"import time; start = time.perf_counter(); import {modules}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return float(result.stdout.strip()), rows
+
+
+def by_package(rows: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for name, self_us, _ in rows:
+        package = name.split('.')[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return totals
+
+
+def report(label: str, modules: str, top: int):
+    seconds, rows = import_times(modules)
+    packages = by_package(rows)
+    print(f"\n{label}: import {modules}")
+    print(f"  {seconds * 1000:.0f} ms wall, {len(rows)} modules imported")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {package:<28} {self_us / 1000:8.1f} ms")
+    heavy = [package for package in HEAVY_PACKAGES if package in packages]
+    print(f"  heavy packages imported: {', '.join(heavy) if heavy else 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('modules', nargs='*', help="modules to import instead of the app and server sets")
+    parser.add_argument('--top', type=int, default=10, help="packages to list, by import time")
+    args = parser.parse_args()
+
+    targets = {name: name for name in args.modules} if args.modules else TARGETS
+    for label, modules in targets.items():
+        report(label, modules, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Prefill tokens per answered question with the 'classic' and 'prefix_cache' prompt
+layouts (PROMPT_LAYOUT).
+
+Ollama keeps the evaluated prompt of a loaded model and only evaluates what follows
+the longest prefix the next prompt shares with it. Without a server, that cache is
+simulated here over an approximate tokenization (words and punctuation with their
+leading whitespace); with --ollama MODEL the prompts are sent to a running Ollama
+server and its prompt_eval_count is reported instead.
+
+Each question runs the calls of a pipeline: 'sequential' routes, checks relevancy and
+answers; 'fast' routes and answers in one call. The documents are the 4 chunks of
+the bundled attentionisyouallyouneed.pdf sharing most words with the question.
+
+    python -m benchmarks.bench_prompt_prefix
+    python -m benchmarks.bench_prompt_prefix --ollama llama3
+"""
+import re
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+
+from modules import constants
+from modules.templates import Prompts
+from modules.utils import clean_text
+
+QUESTIONS = [
+    "what is multi-head attention",
+    "how are positional encodings computed",
+    "which optimizer and learning rate schedule were used",
+    "bleu score on english to german translation",
+    "why use self-attention instead of recurrence",
+    "what is the dimension of the feed-forward layers",
+]
+TOKEN_PATTERN = re.compile(r"\s*\w+|\s*[^\w\s]|\s+")
+
+
+def load_chunks(path: str, size: int = constants.CHUNK_SIZE) -> List[str]:
+    text = clean_text(' '.join(page.get_text() for page in fitz.open(path)))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def top_chunks(chunks: List[str], question: str, k: int = 4) -> str:
+    words = set(question.split())
+    ranked = sorted(chunks, key=lambda chunk: len(words & set(chunk.split())), reverse=True)
+    return '\n'.join(ranked[:k])
+
+
+def pipeline_calls(prompts: Prompts, pipeline: str, context: str, question: str) -> List[Tuple[str, str]]:
+    calls = [('routing', prompts.route_query.format(query=question))]
+    if pipeline == 'fast':
+        calls.append(('answer', prompts.answer_or_clarify.format(context=context, query=question)))
+    else:
+        calls.append(('relevancy', prompts.sort_relevancy.format(context=context, query=question)))
+        calls.append(('answer', prompts.qa_from_docs.format(context=context, query=question)))
+    return calls
+
+
+class SimulatedPrefixCache:
+    """The cache of one Ollama slot: the tokens of the previous prompt."""
+    def __init__(self) -> None:
+        self.cached: List[str] = []
+
+    def prefill(self, prompt: str) -> Tuple[int, int]:
+        """(prompt tokens, tokens evaluated) for the next request."""
+        tokens = TOKEN_PATTERN.findall(prompt)
+        reused = 0
+        for cached, token in zip(self.cached, tokens):
+            if cached != token:
+                break
+            reused += 1
+        self.cached = tokens
+        return len(tokens), len(tokens) - reused
+
+
+class OllamaPrefill:
+    """Sends each prompt to Ollama and reads back how many prompt tokens it evaluated."""
+    def __init__(self, model: str) -> None:
+        from ollama import Client
+        self.client = Client()
+        self.model = model
+
+    def prefill(self, prompt: str) -> Tuple[int, int]:
+        response = self.client.generate(model=self.model, prompt=prompt, keep_alive=constants.OLLAMA_KEEP_ALIVE,
+                                        options={'num_ctx': constants.OLLAMA_NUM_CTX, 'num_predict': 8})
+        evaluated = response.get('prompt_eval_count') or 0
+        return len(TOKEN_PATTERN.findall(prompt)), evaluated
+
+
+def run(layout: str, pipeline: str, chunks: List[str], ollama_model: Optional[str]) -> Dict[str, List[int]]:
+    prompts = Prompts('llama3', layout)
+    cache = OllamaPrefill(ollama_model) if ollama_model else SimulatedPrefixCache()
+    totals: Dict[str, List[int]] = {}
+    for question in QUESTIONS:
+        context = top_chunks(chunks, question)
+        for stage, prompt in pipeline_calls(prompts, pipeline, context, question):
+            tokens, evaluated = cache.prefill(prompt)
+            stage_totals = totals.setdefault(stage, [0, 0])
+            stage_totals[0] += tokens
+            stage_totals[1] += evaluated
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdf', default='attentionisyouallyouneed.pdf')
+    parser.add_argument('--ollama', metavar='MODEL', help="measure with a running Ollama server instead of simulating")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.pdf)
+    source = f"Ollama ({args.ollama})" if args.ollama else "simulated prefix cache"
+    print(f"{len(QUESTIONS)} questions, 4 chunks of {constants.CHUNK_SIZE} characters each, {source}")
+    for pipeline in ('sequential', 'fast'):
+        print(f"\n{pipeline:<12} {'layout':<14} {'stage':<10} {'prompt tok':>10} {'prefilled':>10} {'reused':>7}")
+        for layout in constants.PROMPT_LAYOUTS:
+            totals = run(layout, pipeline, chunks, args.ollama)
+            totals['total'] = [sum(t[0] for t in totals.values()), sum(t[1] for t in totals.values())]
+            for stage, (tokens, evaluated) in totals.items():
+                reused = 1 - evaluated / tokens if tokens else 0.0
+                print(f"{'':<12} {layout:<14} {stage:<10} {tokens:>10} {evaluated:>10} {reused:>7.0%}")
+
+
+if __name__ == '__main__':
+    main()
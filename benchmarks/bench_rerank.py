@@ -0,0 +1,109 @@
+"""
+Compare the original reranking path (CrossEncoder.predict on every candidate, fp32)
+with RerankEngine (batched, optional int8, score cache) at k = 10, 25 and 50.
+
+Passages are chunks of the bundled attentionisyouallyouneed.pdf. Quality is measured
+against the original path: overlap of the top 4 (what on_message keeps) and
+Kendall's tau over the full ranking.
+
+    python -m benchmarks.bench_rerank --batch-size 16 --threads 8
+"""
+import time
+import argparse
+import statistics
+
+import fitz
+from sentence_transformers import CrossEncoder
+from langchain.docstore.document import Document
+
+from modules import constants
+from modules.reranking import RerankEngine, ScoreCache, quantize_int8, set_rerank_threads
+
+QUERIES = [
+    "what is multi-head attention",
+    "how are positional encodings computed",
+    "which optimizer and learning rate schedule were used",
+    "bleu score on english to german translation",
+    "why use self-attention instead of recurrence",
+    "what is the dimension of the feed-forward layers",
+]
+
+
+def load_passages(path: str, size: int = 500):
+    text = ' '.join(page.get_text() for page in fitz.open(path))
+    return [
+        Document(page_content=text[i:i + size], metadata={'chunk_id': f"chunk-{i // size}"})
+        for i in range(0, len(text), size)
+    ]
+
+
+def kendall_tau(reference, other) -> float:
+    position = {key: i for i, key in enumerate(other)}
+    pairs = concordant = 0
+    for i in range(len(reference)):
+        for j in range(i + 1, len(reference)):
+            pairs += 1
+            concordant += position[reference[i]] < position[reference[j]]
+    return (2 * concordant - pairs) / pairs if pairs else 1.0
+
+
+def baseline(model, query, docs):
+    scores = model.predict([(query, doc.page_content) for doc in docs])
+    return sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)
+
+
+def run(label, fn, reference, k):
+    latencies, overlaps, taus = [], [], []
+    for query, docs in reference:
+        start = time.perf_counter()
+        ranked = fn(query, docs)
+        latencies.append(time.perf_counter() - start)
+        keys = [doc.metadata['chunk_id'] for doc, _ in ranked]
+        ref_keys = reference[(query, docs)]
+        overlaps.append(len(set(keys[:4]) & set(ref_keys[:4])) / 4)
+        # Truncated rankings are compared on the documents they kept
+        kept = [key for key in ref_keys if key in set(keys)]
+        taus.append(kendall_tau(kept, keys))
+    latencies.sort()
+    print(f"k={k:<3} {label:<26} p50 {statistics.median(latencies) * 1000:8.1f}ms "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:8.1f}ms "
+          f"top4 overlap {statistics.mean(overlaps):.2f} kendall tau {statistics.mean(taus):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdf', default='attentionisyouallyouneed.pdf')
+    parser.add_argument('--batch-size', type=int, default=constants.RERANK_BATCH_SIZE)
+    parser.add_argument('--threads', type=int, default=constants.RERANK_THREADS)
+    parser.add_argument('--max-candidates', type=int, default=10)
+    args = parser.parse_args()
+
+    set_rerank_threads(args.threads)
+    passages = load_passages(args.pdf)
+    fp32 = CrossEncoder(constants.RERANKER_MODEL, device='cpu')
+    int8 = quantize_int8(CrossEncoder(constants.RERANKER_MODEL, device='cpu'))
+
+    for k in (10, 25, 50):
+        # Candidates stand in for retrieval output: a fixed window of passages per query
+        reference = {}
+        for i, query in enumerate(QUERIES):
+            docs = tuple(passages[(i * 7 + j) % len(passages)] for j in range(k))
+            reference[(query, docs)] = [doc.metadata['chunk_id'] for doc, _ in baseline(fp32, query, list(docs))]
+
+        cache = ScoreCache(100000)
+        engines = {
+            'engine fp32': RerankEngine(fp32, 'fp32', args.batch_size, max_candidates=0, cache=None),
+            'engine int8': RerankEngine(int8, 'int8', args.batch_size, max_candidates=0, cache=None),
+            f'engine int8 top{args.max_candidates}': RerankEngine(int8, 'int8', args.batch_size,
+                                                                  max_candidates=args.max_candidates, cache=None),
+            'engine fp32 cached': RerankEngine(fp32, 'fp32', args.batch_size, max_candidates=0, cache=cache),
+        }
+        run('original predict fp32', lambda q, d: baseline(fp32, q, list(d)), reference, k)
+        for label, engine in engines.items():
+            run(label, lambda q, d: engine.rerank(q, list(d)), reference, k)
+        # Second pass over the same pairs is served from the score cache
+        run('engine fp32 cache hits', lambda q, d: engines['engine fp32 cached'].rerank(q, list(d)), reference, k)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Deterministic in-process stand-ins for OllamaLLM, OllamaEmbeddings and CrossEncoder.
+
+Embeddings are hashed bags of words, so texts sharing words are close and retrieval
+behaves sensibly; the reranker scores word overlap; the LLM answers every pipeline
+prompt with a fixed reply. Optional latencies mimic the cost of the real models.
+"""
+import re
+import time
+import zlib
+import types
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk, LLMResult
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def _words(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+
+class StubEmbeddings(Embeddings):
+    def __init__(self, dim: int = 256, latency_per_text: float = 0.0) -> None:
+        self.dim = dim
+        self.latency_per_text = latency_per_text
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _words(text):
+            h = zlib.crc32(word.encode('utf-8'))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_per_text:
+            time.sleep(self.latency_per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class StubCrossEncoder:
+    """CrossEncoder.predict look-alike scoring the share of query words found in the passage."""
+    def __init__(self, latency_per_pair: float = 0.0) -> None:
+        self.latency_per_pair = latency_per_pair
+        # What the model registry's sizer reads
+        self.model = types.SimpleNamespace(parameters=lambda: [], buffers=lambda: [])
+
+    def predict(self, pairs, batch_size: int = 32, show_progress_bar: bool = False, **kwargs):
+        if self.latency_per_pair:
+            time.sleep(self.latency_per_pair * len(pairs))
+        scores = []
+        for query, passage in pairs:
+            query_words, passage_words = set(_words(query)), set(_words(passage))
+            scores.append(len(query_words & passage_words) / (len(query_words) or 1))
+        return np.asarray(scores, dtype=np.float32)
+
+
+class StubLLM(LLM):
+    """
+    Answers the pipeline prompts like a cooperative llama3: DOCS for routing, YES for
+    relevancy, the query itself when contextualizing, and a fixed answer otherwise.
+    Streams word by word and reports Ollama-style token counts on the last chunk,
+    with the callbacks OllamaLLM makes (no chunk= to on_llm_new_token when streaming).
+    """
+    model: str = 'stub'
+    latency_per_token: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'stub-ollama'
+
+    def _reply(self, prompt: str) -> str:
+        if 'output either DOCS or DEFAULT' in prompt:
+            return 'DOCS'
+        if 'output either YES or NO' in prompt:
+            return 'YES'
+        if 'standalone question' in prompt:
+            # The QUESTION (prefix_cache layout) or the latest user turn is the question to reformulate
+            if 'QUESTION:' in prompt:
+                return prompt.rsplit('QUESTION:', 1)[-1].split('<|eot_id|>')[0].strip()
+            return prompt.rsplit('<|start_header_id|>user<|end_header_id|>', 1)[-1].split('<|eot_id|>')[0].strip()
+        return 'Based on the documents, the answer is in the retrieved context.'
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return ''.join(chunk.text for chunk in self._chunks(prompt))
+
+    def _generate(self, prompts: List[str], stop: Optional[List[str]] = None, run_manager=None,
+                  **kwargs: Any) -> LLMResult:
+        # Like OllamaLLM: invoke aggregates the stream, the final chunk's generation_info included
+        generations = []
+        for prompt in prompts:
+            final = None
+            for chunk in self._chunks(prompt):
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk, verbose=self.verbose)
+                final = chunk if final is None else final + chunk
+            generations.append([final])
+        return LLMResult(generations=generations)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        for chunk in self._chunks(prompt):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, verbose=self.verbose)
+            yield chunk
+
+    def _chunks(self, prompt: str):
+        words = self._reply(prompt).split(' ')
+        start = time.perf_counter()
+        for i, word in enumerate(words):
+            if self.latency_per_token:
+                time.sleep(self.latency_per_token)
+            yield GenerationChunk(text=word if i == 0 else ' ' + word)
+        yield GenerationChunk(text='', generation_info={
+            'done': True, 'model': self.model, 'prompt_eval_count': len(prompt.split()),
+            'eval_count': len(words), 'eval_duration': int((time.perf_counter() - start) * 1e9),
+        })
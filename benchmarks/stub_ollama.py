@@ -0,0 +1,58 @@
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def stub_vector(text: str, dim: int):
+    rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+class StubOllamaServer:
+    """
+    Minimal stand-in for the Ollama /api/embed endpoint.
+
+    Every request costs request_latency seconds plus per_text_latency per input,
+    roughly the shape of a real local embedding server.
+    """
+    def __init__(self, port: int = 0, dim: int = 1024, request_latency: float = 0.02,
+                 per_text_latency: float = 0.002) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                inputs = body.get('input', [])
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                server.requests += 1
+                server.texts += len(inputs)
+                time.sleep(request_latency + per_text_latency * len(inputs))
+                payload = json.dumps({
+                    'model': body.get('model'),
+                    'embeddings': [stub_vector(text, dim) for text in inputs],
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.requests = 0
+        self.texts = 0
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,309 @@
+"""
+Offline benchmark suite for the ingestion and query paths.
+
+OllamaLLM, OllamaEmbeddings and CrossEncoder are replaced by the deterministic stubs
+in benchmarks/stub_models.py (through the model registry loaders and the shared
+embedding model), so runs need no Ollama server or model downloads and are
+repeatable. For every corpus size, in a fresh process and working directory:
+
+    load_documents, process_documents, ingest   throughput and peak RSS
+    rerank_docs, on_message (each pipeline)     latency percentiles, throughput, peak RSS
+
+Results are stored as benchmarks/results/<commit>.json and can be compared:
+
+    python -m benchmarks.suite --sizes 100,10000
+    python -m benchmarks.suite --sizes 100000 --queries 50
+    python -m benchmarks.suite --compare                  # the two most recent results
+    python -m benchmarks.suite --compare 1b1adfc 08e566f  # commits or result files
+"""
+import os
+import sys
+import glob
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+CHUNKS_PER_FILE = 100
+PIPELINES = ('sequential', 'parallel', 'fast')
+
+
+class PeakRSS:
+    """Samples the resident set size of this process while the block runs."""
+    def __init__(self, interval: float = 0.005) -> None:
+        import psutil
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak = 0
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+    @property
+    def peak_mb(self) -> float:
+        return self.peak / 1024 / 1024
+
+
+def make_corpus(source_dir: str, chunks: int, seed: int = 0) -> List[str]:
+    """
+    Write synthetic .txt files of about `chunks` CHUNK_SIZE paragraphs; every paragraph
+    states one fact. Returns questions about randomly chosen facts.
+    """
+    rng = random.Random(seed)
+    syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'da', 'pe', 'gu']
+    vocabulary = sorted({''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(3000)})
+    os.makedirs(source_dir, exist_ok=True)
+    facts = []
+    for file_index in range(max(1, -(-chunks // CHUNKS_PER_FILE))):
+        paragraphs = []
+        for i in range(min(CHUNKS_PER_FILE, chunks - file_index * CHUNKS_PER_FILE)):
+            project = f"{rng.choice(vocabulary)}{file_index}x{i}"
+            owner = rng.choice(vocabulary)
+            sentences = [f"Project {project} is owned by team {owner} since {rng.randint(1, 12)}/{rng.randint(1, 28)}/20{rng.randint(10, 24)}."]
+            for _ in range(4):
+                sentences.append(' '.join(rng.choice(vocabulary) for _ in range(rng.randint(8, 12))).capitalize() + '.')
+            paragraphs.append(' '.join(sentences))
+            facts.append((project, owner))
+        with open(os.path.join(source_dir, f"doc_{file_index:05d}.txt"), mode='w', encoding='utf-8') as file:
+            file.write('\n\n'.join(paragraphs))
+    return [f"Which team owns project {project}?" for project, _ in rng.sample(facts, min(len(facts), 1000))]
+
+
+def throughput(name: str, fn: Callable[[], int]) -> Dict[str, Any]:
+    """Run fn once; fn returns the number of items it processed."""
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        items = fn()
+        seconds = time.perf_counter() - start
+    result = {'items': items, 'seconds': seconds, 'per_second': items / seconds if seconds else 0.0,
+              'peak_rss_mb': rss.peak_mb}
+    print(f"  {name:<28} {items:8d} items {seconds:8.2f}s {result['per_second']:10.1f}/s {rss.peak_mb:8.0f} MB")
+    return result
+
+
+def latency(name: str, fn: Callable[[Any], Any], inputs: List[Any]) -> Dict[str, Any]:
+    """Call fn once per input and report latency percentiles."""
+    seconds = []
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        for item in inputs:
+            call_start = time.perf_counter()
+            fn(item)
+            seconds.append(time.perf_counter() - call_start)
+        total = time.perf_counter() - start
+    ms = np.asarray(seconds) * 1000
+    result = {'items': len(inputs), 'mean_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)),
+              'p95_ms': float(np.percentile(ms, 95)), 'p99_ms': float(np.percentile(ms, 99)),
+              'per_second': len(inputs) / total if total else 0.0, 'peak_rss_mb': rss.peak_mb}
+    print(f"  {name:<28} p50 {result['p50_ms']:8.1f}ms p95 {result['p95_ms']:8.1f}ms "
+          f"p99 {result['p99_ms']:8.1f}ms {result['per_second']:8.1f}/s {rss.peak_mb:8.0f} MB")
+    return result
+
+
+def run_size(chunks: int, queries: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """One corpus size, run inside a fresh working directory (see --child)."""
+    from benchmarks.stub_models import StubCrossEncoder, StubEmbeddings, StubLLM
+    from modules import embeddings
+    from modules.model_registry import registry
+
+    stub_embeddings = StubEmbeddings(latency_per_text=options['embed_latency'])
+    embedding_model = embeddings.get_embedding_model()
+    embedding_model.client = stub_embeddings
+    registry.register_loader('llm', lambda name: StubLLM(model=name, latency_per_token=options['token_latency']))
+    registry.register_loader('reranker', lambda name, **_: StubCrossEncoder(options['rerank_latency']))
+
+    from modules import agent
+    from modules.bot import Bot
+    from modules.ingestion import ingest, process_documents
+    from modules.manifest import Manifest
+    from modules.utils import load_documents
+
+    bot = Bot()
+    questions = make_corpus(bot.source_dir, chunks)[:queries]
+    results = {}
+    print(f"{chunks} chunks, {queries} queries")
+
+    results['load_documents'] = throughput('load_documents', lambda: len(load_documents(bot.source_dir)))
+    # Own uncached embedding model, so ingest below still starts from a cold cache
+    uncached = embeddings.BatchedEmbeddings('stub', cache_path='')
+    uncached.client = stub_embeddings
+    results['process_documents'] = throughput(
+        'process_documents', lambda: len(process_documents(bot.source_dir, uncached))
+    )
+
+    def run_ingest() -> int:
+        ingest(bot.db_dir, bot.source_dir)
+        manifest = Manifest(bot.db_dir)
+        return sum(len(manifest.chunk_ids(key)) for key in manifest.files)
+    results['ingest'] = throughput('ingest', run_ingest)
+
+    retriever = agent.load_retriever(bot.bot_id)
+    reranker = agent.load_reranker()
+    retrieved = [(question, retriever.get_relevant_documents(question)) for question in questions]
+    results['rerank_docs'] = latency('rerank_docs', lambda item: agent.rerank_docs(reranker, *item), retrieved)
+
+    loop = asyncio.new_event_loop()
+    for pipeline in PIPELINES:
+        agent_config = agent.Agent(bot_id=bot.bot_id, name='bench', description='benchmark agent',
+                                   starter='Hello!', model='llama3', pipeline=pipeline)
+        loop.run_until_complete(agent.create_agent(agent_config))
+
+        def ask(question: str):
+            # Single-turn latency: no history to contextualize
+            agent.session_cache[bot.bot_id]['memory'].clear()
+            return loop.run_until_complete(agent.on_message(bot.bot_id, question))
+        results[f'on_message_{pipeline}'] = latency(f'on_message ({pipeline})', ask, questions)
+    loop.close()
+    return results
+
+
+def current_commit() -> Dict[str, Any]:
+    def git(*args) -> str:
+        return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    dirty = bool(git('status', '--porcelain', '--untracked-files=no'))
+    return {'commit': commit, 'dirty': dirty, 'subject': git('log', '-1', '--format=%s')}
+
+
+def settings() -> Dict[str, Any]:
+    from modules import constants
+    names = ('CHUNK_SIZE', 'CHUNK_OVERLAP', 'CHUNKING_MODE', 'CHUNK_TOKENS', 'RETRIEVAL_MODE', 'RETRIEVAL_K',
+             'RERANK_BATCH_SIZE', 'RERANK_MAX_CANDIDATES', 'EMBEDDING_BATCH_SIZE', 'LOAD_WORKERS')
+    return {name: getattr(constants, name, None) for name in names}
+
+
+def child(args):
+    options = json.loads(args.child)
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(options['workdir'])
+    results = {'settings': settings(), 'phases': run_size(options['chunks'], options['queries'], options)}
+    with open(options['output'], mode='w', encoding='utf-8') as file:
+        json.dump(results, file)
+
+
+def run(args):
+    commit = current_commit()
+    record = {**commit, 'created': time.time(), 'python': platform.python_version(), 'platform': platform.platform(),
+              'options': {'queries': args.queries, 'embed_latency': args.embed_latency,
+                          'token_latency': args.token_latency, 'rerank_latency': args.rerank_latency},
+              'sizes': {}}
+    env = dict(os.environ, RESPONSE_CACHE_SIZE='0' if not args.response_cache else os.environ.get('RESPONSE_CACHE_SIZE', '256'))
+    for chunks in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            output = os.path.join(workdir, 'result.json')
+            options = {**record['options'], 'chunks': chunks, 'workdir': workdir, 'output': output}
+            # Every size in its own process: cold caches, no shared singletons, honest peak RSS
+            subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--child', json.dumps(options)],
+                           cwd=REPO_ROOT, env=env, check=True)
+            with open(output, encoding='utf-8') as file:
+                result = json.load(file)
+        record['settings'] = result['settings']
+        record['sizes'][str(chunks)] = result['phases']
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    name = commit['commit'] + ('-dirty' if commit['dirty'] else '')
+    path = os.path.join(args.results_dir, f"{name}.json")
+    with open(path, mode='w', encoding='utf-8') as file:
+        json.dump(record, file, indent=2)
+    print(f"Results written to {path}")
+
+
+def load_result(ref: str, results_dir: str) -> Dict[str, Any]:
+    if os.path.exists(ref):
+        path = ref
+    else:
+        matches = sorted(glob.glob(os.path.join(results_dir, f"{ref}*.json")))
+        if not matches:
+            raise SystemExit(f"No results for '{ref}' in {results_dir}")
+        path = matches[0]
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+# Metrics where a larger value is better, every other metric is a cost
+HIGHER_IS_BETTER = ('per_second',)
+COMPARED_METRICS = ('per_second', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb')
+
+
+def compare(refs: List[str], results_dir: str, threshold: float):
+    if len(refs) == 2:
+        base, head = (load_result(ref, results_dir) for ref in refs)
+    else:
+        records = [load_result(path, results_dir) for path in glob.glob(os.path.join(results_dir, '*.json'))]
+        records.sort(key=lambda record: record['created'])
+        if len(records) < 2:
+            raise SystemExit(f"Need two results in {results_dir} to compare")
+        base, head = records[-2:]
+    print(f"base {base['commit']}{' (dirty)' if base['dirty'] else ''}  {base.get('subject', '')}")
+    print(f"head {head['commit']}{' (dirty)' if head['dirty'] else ''}  {head.get('subject', '')}")
+    for name in sorted(set(base.get('settings', {})) | set(head.get('settings', {}))):
+        if base.get('settings', {}).get(name) != head.get('settings', {}).get(name):
+            print(f"  setting {name}: {base['settings'].get(name)} -> {head['settings'].get(name)}")
+
+    regressions = 0
+    for size in sorted(set(base['sizes']) & set(head['sizes']), key=int):
+        print(f"\n{size} chunks")
+        print(f"  {'phase':<24} {'metric':<12} {'base':>10} {'head':>10} {'change':>8}")
+        for phase in base['sizes'][size]:
+            if phase not in head['sizes'][size]:
+                continue
+            for metric in COMPARED_METRICS:
+                old, new = base['sizes'][size][phase].get(metric), head['sizes'][size][phase].get(metric)
+                if old is None or new is None:
+                    continue
+                change = (new - old) / old if old else 0.0
+                worse = -change if metric in HIGHER_IS_BETTER else change
+                flag = '  REGRESSION' if worse > threshold else ''
+                regressions += bool(flag)
+                print(f"  {phase:<24} {metric:<12} {old:10.1f} {new:10.1f} {change:+8.1%}{flag}")
+    print(f"\n{regressions} metrics regressed by more than {threshold:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=[100, 10000],
+                        help='corpus sizes in chunks, comma separated (e.g. 100,10000,100000)')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--embed-latency', type=float, default=0.0, help='stub seconds per embedded text')
+    parser.add_argument('--token-latency', type=float, default=0.0, help='stub seconds per generated token')
+    parser.add_argument('--rerank-latency', type=float, default=0.0, help='stub seconds per reranked pair')
+    parser.add_argument('--response-cache', action='store_true', help='keep the response cache on')
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    parser.add_argument('--compare', nargs='*', metavar='COMMIT_OR_FILE')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change reported as a regression')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+    elif args.compare is not None:
+        compare(args.compare, args.results_dir, args.threshold)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
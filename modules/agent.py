@@ -1,23 +1,52 @@
-import os
-import csv
+import sys
+import time
 import asyncio
-from typing import Dict, List
+import threading
+import contextvars
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from pydantic import BaseModel
-from sentence_transformers import CrossEncoder
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.docstore.document import Document
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 
 from .bot import get_db_dir
-from .constants import OVERVIEW_FILEPATH
-from .templates import Prompts, CustomTemplates
-from . import ingestion  # for potential references
-from . import constants
+from .agent_registry import get_agent_registry
+from .model_registry import registry
+from .router import is_standalone, quick_route
+from . import constants, telemetry
 
-# We keep a session cache in memory
+if TYPE_CHECKING:
+    # langchain, Chroma and the embedding client take seconds to import, the modules
+    # below import them on first use so the UI and the server start quickly
+    from langchain.docstore.document import Document
+    from langchain_ollama import OllamaLLM
+    from .reranking import RerankEngine
+    from .retrieval import HybridRetriever
+
+# We keep a session cache in memory, least recently used agents first
 session_cache = {}
+# Agents are loaded and evicted from worker threads, every change to the cache's order goes through here
+_session_lock = threading.RLock()
+
+# CPU-bound reranking runs here, bounded so it cannot starve retrieval and I/O threads
+_rerank_executor = ThreadPoolExecutor(max_workers=constants.RERANK_WORKERS, thread_name_prefix='rerank')
+# With rerank batching, these threads mostly wait in the batcher, enough of them to fill a batch;
+# the batcher bounds the predict calls to RERANK_WORKERS instead
+_rerank_batch_executor = ThreadPoolExecutor(max_workers=constants.BATCH_MAX_SIZE, thread_name_prefix='rerank-batch')
+# asyncio primitives are bound to one event loop, and Streamlit runs a fresh loop per click.
+# They are held weakly: a bot's lock or semaphore lives while a request holds or waits on it,
+# so evicted, deleted and unknown bots leave nothing behind
+_loop_primitives: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, weakref.WeakValueDictionary]" = \
+    weakref.WeakKeyDictionary()
+
+def _per_bot(kind: str, bot_id: str, factory):
+    primitives = _loop_primitives.setdefault(asyncio.get_running_loop(), weakref.WeakValueDictionary())
+    key = (kind, bot_id)
+    primitive = primitives.get(key)
+    if primitive is None:
+        primitive = primitives[key] = factory()
+    return primitive
 
 class Agent(BaseModel):
     bot_id: str
@@ -25,119 +54,412 @@ class Agent(BaseModel):
     description: str
     starter: str
     model: str
+    pipeline: str = 'sequential'
+
+def load_model(model_name: str) -> 'OllamaLLM':
+    # Shared across agents, release with registry.release('llm', model_name)
+    return registry.acquire('llm', model_name)
+
+def _reranker_options() -> dict:
+    return {'device': 'cpu', 'backend': constants.RERANKER_BACKEND}
+
+_rerank_threads_set = False
+
+def load_reranker() -> 'RerankEngine':
+    global _rerank_threads_set
+    from .reranking import RerankEngine, set_rerank_threads
+    if not _rerank_threads_set:
+        set_rerank_threads(constants.RERANK_THREADS)
+        _rerank_threads_set = True
+    # The CrossEncoder is shared across agents, release with registry.release('reranker', ...)
+    model = registry.acquire('reranker', constants.RERANKER_MODEL, **_reranker_options())
+    return RerankEngine(model, constants.RERANKER_MODEL,
+                        batch_key=registry.key('reranker', constants.RERANKER_MODEL, **_reranker_options()))
+
+def warm_up(model_names: List[str]):
+    """
+    Import the retrieval stack and load the models ahead of the first request: the
+    reranker, the embedding model and each LLM in model_names, also in Ollama's memory.
+    Failures are printed, a cold model only makes the first request slower.
+    """
+    start = time.perf_counter()
+    from langchain_community.vectorstores import Chroma  # noqa: F401, imported for its side effect
+    from .embeddings import get_embedding_model
+    steps = [('reranker', _warm_up_reranker),
+             ('embeddings', lambda: get_embedding_model().client.embed_query('warm up'))]
+    for name in model_names:
+        steps.append((name, lambda name=name: _warm_up_llm(name.strip())))
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {type(e).__name__}: {e}")
+    print(f"Warm-up done in {time.perf_counter() - start:.1f}s")
+
+def _warm_up_llm(model_name: str):
+    llm = load_model(model_name)
+    try:
+        from ollama import Client
+        # An empty prompt makes Ollama load the weights without generating anything; with
+        # the num_ctx of the real requests, which would reload the model otherwise
+        Client(host=llm.base_url).generate(model=model_name, prompt='', keep_alive=constants.OLLAMA_KEEP_ALIVE,
+                                           options={'num_ctx': constants.OLLAMA_NUM_CTX})
+    finally:
+        registry.release('llm', model_name)
+
+def _warm_up_reranker():
+    # Released right away, the registry keeps it loaded until it idles out
+    load_reranker()
+    registry.release('reranker', constants.RERANKER_MODEL, **_reranker_options())
 
-def load_model(model_name: str) -> OllamaLLM:
-    return OllamaLLM(
-        model=model_name,
-        device='cpu',
-        callbacks=[StreamingStdOutCallbackHandler()],
-    )
+def _cache_gauges():
+    # Read at scrape time, so the hot path pays nothing for these; caches not imported yet are empty
+    embeddings = sys.modules.get(f'{__package__}.embeddings')
+    reranking = sys.modules.get(f'{__package__}.reranking')
+    if embeddings is not None:
+        stats = embeddings.get_embedding_model().stats_snapshot()
+        yield 'rag_embedding_cache_hit_ratio', {}, stats['cache_hits'] / stats['texts'] if stats['texts'] else 0.0
+        yield 'rag_embedding_requests', {}, stats['requests']
+    if reranking is not None:
+        score_cache = reranking.score_cache
+        lookups = score_cache.hits + score_cache.misses
+        yield 'rag_rerank_cache_hit_ratio', {}, score_cache.hits / lookups if lookups else 0.0
+    yield 'rag_models_memory_mb', {}, registry.memory_bytes() / 1024 / 1024
+    yield 'rag_loaded_agents', {}, len(session_cache)
 
-embedding_model = OllamaEmbeddings(model="mxbai-embed-large")
+telemetry.metrics.register_collector(_cache_gauges)
 
-def load_retriever(bot_id: str):
-    return Chroma(
-        persist_directory=get_db_dir(bot_id),
-        embedding_function=embedding_model
-    ).as_retriever(search_kwargs={"k": 10})
+def load_retriever(bot_id: str) -> 'HybridRetriever':
+    from .embeddings import get_embedding_model
+    from .lexical import LexicalIndex
+    from .retrieval import HybridRetriever
+    from .vector_store import TenantStore, has_per_bot_db
+    vectorstore = TenantStore(bot_id, get_embedding_model())
+    if vectorstore.mode == 'shared' and has_per_bot_db(bot_id):
+        print(f"Bot {bot_id} still has a per-bot Chroma DB, run python -m modules.vector_store migrate")
+    return HybridRetriever(vectorstore, LexicalIndex(get_db_dir(bot_id)), k=constants.RETRIEVAL_K)
 
-def rerank_docs(reranker_model: CrossEncoder, query: str, retrieved_docs: List[Document]) -> List[tuple]:
+def rerank_docs(reranker: 'RerankEngine', query: str, retrieved_docs: List['Document']) -> List[tuple]:
     """
     Re-rank retrieved_docs based on CrossEncoder scores.
 
-    :param reranker_model: CrossEncoder instance
+    :param reranker: RerankEngine wrapping the shared CrossEncoder
     :param query: the query string
-    :param retrieved_docs: list of Documents to be re-ranked
+    :param retrieved_docs: list of Documents to be re-ranked, in retrieval order
     :return: list of (Document, float) sorted by score descending
     """
-    if not retrieved_docs:
-        # Return empty if there are no documents
-        return []
-    query_and_docs = [(query, r.page_content) for r in retrieved_docs]
-    scores = reranker_model.predict(query_and_docs)
-    return sorted(list(zip(retrieved_docs, scores)), key=lambda x: x[1], reverse=True)
+    return reranker.rerank(query, retrieved_docs)
+
+def load_agent_sync(agent: Agent):
+    from .chunk_store import get_chunk_store
+    from .memory import ConversationMemory
+    from .response_cache import ResponseCache, ingest_stamp
+    from .templates import Prompts, CustomTemplates
+    if agent.pipeline not in constants.PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline '{agent.pipeline}', expected one of {constants.PIPELINE_MODES}")
+    if agent.model not in constants.SUPPORTED_MODELS:
+        raise ValueError(f"Unsupported model '{agent.model}', expected one of {constants.SUPPORTED_MODELS}")
+    # Reloading an agent must not leak the references held by its previous entry
+    unload_agent(agent.bot_id)
+    db_dir = get_db_dir(agent.bot_id)
+    llm = load_model(agent.model)
+    try:
+        reranker = load_reranker()
+    except Exception:
+        registry.release('llm', agent.model)
+        raise
+    try:
+        bot_info = {
+            'name': agent.name,
+            'description': agent.description,
+            'starter': agent.starter,
+            'model': agent.model,
+            'pipeline': agent.pipeline,
+            'llm': llm,
+            'retriever': load_retriever(agent.bot_id),
+            'reranker': reranker,
+            'response_cache': ResponseCache(db_dir),
+            'memory': ConversationMemory(db_dir),
+            'chunk_store': get_chunk_store(db_dir),
+            'prompts': Prompts(agent.model),
+            'jinja_templates': CustomTemplates(agent.model),
+            'ingest_stamp': ingest_stamp(db_dir)
+        }
+    except Exception:
+        # Nothing holds these references yet, give them back or the models can never be evicted
+        registry.release('llm', agent.model)
+        registry.release('reranker', constants.RERANKER_MODEL, **_reranker_options())
+        raise
+    with _session_lock:
+        # Loaded twice concurrently, the last one wins and the other's references are released
+        unload_agent(agent.bot_id)
+        session_cache[agent.bot_id] = bot_info
+        # Keep the cache bounded so idle agents give their models back to the registry
+        while len(session_cache) > constants.MAX_CACHED_AGENTS:
+            unload_agent(next(iter(session_cache)))
 
 async def load_agent(agent: Agent):
-    session_cache[agent.bot_id] = {
-        'name': agent.name,
-        'description': agent.description,
-        'starter': agent.starter,
-        'llm': load_model(agent.model),
-        'retriever': load_retriever(agent.bot_id),
-        'reranker': CrossEncoder("mixedbread-ai/mxbai-rerank-large-v1",device='cpu'),
-        'history': [],
-        'prompts': Prompts(agent.model),
-        'jinja_templates': CustomTemplates(agent.model)
-    }
-
-def find_bot_by_id(bot_id: str) -> Agent:
-    if not os.path.exists(OVERVIEW_FILEPATH):
-        return None
-    with open(OVERVIEW_FILEPATH, mode='r', newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row['bot_id'] == bot_id:
-                return Agent(**row)
-    return None
+    # Loading may read a CrossEncoder from disk and open Chroma, keep it off the event loop
+    await asyncio.to_thread(load_agent_sync, agent)
+
+async def ensure_agent_loaded(bot_id: str):
+    """Load the agent from the registry unless it is cached, once even under concurrent requests."""
+    if bot_id in session_cache:
+        return
+    async with _per_bot('load', bot_id, asyncio.Lock):
+        if bot_id in session_cache:
+            return
+        agent = await asyncio.to_thread(find_bot_by_id, bot_id)
+        if agent:
+            await load_agent(agent)
+        else:
+            raise ValueError(f"Bot with id {bot_id} does not exist")
+
+def unload_agent(bot_id: str):
+    """Drop an agent from the session cache and release its shared models."""
+    with _session_lock:
+        bot_info = session_cache.pop(bot_id, None)
+    if bot_info is None:
+        return
+    registry.release('llm', bot_info['model'])
+    registry.release('reranker', constants.RERANKER_MODEL, **_reranker_options())
+
+def _agent_from_row(row: dict) -> Agent:
+    # Agents stored before a column existed leave it empty, fall back to the field default
+    return Agent(**{key: value for key, value in row.items() if key and value is not None})
+
+def find_bot_by_id(bot_id: str) -> Optional[Agent]:
+    row = get_agent_registry().get(bot_id)
+    return _agent_from_row(row) if row else None
 
 async def create_agent(agent: Agent):
     # Load agent into session_cache
     await load_agent(agent)
-    # Append agent details to overview.csv
-    if not os.path.exists('data'):
-        os.makedirs('data')
-    with open(OVERVIEW_FILEPATH, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        # If file is empty, write header
-        if file.tell() == 0:
-            writer.writerow(['bot_id', 'name', 'description', 'starter', 'model'])
-        writer.writerow([agent.bot_id, agent.name, agent.description, agent.starter, agent.model])
+    # Record the agent in the registry, replacing any previous version
+    await asyncio.to_thread(get_agent_registry().upsert, agent.model_dump())
+
+def delete_agent(bot_id: str) -> bool:
+    unload_agent(bot_id)
+    return get_agent_registry().delete(bot_id)
+
+def _touch_agent(bot_id: str) -> Optional[dict]:
+    """The cached agent marked as most recently used, None if it is not (or no longer) loaded."""
+    with _session_lock:
+        bot_info = session_cache.pop(bot_id, None)
+        if bot_info is not None:
+            session_cache[bot_id] = bot_info
+        return bot_info
+
+def _ingested_elsewhere(bot_id: str, bot_info: dict) -> bool:
+    from .response_cache import ingest_stamp
+    if ingest_stamp(get_db_dir(bot_id)) == bot_info['ingest_stamp']:
+        return False
+    # The process running the ingest jobs sees its own Chroma writes
+    ingest_jobs = sys.modules.get(f'{__package__}.ingest_jobs')
+    return ingest_jobs is None or not ingest_jobs.ingest_owner()
+
+def _reopen_agent(bot_id: str, bot_info: dict):
+    """Unload an agent and drop its Chroma client, so it is loaded again from what is on disk now."""
+    from .vector_store import reopen_client
+    reopen_client(bot_info['retriever'].vectorstore.path)
+    with _session_lock:
+        if session_cache.get(bot_id) is bot_info:
+            unload_agent(bot_id)
 
 def preview_agent(agent: Agent) -> str:
-    if agent.bot_id not in session_cache:
-        asyncio.run(load_agent(agent))
+    bot_info = _touch_agent(agent.bot_id)
+    while bot_info is None:
+        load_agent_sync(agent)
+        bot_info = _touch_agent(agent.bot_id)
     # Clear out old chat history so each "preview" starts fresh
-    session_cache[agent.bot_id]['history'] = []
-    return session_cache[agent.bot_id]['starter']
+    bot_info['memory'].clear()
+    return bot_info['starter']
 
-async def on_message(bot_id: str, content: str) -> Dict[str, List[str]]:
-    """Route the user message, retrieve relevant docs, answer from them or clarify."""
+def _remember(bot_info: dict, content: str, answer: str):
+    memory = bot_info['memory']
+    memory.append(content, answer)
+    llm, prompts, jinja_templates = bot_info['llm'], bot_info['prompts'], bot_info['jinja_templates']
+
+    def summarize(summary: str, messages: List[Dict[str, str]]) -> str:
+        prompt = prompts.summarize_history.format(summary=summary or 'None',
+                                                  chat_history=jinja_templates.render_template(messages))
+        return llm.invoke(prompt, stop=['<|eot_id|>'])
+
+    # Exchanges that no longer fit the window are summarized once the answer is out
+    memory.schedule_summary(summarize)
+
+class StageTimer:
+    """Wall-clock seconds spent in each pipeline stage of one request."""
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            with telemetry.span(name):
+                yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def mark(self, name: str):
+        # Record the time elapsed since the request started, e.g. first_token
+        self.timings.setdefault(name, time.perf_counter() - self.start)
+
+    def finish(self) -> Dict[str, float]:
+        self.timings['total'] = time.perf_counter() - self.start
+        return self.timings
+
+async def _retrieve(retriever, content: str, timer: StageTimer) -> List['Document']:
+    # Chroma has no async search, run it (and its embedding call) in a worker thread
+    with timer.stage('retrieval'):
+        retrieved_docs = await asyncio.to_thread(retriever.get_relevant_documents, content)
+        telemetry.current_span().set_attribute('retrieved', len(retrieved_docs))
+    telemetry.observe('rag_retrieved_docs', len(retrieved_docs))
+    return retrieved_docs
+
+async def _rerank(reranker, content: str, retrieved_docs: List['Document'], timer: StageTimer) -> List[tuple]:
+    with timer.stage('reranking'):
+        from .reranking import rerank_batching_enabled
+        executor = _rerank_batch_executor if rerank_batching_enabled() else _rerank_executor
+        # run_in_executor does not carry the context over like to_thread does
+        reranked_docs = await asyncio.get_running_loop().run_in_executor(
+            executor, contextvars.copy_context().run, rerank_docs, reranker, content, retrieved_docs
+        )
+        telemetry.current_span().set_attribute('reranked', len(reranked_docs))
+    telemetry.observe('rag_reranked_docs', len(reranked_docs))
+    return reranked_docs
+
+async def _retrieve_and_rerank(retriever, reranker, content: str, timer: StageTimer) -> Tuple[List['Document'], List[tuple]]:
+    retrieved_docs = await _retrieve(retriever, content, timer)
+    return retrieved_docs, await _rerank(reranker, content, retrieved_docs, timer)
+
+CLARIFY_PREFIX = 'CLARIFY:'
+
+async def on_message_stream(bot_id: str, content: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Route the user message, retrieve relevant docs, answer from them or clarify,
+    yielding events as the pipeline progresses:
+
+    {'type': 'status', 'stage': ...} when a stage starts,
+    {'type': 'token', 'content': ...} for each piece of the answer as it is generated,
+    {'type': 'done', 'response': ..., 'sources': [...], 'source_ids': [...], 'timings': {...}} once at the end,
+    sources being the first SOURCE_PREVIEW_CHARS characters of each source chunk and source_ids
+    their ids in the bot's chunk store (None for chunks ingested without one).
+
+    The agent's pipeline mode decides how the stages are scheduled, see constants.PIPELINE_MODES.
+    At most BOT_CONCURRENCY messages per bot are processed at once, the others wait.
+    """
+    async with _per_bot('messages', bot_id, lambda: asyncio.Semaphore(constants.BOT_CONCURRENCY)):
+        with telemetry.span('message', bot_id=bot_id):
+            async for event in _message_events(bot_id, content):
+                yield event
+
+async def _message_events(bot_id: str, content: str) -> AsyncIterator[Dict[str, Any]]:
+    from .embeddings import get_embedding_model
+    from .retrieval import search_query
     print('\nBEGIN PROCESS\n')
+    timer = StageTimer()
+    message_span = telemetry.current_span()
     
-    # Load from CSV if not in memory
-    if bot_id not in session_cache:
-        agent = find_bot_by_id(bot_id)
-        if agent:
-            await load_agent(agent)
-        else:
-            raise ValueError(f"Bot with id {bot_id} does not exist")
-
-    bot_info = session_cache[bot_id]
+    # Load from the agent registry if not in memory, and mark as most recently used;
+    # another load may evict it in between, then load it again
+    bot_info = None
+    while bot_info is None:
+        await ensure_agent_loaded(bot_id)
+        bot_info = _touch_agent(bot_id)
+        if bot_info is not None and _ingested_elsewhere(bot_id, bot_info):
+            # Chroma only guarantees a process its own writes, reopen after another process ingested
+            await asyncio.to_thread(_reopen_agent, bot_id, bot_info)
+            bot_info = None
     llm = bot_info['llm']
     retriever = bot_info["retriever"]
     reranker = bot_info["reranker"]
-    history = bot_info['history']
+    memory = bot_info['memory']
     prompts = bot_info['prompts']
     jinja_templates = bot_info['jinja_templates']
+    pipeline = bot_info['pipeline']
+    response_cache = bot_info['response_cache']
+    chunk_store = bot_info['chunk_store']
+    message_span.set_attribute('pipeline', pipeline)
 
-    # Contextualize if there's prior chat
-    if len(history) > 0:
-        rendered_history = jinja_templates.render_template(history)
-        content = llm.invoke(
-            prompts.contextualize_in_history.format(chat_history=rendered_history, query=content),
-            stop=['<|eot_id|>']
-        )
+    # Contextualize if there's prior chat, unless the message stands on its own
+    has_history = memory.has_history()
+    if has_history and is_standalone(content):
+        message_span.set_attribute('contextualized', False)
+    elif has_history:
+        yield {'type': 'status', 'stage': 'contextualizing'}
+        summary, recent = memory.window()
+        rendered_history = jinja_templates.render_template(recent, summary)
+        with timer.stage('contextualizing'):
+            content = await llm.ainvoke(
+                prompts.contextualize_in_history.format(chat_history=rendered_history, query=content),
+                stop=['<|eot_id|>']
+            )
         print('\nDONE CONTEXTUALIZING\n')
 
+    query_vector = None
+    if response_cache.enabled:
+        # Same text the retriever embeds, so a miss costs no extra embedding call
+        cached = None
+        with timer.stage('cache_lookup'):
+            try:
+                # Bounded like the dense search, a slow embedding server must not hold back the lexical fallback
+                query_vector = await asyncio.wait_for(
+                    asyncio.to_thread(get_embedding_model().embed_query, search_query(content)),
+                    timeout=constants.DENSE_SEARCH_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                print(f"Query embedding slower than {constants.DENSE_SEARCH_TIMEOUT}s, skipping the response cache")
+            except Exception as e:
+                print(f"Query embedding failed ({type(e).__name__}: {e}), skipping the response cache")
+            else:
+                cached = response_cache.lookup(query_vector)
+        result = 'skipped' if query_vector is None else 'hit' if cached else 'miss'
+        telemetry.inc('rag_response_cache_total', result=result)
+        if cached:
+            print(f"\nCACHE HIT (similarity {cached['similarity']:.3f})\n")
+            _remember(bot_info, content, cached['response'])
+            telemetry.inc('rag_requests_total', pipeline=pipeline, outcome='cache_hit')
+            # Entries keep chunk ids only, previews are read back from the chunk store
+            previews = [(chunk_id, chunk_store.preview(chunk_id, constants.SOURCE_PREVIEW_CHARS))
+                        for chunk_id in cached['sources']]
+            source_ids = [chunk_id for chunk_id, preview in previews if preview is not None]
+            sources = [preview for _, preview in previews if preview is not None]
+            yield {'type': 'token', 'content': cached['response']}
+            yield {'type': 'done', 'response': cached['response'], 'sources': sources, 'source_ids': source_ids,
+                   'timings': timer.finish()}
+            return
+
     source_documents = None
-    route = llm.invoke(prompts.route_query.format(query=content), stop=['<|eot_id|>'])
-    print('\nDONE ROUTING\n')
+    retrieval: Optional[asyncio.Future] = None
+    route = quick_route(content) if pipeline == 'fast' else None
+    if route is None:
+        yield {'type': 'status', 'stage': 'routing'}
+        if pipeline in ('parallel', 'fast'):
+            # Speculatively retrieve while the LLM routes, most questions end up on DOCS anyway
+            retrieval = asyncio.ensure_future(_retrieve_and_rerank(retriever, reranker, content, timer))
+        try:
+            with timer.stage('routing'):
+                route = await llm.ainvoke(prompts.route_query.format(query=content), stop=['<|eot_id|>'])
+        finally:
+            if retrieval is not None and not (route or '').strip().startswith('DOCS'):
+                # DEFAULT route, or routing failed or was cancelled: nobody needs the speculative result
+                retrieval.cancel()
+                retrieval.add_done_callback(lambda future: future.cancelled() or future.exception())
+        print('\nDONE ROUTING\n')
+    message_span.set_attribute('route', route.strip()[:16])
 
     if route.strip().startswith('DOCS'):
         # Retrieve from Chroma
-        retrieved_docs = retriever.get_relevant_documents(
-            f"Represent this sentence for searching relevant passages: {content}"
-        )
+        yield {'type': 'status', 'stage': 'retrieving'}
+        if pipeline == 'sequential':
+            retrieved_docs = await _retrieve(retriever, content, timer)
+        else:
+            if retrieval is None:
+                retrieval = asyncio.ensure_future(_retrieve_and_rerank(retriever, reranker, content, timer))
+            retrieved_docs, reranked_docs = await retrieval
         print('\nDONE RETRIEVED\n')
 
         # Check if no docs were retrieved
@@ -146,12 +468,16 @@ async def on_message(bot_id: str, content: str) -> Dict[str, List[str]]:
                 "No relevant documents were found. "
                 "Please ensure you've ingested documents or re-check your question."
             )
-            history.append({"role": "user", "content": content})
-            history.append({"role": "assistant", "content": answer})
-            return {"response": answer, "sources": []}
+            _remember(bot_info, content, answer)
+            telemetry.inc('rag_requests_total', pipeline=pipeline, outcome='no_documents')
+            yield {'type': 'token', 'content': answer}
+            yield {'type': 'done', 'response': answer, 'sources': [], 'source_ids': [], 'timings': timer.finish()}
+            return
 
         # Re-rank
-        reranked_docs = rerank_docs(reranker, content, retrieved_docs)
+        if pipeline == 'sequential':
+            yield {'type': 'status', 'stage': 'reranking'}
+            reranked_docs = await _rerank(reranker, content, retrieved_docs, timer)
         print('\nDONE RERANKING\n')
         
         if not reranked_docs:
@@ -159,43 +485,83 @@ async def on_message(bot_id: str, content: str) -> Dict[str, List[str]]:
                 "No relevant documents after re-ranking. "
                 "Please try rephrasing your question or upload additional documents."
             )
-            history.append({"role": "user", "content": content})
-            history.append({"role": "assistant", "content": answer})
-            return {"response": answer, "sources": []}
+            _remember(bot_info, content, answer)
+            telemetry.inc('rag_requests_total', pipeline=pipeline, outcome='no_documents')
+            yield {'type': 'token', 'content': answer}
+            yield {'type': 'done', 'response': answer, 'sources': [], 'source_ids': [], 'timings': timer.finish()}
+            return
 
         source_documents = [doc[0] for doc in reranked_docs[:4]]
         docs_content = '\n'.join([doc.page_content for doc in source_documents])
 
-        # Check relevancy
-        relevancy = llm.invoke(
-            prompts.sort_relevancy.format(context=docs_content, query=content),
-            stop=['<|eot_id|>']
-        )
-        print('\nDONE RELEVANCY\n')
-
-        if relevancy.strip().startswith('YES'):
-            answer = llm.invoke(prompts.qa_from_docs.format(context=docs_content, query=content), stop=['<|eot_id|>'])
+        if pipeline == 'fast':
+            # One call decides relevancy and answers, or asks for clarification
+            prompt = prompts.answer_or_clarify.format(context=docs_content, query=content)
         else:
-            # Clarify
-            answer = llm.invoke(prompts.clarify.format(context=docs_content, query=content), stop=['<|eot_id|>'])
+            # Check relevancy
+            yield {'type': 'status', 'stage': 'checking relevancy'}
+            with timer.stage('relevancy'):
+                relevancy = await llm.ainvoke(
+                    prompts.sort_relevancy.format(context=docs_content, query=content),
+                    stop=['<|eot_id|>']
+                )
+            print('\nDONE RELEVANCY\n')
+
+            if relevancy.strip().startswith('YES'):
+                prompt = prompts.qa_from_docs.format(context=docs_content, query=content)
+            else:
+                # Clarify
+                prompt = prompts.clarify.format(context=docs_content, query=content)
     else:
         # DEFAULT route—just answer directly
-        answer = llm.invoke(content, stop=['<|eot_id|>'])
+        prompt = content
+
+    yield {'type': 'status', 'stage': 'answering'}
+    tokens = []
+    # Only the combined prompt can start with the CLARIFY: marker, hold tokens back until we know
+    pending = '' if pipeline == 'fast' and source_documents else None
+    with timer.stage('generation'):
+        async for token in llm.astream(prompt, stop=['<|eot_id|>']):
+            if pending is not None:
+                pending += token
+                head = pending.lstrip()
+                if len(head) < len(CLARIFY_PREFIX) and CLARIFY_PREFIX.startswith(head):
+                    continue
+                token = head[len(CLARIFY_PREFIX):].lstrip() if head.startswith(CLARIFY_PREFIX) else pending
+                pending = None
+                if not token:
+                    continue
+            timer.mark('first_token')
+            tokens.append(token)
+            yield {'type': 'token', 'content': token}
+        if pending:
+            timer.mark('first_token')
+            tokens.append(pending)
+            yield {'type': 'token', 'content': pending}
+    answer = ''.join(tokens)
 
     # Track conversation
-    history.append({"role": "user", "content": content})
-    history.append({"role": "assistant", "content": answer})
-    bot_info['history'] = history[-8:]  # keep last 8 messages
-
-    sources = [doc.page_content for doc in source_documents] if source_documents else []
-    return {"response": answer, "sources": sources}
-
-def overview() -> List[Agent]:
-    agents = []
-    if not os.path.exists(OVERVIEW_FILEPATH):
-        return agents
-    with open(OVERVIEW_FILEPATH, mode='r', newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            agents.append(Agent(**row))
-    return agents
+    _remember(bot_info, content, answer)
+
+    source_documents = source_documents or []
+    sources = [doc.page_content[:constants.SOURCE_PREVIEW_CHARS] for doc in source_documents]
+    source_ids = [doc.metadata.get('chunk_id') for doc in source_documents]
+    telemetry.inc('rag_requests_total', pipeline=pipeline, outcome='answered')
+    if query_vector is not None:
+        response_cache.store(query_vector, answer, [chunk_id for chunk_id in source_ids if chunk_id])
+    timings = timer.finish()
+    print(f"\nTIMINGS ({pipeline}): " + ', '.join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items()))
+    yield {'type': 'done', 'response': answer, 'sources': sources, 'source_ids': source_ids, 'timings': timings}
+
+async def on_message(bot_id: str, content: str) -> Dict[str, Any]:
+    """Route the user message, retrieve relevant docs, answer from them or clarify."""
+    result = None
+    async for event in on_message_stream(bot_id, content):
+        if event['type'] == 'done':
+            result = {"response": event['response'], "sources": event['sources'],
+                      "source_ids": event['source_ids'], "timings": event['timings']}
+    return result
+
+def overview(offset: int = 0, limit: Optional[int] = None) -> List[Agent]:
+    """Agents in creation order, optionally one page at a time."""
+    return [_agent_from_row(row) for row in get_agent_registry().list(offset, limit)]
@@ -0,0 +1,117 @@
+import os
+import csv
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from . import constants
+
+AGENT_COLUMNS = ('bot_id', 'name', 'description', 'starter', 'model', 'pipeline')
+
+
+class AgentRegistry:
+    """
+    SQLite (WAL) store of every agent, replacing the overview.csv scans.
+
+    Lookups by bot_id go through the primary key index, listing is paginated, and
+    upserts/deletes are single atomic statements, so concurrent creates from several
+    processes cannot interleave. An existing overview.csv is imported once.
+    """
+    def __init__(self, path: Optional[str] = None, csv_path: Optional[str] = None) -> None:
+        self.path = path or constants.AGENTS_DB_PATH
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS agents ('
+            'bot_id TEXT PRIMARY KEY, name TEXT NOT NULL, description TEXT NOT NULL, '
+            'starter TEXT NOT NULL, model TEXT NOT NULL, pipeline TEXT, '
+            'created_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS agents_created_at ON agents (created_at)')
+        self._migrate_csv(csv_path or constants.OVERVIEW_FILEPATH)
+
+    def _migrate_csv(self, csv_path: str):
+        if not os.path.exists(csv_path):
+            return
+        with open(csv_path, mode='r', newline='', encoding='utf-8') as file:
+            rows = [
+                {column: row.get(column) for column in AGENT_COLUMNS}
+                for row in csv.DictReader(file) if row.get('bot_id')
+            ]
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Existing agents win, re-running the migration is harmless
+                now = time.time()
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO agents ({', '.join(AGENT_COLUMNS)}, created_at) "
+                    f"VALUES ({', '.join('?' * (len(AGENT_COLUMNS) + 1))})",
+                    # Keep the CSV order for listing
+                    [(*(row[column] for column in AGENT_COLUMNS), now + i * 1e-6) for i, row in enumerate(rows)]
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        try:
+            os.replace(csv_path, csv_path + '.migrated')
+        except FileNotFoundError:
+            # Another process migrated it at the same time
+            pass
+        print(f"Migrated {len(rows)} agents from {csv_path} to {self.path}")
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, str]:
+        return {column: row[column] for column in AGENT_COLUMNS if row[column] is not None}
+
+    def get(self, bot_id: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM agents WHERE bot_id = ?', (bot_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Agents in creation order; limit=None returns everything from offset on."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM agents ORDER BY created_at, bot_id LIMIT ? OFFSET ?',
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM agents').fetchone()[0]
+
+    def upsert(self, agent: Dict[str, str]):
+        values = (*(agent.get(column) for column in AGENT_COLUMNS), time.time())
+        # created_at is only set on insert so updates keep the listing order
+        updates = ', '.join(f"{column} = excluded.{column}" for column in AGENT_COLUMNS[1:])
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO agents ({', '.join(AGENT_COLUMNS)}, created_at) "
+                f"VALUES ({', '.join('?' * (len(AGENT_COLUMNS) + 1))}) "
+                f"ON CONFLICT (bot_id) DO UPDATE SET {updates}",
+                values
+            )
+
+    def delete(self, bot_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute('DELETE FROM agents WHERE bot_id = ?', (bot_id,)).rowcount > 0
+
+
+_registry: Optional[AgentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_agent_registry() -> AgentRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AgentRegistry()
+        return _registry
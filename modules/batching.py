@@ -0,0 +1,65 @@
+import threading
+from typing import Any, Callable, List
+
+
+class _Slot:
+    __slots__ = ('item', 'result', 'error', 'done')
+
+    def __init__(self, item: Any) -> None:
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Groups concurrent single-item calls from many threads into one batched call.
+
+    The first caller of a batch becomes its leader: it waits up to max_wait seconds
+    (less if max_batch_size items arrive), runs batch_fn on every item collected so
+    far and hands each caller its own result. Callers running in an event loop
+    should go through asyncio.to_thread(batcher.submit, item).
+    """
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 32,
+                 max_wait: float = 0.005) -> None:
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._pending: List[_Slot] = []
+        self.stats = {'items': 0, 'batches': 0}
+
+    def submit(self, item: Any) -> Any:
+        slot = _Slot(item)
+        with self._cond:
+            self._pending.append(slot)
+            leader = len(self._pending) == 1
+            if len(self._pending) >= self.max_batch_size:
+                self._cond.notify_all()
+        if leader:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= self.max_batch_size, timeout=self.max_wait)
+                batch, self._pending = self._pending, []
+            self._run(batch)
+        slot.done.wait()
+        if slot.error is not None:
+            raise slot.error
+        return slot.result
+
+    def _run(self, batch: List[_Slot]):
+        with self._cond:
+            self.stats['items'] += len(batch)
+            self.stats['batches'] += 1
+        try:
+            results = self.batch_fn([slot.item for slot in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch function returned {len(results)} results for {len(batch)} items")
+            for slot, result in zip(batch, results):
+                slot.result = result
+        except Exception as e:
+            for slot in batch:
+                slot.error = e
+        finally:
+            for slot in batch:
+                slot.done.set()
@@ -18,3 +18,6 @@ class Bot:
 
 def get_db_dir(bot_id: str) -> str:
     return os.path.join('data', 'vector_db', bot_id)
+
+def get_source_dir(bot_id: str) -> str:
+    return os.path.join('data', 'source_documents', bot_id)
@@ -0,0 +1,268 @@
+"""
+Per-bot append-only store of chunk texts, written once by ingest.
+
+Texts are appended as UTF-8 to a blob file that is read through mmap, and a SQLite
+index maps every chunk id to its (offset, length) and metadata. Chunks of deleted or
+changed files are dropped from the index only; compact() rewrites the blob without
+them. Sources are shown and models re-embedded straight from here, without parsing
+the source files again:
+
+    python -m modules.chunk_store reembed --model nomic-embed-text [--bots ID ...]
+    python -m modules.chunk_store compact [--bots ID ...]
+"""
+import os
+import json
+import mmap
+import sqlite3
+import argparse
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+CHUNK_BLOB_FILENAME = 'chunks.bin'
+CHUNK_INDEX_FILENAME = 'chunks.sqlite3'
+
+_stores: Dict[str, 'ChunkStore'] = {}
+_stores_lock = threading.Lock()
+
+
+class ChunkStore:
+    """
+    Chunk texts of one bot, addressed by chunk id.
+
+    Reads slice the memory-mapped blob and decode only the requested chunks (or only
+    the first bytes of one, see preview), so no copy of the collection is kept in
+    memory and the OS page cache serves repeated reads.
+    """
+    def __init__(self, db_dir: str) -> None:
+        os.makedirs(db_dir, exist_ok=True)
+        self.blob_path = os.path.join(db_dir, CHUNK_BLOB_FILENAME)
+        open(self.blob_path, mode='ab').close()
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+        self._map_key = None
+        self._conn = sqlite3.connect(os.path.join(db_dir, CHUNK_INDEX_FILENAME), timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, offset INTEGER NOT NULL, '
+            'length INTEGER NOT NULL, metadata TEXT NOT NULL)'
+        )
+        self._conn.commit()
+
+    def _blob(self) -> Optional[mmap.mmap]:
+        # Remap when the blob grew or was replaced by compact(), possibly in another process
+        stat = os.stat(self.blob_path)
+        key = (stat.st_ino, stat.st_size)
+        if key != self._map_key:
+            if self._map is not None:
+                self._map.close()
+            self._map = None
+            if stat.st_size:
+                with open(self.blob_path, mode='rb') as file:
+                    self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_key = key
+        return self._map
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM chunks').fetchone()[0]
+
+    def append(self, chunk_ids: List[str], texts: List[str], metadatas: List[Dict]):
+        payloads = [text.encode('utf-8') for text in texts]
+        with self._lock:
+            with open(self.blob_path, mode='ab') as file:
+                offset = file.tell()
+                file.write(b''.join(payloads))
+            rows = []
+            for chunk_id, payload, metadata in zip(chunk_ids, payloads, metadatas):
+                rows.append((chunk_id, offset, len(payload), json.dumps(metadata)))
+                offset += len(payload)
+            self._conn.executemany('INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)', rows)
+            self._conn.commit()
+
+    def delete(self, chunk_ids: List[str]):
+        with self._lock:
+            self._conn.executemany('DELETE FROM chunks WHERE chunk_id = ?', [(chunk_id,) for chunk_id in chunk_ids])
+            self._conn.commit()
+
+    def rename(self, renames: Dict[str, str]):
+        """Give chunks new ids (old id -> new id) without touching their texts."""
+        with self._lock:
+            self._conn.executemany('UPDATE OR REPLACE chunks SET chunk_id = ? WHERE chunk_id = ?',
+                                   [(new, old) for old, new in renames.items() if new != old])
+            self._conn.commit()
+
+    def _locate(self, chunk_ids: List[str]) -> Dict[str, tuple]:
+        found = {}
+        for i in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT chunk_id, offset, length FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+            )
+            found.update((chunk_id, (offset, length)) for chunk_id, offset, length in rows)
+        return found
+
+    def get(self, chunk_ids: List[str]) -> List[Optional[str]]:
+        """Texts of chunk_ids in order, None for unknown ids."""
+        with self._lock:
+            locations = self._locate(chunk_ids)
+            blob = self._blob()
+            texts = []
+            for chunk_id in chunk_ids:
+                location = locations.get(chunk_id)
+                if location is None:
+                    texts.append(None)
+                    continue
+                offset, length = location
+                texts.append(str(blob[offset:offset + length], 'utf-8'))
+            return texts
+
+    def preview(self, chunk_id: str, max_chars: int = 400) -> Optional[str]:
+        """The start of a chunk, decoding at most max_chars characters' worth of bytes."""
+        with self._lock:
+            location = self._locate([chunk_id]).get(chunk_id)
+            if location is None:
+                return None
+            offset, length = location
+            # UTF-8 takes at most 4 bytes per character; a character cut in half is dropped
+            end = offset + min(length, max_chars * 4)
+            return str(self._blob()[offset:end], 'utf-8', errors='ignore')[:max_chars]
+
+    def iter_chunks(self, batch_size: int = 500) -> Iterator[Tuple[List[str], List[str], List[Dict]]]:
+        """Every chunk as (ids, texts, metadatas) batches, in blob order."""
+        last = (-1, '')
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT chunk_id, offset, length, metadata FROM chunks WHERE (offset, chunk_id) > (?, ?) '
+                    'ORDER BY offset, chunk_id LIMIT ?', (*last, batch_size)
+                ).fetchall()
+                if not rows:
+                    return
+                blob = self._blob()
+                texts = [str(blob[offset:offset + length], 'utf-8') for _, offset, length, _ in rows]
+            last = (rows[-1][1], rows[-1][0])
+            yield [row[0] for row in rows], texts, [json.loads(row[3]) for row in rows]
+
+    def dead_bytes(self) -> int:
+        """Bytes of the blob no longer referenced by the index."""
+        with self._lock:
+            live = self._conn.execute('SELECT COALESCE(SUM(length), 0) FROM chunks').fetchone()[0]
+        return os.path.getsize(self.blob_path) - live
+
+    def compact(self):
+        """
+        Rewrite the blob with the live chunks only. Readers in other processes remap
+        on their next read, run it while the bot is not being ingested or queried.
+        """
+        tmp_path = self.blob_path + '.tmp'
+        with self._lock:
+            rows = self._conn.execute('SELECT chunk_id, offset, length FROM chunks ORDER BY offset').fetchall()
+            blob = self._blob()
+            updates, offset = [], 0
+            with open(tmp_path, mode='wb') as file:
+                for chunk_id, old_offset, length in rows:
+                    file.write(blob[old_offset:old_offset + length])
+                    updates.append((offset, chunk_id))
+                    offset += length
+            self._conn.executemany('UPDATE chunks SET offset = ? WHERE chunk_id = ?', updates)
+            os.replace(tmp_path, self.blob_path)
+            self._conn.commit()
+
+
+def get_chunk_store(db_dir: str) -> ChunkStore:
+    """The process-wide chunk store of a bot, one SQLite connection and mapping per directory."""
+    path = os.path.abspath(db_dir)
+    with _stores_lock:
+        chunk_store = _stores.get(path)
+        if chunk_store is None:
+            chunk_store = _stores[path] = ChunkStore(path)
+        return chunk_store
+
+
+def backfill_chunk_store(db, chunk_store: ChunkStore, chunk_ids: List[str], batch_size: int = 500):
+    """Copy chunks ingested before the bot had a chunk store out of its vector store, by id."""
+    for i in range(0, len(chunk_ids), batch_size):
+        batch = db.get(ids=chunk_ids[i:i + batch_size], include=['documents', 'metadatas'])
+        chunk_store.append(batch['ids'], batch['documents'], batch['metadatas'])
+    print(f"Backfilled chunk store with {len(chunk_ids)} chunks")
+
+
+def _bot_ids(bots: Optional[List[str]]) -> List[str]:
+    if bots:
+        return bots
+    root = os.path.join('data', 'vector_db')
+    return sorted(os.listdir(root)) if os.path.isdir(root) else []
+
+
+def reembed(bot_ids: List[str], model: str, batch_size: int = 500):
+    """
+    Rebuild the bots' vectors with another embedding model from their chunk stores.
+
+    Vectors of different models cannot share a collection: in 'per_bot' mode each bot's
+    collection is recreated, in 'shared' mode every shard is, so every bot is migrated.
+    The chunk stores are only read, a run that failed midway is simply run again.
+    """
+    from . import constants
+    from .embeddings import get_embedding_model
+    from .manifest import Manifest
+    from .response_cache import mark_ingested
+    from .bot import get_db_dir
+    from .vector_store import SHARED_COLLECTION, TenantStore, get_client, shard_dir
+
+    embedding_model = get_embedding_model(model)
+    if constants.VECTOR_STORE_MODE == 'shared':
+        bot_ids = _bot_ids(None)
+    # Chunks ingested before the chunk store existed are copied out of Chroma while it still has them
+    for bot_id in bot_ids:
+        chunk_store, manifest = get_chunk_store(get_db_dir(bot_id)), Manifest(get_db_dir(bot_id))
+        if chunk_store.count() == 0 and manifest.files:
+            store = TenantStore(bot_id)
+            backfill_chunk_store(store, chunk_store, [i for key in manifest.files for i in manifest.chunk_ids(key)])
+    if constants.VECTOR_STORE_MODE == 'shared':
+        for shard in range(constants.VECTOR_STORE_SHARDS):
+            if os.path.isdir(shard_dir(shard)):
+                client = get_client(shard_dir(shard))
+                if SHARED_COLLECTION in [getattr(c, 'name', c) for c in client.list_collections()]:
+                    client.delete_collection(SHARED_COLLECTION)
+    for bot_id in bot_ids:
+        db_dir = get_db_dir(bot_id)
+        if constants.VECTOR_STORE_MODE == 'per_bot':
+            # Opened without the new model, the collection still records the old one
+            TenantStore(bot_id, db_dir=db_dir).db.delete_collection()
+        store = TenantStore(bot_id, embedding_model, db_dir=db_dir)
+        chunk_store = get_chunk_store(db_dir)
+        embedded = 0
+        for ids, texts, metadatas in chunk_store.iter_chunks(batch_size):
+            metadatas = [dict(metadata, chunk_id=chunk_id) for chunk_id, metadata in zip(ids, metadatas)]
+            store.upsert(ids, embedding_model.embed_documents(texts), texts, metadatas)
+            embedded += len(ids)
+        # Cached answers were found with the old vectors
+        mark_ingested(db_dir)
+        print(f"Re-embedded {embedded} chunks of bot {bot_id} with {model}")
+    print(f"Done, set the EMBEDDING_MODEL environment variable to {model} to query with the new vectors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the bots' chunk stores")
+    commands = parser.add_subparsers(dest='command', required=True)
+    reembed_parser = commands.add_parser('reembed', help="rebuild the vectors with another embedding model")
+    reembed_parser.add_argument('--model', required=True)
+    reembed_parser.add_argument('--bots', nargs='*', help="bot ids ('per_bot' mode only), defaults to every bot")
+    compact_parser = commands.add_parser('compact', help="drop the texts of deleted chunks from the blobs")
+    compact_parser.add_argument('--bots', nargs='*', help="bot ids, defaults to every bot")
+    args = parser.parse_args()
+
+    if args.command == 'reembed':
+        reembed(_bot_ids(args.bots), args.model)
+        return
+    from .bot import get_db_dir
+    for bot_id in _bot_ids(args.bots):
+        chunk_store = get_chunk_store(get_db_dir(bot_id))
+        dead = chunk_store.dead_bytes()
+        if dead:
+            chunk_store.compact()
+            print(f"Compacted the chunk store of bot {bot_id}, {dead} bytes freed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import re
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from . import constants
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.?!])\s+')
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (words and punctuation), close enough for sizing chunks."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+class Chunker:
+    """
+    Splits documents into chunks, one document at a time.
+
+    In 'semantic' mode every sentence is embedded exactly once: a new chunk starts
+    where the distance between adjacent sentences is above the document's
+    breakpoint_percentile, or when the chunk would exceed chunk_size characters, and
+    each chunk's embedding is the normalized mean of its sentence embeddings, so
+    chunks need no second embedding pass. 'fast' mode is a plain recursive split at
+    chunk_tokens tokens and leaves embedding to the vectorstore.
+
+    Counters of the current run are kept in stats.
+    """
+    def __init__(self, mode: Optional[str] = None, embedding_model=None, chunk_size: int = constants.CHUNK_SIZE,
+                 chunk_tokens: int = constants.CHUNK_TOKENS, overlap_tokens: int = constants.CHUNK_OVERLAP_TOKENS,
+                 breakpoint_percentile: float = constants.SEMANTIC_BREAKPOINT_PERCENTILE) -> None:
+        self.mode = mode or constants.CHUNKING_MODE
+        if self.mode not in constants.CHUNKING_MODES:
+            raise ValueError(f"Unknown chunking mode '{self.mode}', expected one of {constants.CHUNKING_MODES}")
+        if self.mode == 'semantic' and embedding_model is None:
+            raise ValueError("Semantic chunking needs an embedding model")
+        self.embedding_model = embedding_model
+        self.chunk_size = chunk_size
+        self.breakpoint_percentile = breakpoint_percentile
+        # Sentences longer than a chunk are cut down before embedding
+        self._sentence_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+        self._token_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_tokens, chunk_overlap=overlap_tokens, length_function=count_tokens
+        )
+        self.stats = {'documents': 0, 'chunks': 0, 'sentences': 0, 'seconds': 0.0}
+
+    def _sentences(self, text: str) -> List[str]:
+        sentences = []
+        for sentence in SENTENCE_PATTERN.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if len(sentence) > self.chunk_size:
+                sentences.extend(self._sentence_splitter.split_text(sentence))
+            else:
+                sentences.append(sentence)
+        return sentences
+
+    def _semantic_split(self, document: Document) -> Tuple[List[Document], List[List[float]]]:
+        sentences = self._sentences(document.page_content)
+        if not sentences:
+            return [], []
+        vectors = np.asarray(self.embedding_model.embed_documents(sentences), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        self.stats['sentences'] += len(sentences)
+
+        distances = 1.0 - np.sum(vectors[:-1] * vectors[1:], axis=1)
+        threshold = np.percentile(distances, self.breakpoint_percentile) if len(distances) else np.inf
+
+        groups, start, length = [], 0, len(sentences[0])
+        for i in range(1, len(sentences)):
+            # +1 for the joining space
+            if distances[i - 1] > threshold or length + 1 + len(sentences[i]) > self.chunk_size:
+                groups.append((start, i))
+                start, length = i, len(sentences[i])
+            else:
+                length += 1 + len(sentences[i])
+        groups.append((start, len(sentences)))
+
+        chunks, embeddings = [], []
+        for start, end in groups:
+            chunks.append(Document(page_content=' '.join(sentences[start:end]), metadata=dict(document.metadata)))
+            pooled = vectors[start:end].mean(axis=0)
+            embeddings.append((pooled / max(np.linalg.norm(pooled), 1e-12)).tolist())
+        return chunks, embeddings
+
+    def split_document(self, document: Document) -> Tuple[List[Document], Optional[List[List[float]]]]:
+        """Chunks of one document, with their embeddings in semantic mode (None in fast mode)."""
+        start = time.perf_counter()
+        if self.mode == 'semantic':
+            chunks, embeddings = self._semantic_split(document)
+        else:
+            chunks, embeddings = self._token_splitter.split_documents([document]), None
+        self.stats['documents'] += 1
+        self.stats['chunks'] += len(chunks)
+        self.stats['seconds'] += time.perf_counter() - start
+        return chunks, embeddings
+
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[Tuple[List[Document], Optional[List[List[float]]]]]:
+        for document in documents:
+            yield self.split_document(document)
+
+    def split_documents(self, documents: Iterable[Document]) -> Tuple[List[Document], Optional[List[List[float]]]]:
+        chunks, embeddings = [], []
+        for document_chunks, document_embeddings in self.iter_chunks(documents):
+            chunks.extend(document_chunks)
+            if document_embeddings is not None:
+                embeddings.extend(document_embeddings)
+        return chunks, embeddings if self.mode == 'semantic' else None
+
+    def report(self) -> str:
+        seconds = self.stats['seconds']
+        rate = self.stats['chunks'] / seconds if seconds else 0.0
+        return (f"Chunked {self.stats['documents']} documents into {self.stats['chunks']} chunks "
+                f"({self.mode}, {self.stats['sentences']} sentences embedded) in {seconds:.2f}s, {rate:.0f} chunks/s")
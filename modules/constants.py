@@ -9,6 +9,114 @@ CHROMA_SETTINGS = {
 SOURCE_DIRECTORY = os.environ.get('SOURCE_DIRECTORY', 'source_documents')
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
+# 'semantic' splits at topic shifts between sentences and pools their embeddings into the
+# chunk embeddings, 'fast' splits at CHUNK_TOKENS (approximate) tokens and embeds each chunk
+CHUNKING_MODES = ('semantic', 'fast')
+CHUNKING_MODE = os.environ.get('CHUNKING_MODE', 'semantic')
+# Adjacent-sentence distance percentile above which the semantic mode starts a new chunk
+SEMANTIC_BREAKPOINT_PERCENTILE = float(os.environ.get('SEMANTIC_BREAKPOINT_PERCENTILE', 95))
+CHUNK_TOKENS = int(os.environ.get('CHUNK_TOKENS', 128))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get('CHUNK_OVERLAP_TOKENS', 12))
+# Processes used to parse and clean documents, 1 loads serially
+LOAD_WORKERS = int(os.environ.get('LOAD_WORKERS', 1))
 
-# CSV file that tracks all agents
+# Question answering pipelines an agent can run:
+# sequential - contextualize, route, retrieve, check relevancy, answer, one after the other
+# parallel   - retrieve and rerank speculatively while the LLM routes
+# fast       - parallel, plus a heuristic router and one combined relevancy/answer call
+PIPELINE_MODES = ('sequential', 'parallel', 'fast')
+# LLMs the prompt templates are written for
+SUPPORTED_MODELS = ('llama3',)
+
+# Registry of all agents, and the CSV it used to be, imported once on first use
+AGENTS_DB_PATH = os.path.join('data', 'agents.sqlite3')
 OVERVIEW_FILEPATH = os.path.join('data', 'overview.csv')
+
+# Shared model registry
+RERANKER_MODEL = "mixedbread-ai/mxbai-rerank-large-v1"
+# 'torch' runs the reranker in fp32, 'int8' applies dynamic int8 quantization for CPU
+RERANKER_BACKEND = os.environ.get('RERANKER_BACKEND', 'torch')
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get('MODEL_MEMORY_BUDGET_MB', 4096))
+MODEL_IDLE_TTL = float(os.environ.get('MODEL_IDLE_TTL', 900))
+MAX_CACHED_AGENTS = int(os.environ.get('MAX_CACHED_AGENTS', 64))
+
+# Embeddings
+# Must match the model the bots' collections were embedded with, change it with
+# python -m modules.chunk_store reembed --model NAME
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'mxbai-embed-large')
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 64))
+EMBEDDING_CONCURRENCY = int(os.environ.get('EMBEDDING_CONCURRENCY', 4))
+# Set to an empty string to disable the on-disk cache
+EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH', os.path.join('data', 'embedding_cache.sqlite3'))
+
+# Per-bot semantic response cache, RESPONSE_CACHE_SIZE=0 disables it
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get('RESPONSE_CACHE_THRESHOLD', 0.95))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 3600))
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+
+# Characters of each source chunk sent along with an answer, the full texts stay in the chunk store
+SOURCE_PREVIEW_CHARS = int(os.environ.get('SOURCE_PREVIEW_CHARS', 400))
+
+# Retrieval: 'hybrid' fuses Chroma and the BM25 index, 'dense' or 'lexical' use one of them
+RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'hybrid')
+# Chunks returned by retrieval (and taken from each of the dense and lexical searches before fusion)
+RETRIEVAL_K = int(os.environ.get('RETRIEVAL_K', 20))
+# Seconds to wait for the dense search before answering from the lexical index alone
+DENSE_SEARCH_TIMEOUT = float(os.environ.get('DENSE_SEARCH_TIMEOUT', 5))
+
+# Reranking
+RERANK_BATCH_SIZE = int(os.environ.get('RERANK_BATCH_SIZE', 16))
+# torch intra-op threads for reranking, 0 keeps torch's default
+RERANK_THREADS = int(os.environ.get('RERANK_THREADS', 0))
+# Only the top candidates by retrieval score are reranked, 0 reranks all RETRIEVAL_K of them
+RERANK_MAX_CANDIDATES = int(os.environ.get('RERANK_MAX_CANDIDATES', 10))
+RERANK_CACHE_SIZE = int(os.environ.get('RERANK_CACHE_SIZE', 10000))
+
+# Concurrency of the async request path
+RERANK_WORKERS = int(os.environ.get('RERANK_WORKERS', 2))
+# Messages processed at once per bot, further ones wait for a slot
+BOT_CONCURRENCY = int(os.environ.get('BOT_CONCURRENCY', 4))
+
+# Micro-batching of embedding and reranking calls across requests in the HTTP server
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+
+# Prompt layout: 'classic' or 'prefix_cache', where every prompt starts with the same system
+# text and the documents and question come before the stage's task, so Ollama reuses the
+# evaluated prefix from the relevancy check when answering
+PROMPT_LAYOUTS = ('classic', 'prefix_cache')
+PROMPT_LAYOUT = os.environ.get('PROMPT_LAYOUT', 'classic')
+# Sent with every generate request: how long Ollama keeps the model and its prompt cache
+# loaded, and a fixed context size (a request with another num_ctx reloads the model)
+OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+OLLAMA_NUM_CTX = int(os.environ.get('OLLAMA_NUM_CTX', 4096))
+
+# Conversation memory: the last MEMORY_MAX_EXCHANGES question/answer pairs within
+# MEMORY_TOKEN_BUDGET tokens go into the contextualization prompt, older ones as a summary
+MEMORY_TOKEN_BUDGET = int(os.environ.get('MEMORY_TOKEN_BUDGET', 512))
+MEMORY_MAX_EXCHANGES = int(os.environ.get('MEMORY_MAX_EXCHANGES', 4))
+
+# Comma separated Ollama models loaded when the HTTP server starts (e.g. llama3), together
+# with the embedding model and the reranker, so the first request does not pay for loading
+WARMUP_MODELS = [name for name in os.environ.get('WARMUP_MODELS', '').split(',') if name.strip()]
+
+# Chroma layout: 'per_bot' keeps one DB per bot under data/vector_db, 'shared' spreads the
+# bots over VECTOR_STORE_SHARDS collections under VECTOR_STORE_DIR, searched with a bot_id
+# filter. Existing bots are moved over with python -m modules.vector_store migrate
+VECTOR_STORE_MODES = ('per_bot', 'shared')
+VECTOR_STORE_MODE = os.environ.get('VECTOR_STORE_MODE', 'per_bot')
+VECTOR_STORE_DIR = os.environ.get('VECTOR_STORE_DIR', os.path.join('data', 'vector_store'))
+VECTOR_STORE_SHARDS = int(os.environ.get('VECTOR_STORE_SHARDS', 4))
+
+# Background ingestion jobs; a running job without a heartbeat for INGEST_JOB_STALE_SECONDS
+# is considered orphaned (its worker died) and is resumed by the next free worker
+INGEST_JOBS_DB_PATH = os.environ.get('INGEST_JOBS_DB_PATH', os.path.join('data', 'ingest_jobs.sqlite3'))
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+INGEST_JOB_STALE_SECONDS = float(os.environ.get('INGEST_JOB_STALE_SECONDS', 60))
+
+# Pipeline telemetry, off unless TELEMETRY_ENABLED is set. Spans are appended to
+# TELEMETRY_TRACE_PATH (JSON lines) when set, metrics are served on /metrics by the
+# HTTP server, or on TELEMETRY_METRICS_PORT by other processes (0 disables)
+TELEMETRY_ENABLED = os.environ.get('TELEMETRY_ENABLED', '').lower() in ('1', 'true', 'yes')
+TELEMETRY_TRACE_PATH = os.environ.get('TELEMETRY_TRACE_PATH', '')
+TELEMETRY_METRICS_PORT = int(os.environ.get('TELEMETRY_METRICS_PORT', 0))
@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from . import constants
+from .batching import MicroBatcher
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent (model, normalized text hash) -> vector cache stored in SQLite."""
+    def __init__(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, '
+            'PRIMARY KEY (model, key)) WITHOUT ROWID'
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                )
+                for key, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)',
+                [(model, key, array('f', vector).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    OllamaEmbeddings with request batching, bounded concurrency and a persistent cache.
+
+    Texts are deduplicated and looked up in the cache first; only the misses are sent
+    to the Ollama server, batch_size texts per request and at most max_concurrency
+    requests in flight across every caller sharing this instance.
+    """
+    def __init__(self, model: str = constants.EMBEDDING_MODEL, batch_size: Optional[int] = None,
+                 max_concurrency: Optional[int] = None, cache_path: Optional[str] = None, **ollama_kwargs) -> None:
+        self.model = model
+        self.batch_size = batch_size or constants.EMBEDDING_BATCH_SIZE
+        max_concurrency = max_concurrency or constants.EMBEDDING_CONCURRENCY
+        # Imported here, langchain_ollama alone takes over a second to import
+        from langchain_ollama import OllamaEmbeddings
+        self.client = OllamaEmbeddings(model=model, **ollama_kwargs)
+        cache_path = constants.EMBEDDING_CACHE_PATH if cache_path is None else cache_path
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='embed')
+        # Counted from every thread embedding through this instance, read them with stats_snapshot()
+        self.stats = {'texts': 0, 'cache_hits': 0, 'embedded': 0, 'requests': 0}
+        self._stats_lock = threading.Lock()
+        self.query_batcher: Optional[MicroBatcher] = None
+        self._thread_stats = threading.local()
+
+    def enable_query_batching(self, max_batch_size: int, max_wait: float):
+        """Coalesce embed_query calls from concurrent requests into shared embed_documents calls."""
+        self.query_batcher = MicroBatcher(self.embed_documents, max_batch_size, max_wait)
+
+    def _count(self, **deltas: int):
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                self.stats[name] += delta
+
+    def stats_snapshot(self) -> Dict[str, int]:
+        """A consistent copy of the counters."""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self._count(requests=1)
+        return self.client.embed_documents(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(text) for text in texts]
+        vectors = self.cache.get_many(self.model, list(set(keys))) if self.cache else {}
+        self._count(texts=len(texts), cache_hits=sum(1 for key in keys if key in vectors))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            missing_keys = list(missing)
+            batches = [missing_keys[i:i + self.batch_size] for i in range(0, len(missing_keys), self.batch_size)]
+            results = self._executor.map(lambda batch: self._embed_batch([missing[k] for k in batch]), batches)
+            new_vectors = {}
+            for batch, batch_vectors in zip(batches, results):
+                new_vectors.update(zip(batch, batch_vectors))
+            self._count(embedded=len(new_vectors))
+            self._thread_stats.embedded = self.embedded_in_thread() + len(new_vectors)
+            if self.cache:
+                self.cache.put_many(self.model, new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[key] for key in keys]
+
+    def embedded_in_thread(self) -> int:
+        """Texts sent to the server (cache misses) by the calling thread so far."""
+        return getattr(self._thread_stats, 'embedded', 0)
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_batcher is not None:
+            return self.query_batcher.submit(text)
+        return self.embed_documents([text])[0]
+
+
+_embedding_models: Dict[str, BatchedEmbeddings] = {}
+_embedding_models_lock = threading.Lock()
+
+
+def get_embedding_model(model: str = constants.EMBEDDING_MODEL) -> BatchedEmbeddings:
+    """Process-wide embedding model, so every caller shares one cache and request budget."""
+    with _embedding_models_lock:
+        if model not in _embedding_models:
+            _embedding_models[model] = BatchedEmbeddings(model)
+        return _embedding_models[model]
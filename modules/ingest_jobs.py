@@ -0,0 +1,343 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from . import constants
+
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+
+JOB_COLUMNS = (
+    'job_id', 'bot_id', 'db_dir', 'source_dir', 'status', 'cancel_requested',
+    'files_total', 'files_done', 'chunks', 'embeddings', 'error', 'attempts',
+    'created_at', 'started_at', 'finished_at', 'heartbeat',
+)
+
+
+class IngestJobQueue:
+    """
+    Persistent queue of ingestion jobs stored in SQLite (WAL).
+
+    Jobs are claimed atomically, at most one running job per bot. Running jobs carry
+    a heartbeat; a job whose worker stopped beating (crash, restart) is claimed again
+    and, since ingest checkpoints every file in the bot's manifest, resumes with the
+    files that were not ingested yet.
+    """
+    def __init__(self, path: Optional[str] = None, stale_after: Optional[float] = None) -> None:
+        self.path = path or constants.INGEST_JOBS_DB_PATH
+        self.stale_after = constants.INGEST_JOB_STALE_SECONDS if stale_after is None else stale_after
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'job_id TEXT PRIMARY KEY, bot_id TEXT NOT NULL, db_dir TEXT NOT NULL, source_dir TEXT NOT NULL, '
+            "status TEXT NOT NULL DEFAULT 'queued', cancel_requested INTEGER NOT NULL DEFAULT 0, "
+            'files_total INTEGER NOT NULL DEFAULT 0, files_done INTEGER NOT NULL DEFAULT 0, '
+            'chunks INTEGER NOT NULL DEFAULT 0, embeddings INTEGER NOT NULL DEFAULT 0, '
+            'error TEXT, attempts INTEGER NOT NULL DEFAULT 0, '
+            'created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_bot ON jobs (bot_id, created_at)')
+
+    def submit(self, bot_id: str, db_dir: str, source_dir: str) -> str:
+        """Queue an ingestion of source_dir into db_dir; returns the job id."""
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (job_id, bot_id, db_dir, source_dir, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, bot_id, db_dir, source_dir, time.time())
+            )
+        return job_id
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = {column: row[column] for column in JOB_COLUMNS}
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        elapsed = 0.0
+        if job['started_at']:
+            elapsed = max((job['finished_at'] or time.time()) - job['started_at'], 1e-9)
+        job['elapsed'] = elapsed
+        job['progress'] = job['files_done'] / job['files_total'] if job['files_total'] else float(job['status'] == 'done')
+        job['files_per_s'] = job['files_done'] / elapsed if elapsed else 0.0
+        job['chunks_per_s'] = job['chunks'] / elapsed if elapsed else 0.0
+        job['embeddings_per_s'] = job['embeddings'] / elapsed if elapsed else 0.0
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job with its counters, progress (0-1) and throughput (files/s, chunks/s, embeddings/s)."""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, bot_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally only those of one bot."""
+        with self._lock:
+            if bot_id is None:
+                rows = self._conn.execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+            else:
+                rows = self._conn.execute(
+                    'SELECT * FROM jobs WHERE bot_id = ? ORDER BY created_at DESC LIMIT ?', (bot_id, limit)
+                ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job right away, or ask its worker to stop after the current file."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                cancelled = self._conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'",
+                    (time.time(), job_id)
+                ).rowcount
+                if not cancelled:
+                    cancelled = self._conn.execute(
+                        "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'", (job_id,)
+                    ).rowcount
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return cancelled > 0
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Take the oldest queued job, or an orphaned running one, and mark it running.
+        Bots that already have a live running job are skipped.
+        """
+        now = time.time()
+        stale = now - self.stale_after
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE (status = 'queued' OR (status = 'running' AND heartbeat < ?)) "
+                    "AND bot_id NOT IN (SELECT bot_id FROM jobs WHERE status = 'running' AND heartbeat >= ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (stale, stale)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?), "
+                        "heartbeat = ?, attempts = attempts + 1 WHERE job_id = ?",
+                        (now, now, row['job_id'])
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return self.get(row['job_id']) if row is not None else None
+
+    def heartbeat(self, job_ids: List[str]):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET heartbeat = ? WHERE job_id = ? AND status = 'running'",
+                [(time.time(), job_id) for job_id in job_ids]
+            )
+
+    def set_remaining(self, job_id: str, files: int):
+        # A resumed job only sees the files its previous attempt did not finish
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET files_total = files_done + ?, heartbeat = ? WHERE job_id = ?',
+                (files, time.time(), job_id)
+            )
+
+    def add_progress(self, job_id: str, files: int = 0, chunks: int = 0, embeddings: int = 0):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET files_done = files_done + ?, chunks = chunks + ?, '
+                'embeddings = embeddings + ?, heartbeat = ? WHERE job_id = ?',
+                (files, chunks, embeddings, time.time(), job_id)
+            )
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute('SELECT cancel_requested FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        if status not in FINISHED_STATES:
+            raise ValueError(f"status must be one of {FINISHED_STATES}")
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?',
+                (status, error, time.time(), job_id)
+            )
+
+
+class IngestWorkerPool:
+    """
+    Worker threads running the jobs of an IngestJobQueue in the background.
+
+    Each worker claims one job at a time and runs ingest() with progress and
+    cancellation hooks; a separate thread keeps the heartbeat of running jobs fresh
+    while a single large file is being embedded.
+    """
+    def __init__(self, queue: IngestJobQueue, workers: Optional[int] = None, poll_interval: float = 1.0) -> None:
+        self.queue = queue
+        self.workers = workers or constants.INGEST_WORKERS
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running: Dict[str, str] = {}
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'ingest-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._beat, name='ingest-heartbeat', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, wait: bool = True):
+        """Stop claiming jobs; running jobs stay 'running' and are resumed after a restart."""
+        self._stop.set()
+        self._wake.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def notify(self):
+        """Wake idle workers, e.g. right after a submit."""
+        self._wake.set()
+
+    def _beat(self):
+        interval = max(self.queue.stale_after / 4, 0.1)
+        while not self._stop.wait(interval):
+            with self._running_lock:
+                job_ids = list(self._running)
+            if job_ids:
+                self.queue.heartbeat(job_ids)
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            with self._running_lock:
+                self._running[job['job_id']] = job['bot_id']
+            try:
+                self._run(job)
+            finally:
+                with self._running_lock:
+                    self._running.pop(job['job_id'], None)
+
+    def _run(self, job: Dict[str, Any]):
+        # The ingestion stack (loaders, splitters, Chroma) is only imported once there is work
+        from .ingestion import ingest
+        job_id = job['job_id']
+        if job['attempts'] > 1:
+            print(f"Resuming ingestion job {job_id} ({job['files_done']} files already done)")
+
+        def progress(event: str, **info):
+            if event == 'start':
+                self.queue.set_remaining(job_id, info['files'])
+            elif event == 'file':
+                self.queue.add_progress(job_id, files=1, chunks=info['chunks'], embeddings=info['embeddings'])
+
+        def should_cancel() -> bool:
+            return self._stop.is_set() or self.queue.cancel_requested(job_id)
+
+        try:
+            completed = ingest(job['db_dir'], job['source_dir'], progress=progress, should_cancel=should_cancel,
+                               bot_id=job['bot_id'])
+        except Exception as e:
+            print(f"Ingestion job {job_id} failed: {type(e).__name__}: {e}")
+            self.queue.finish(job_id, 'failed', f"{type(e).__name__}: {e}")
+            return
+        if completed:
+            self.queue.finish(job_id, 'done')
+        elif not self._stop.is_set():
+            self.queue.finish(job_id, 'cancelled')
+        # Stopped by shutdown: leave it running so the next start resumes it
+
+
+def _lock_file(path: str):
+    """An open file holding an exclusive lock on path, or None if another process holds it."""
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): every process drains the queue, run a single one there
+        return open(path, mode='a')
+    file = open(path, mode='a')
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        file.close()
+        return None
+    return file
+
+
+class IngestService:
+    """
+    A job queue together with the worker pool draining it.
+
+    Chroma's local persistent mode does not support writers in several processes, so
+    only the process holding the queue's lock file runs the workers. Other processes
+    (e.g. further server workers) only queue jobs, and take over on their next submit
+    once the owner has exited.
+    """
+    def __init__(self, queue: Optional[IngestJobQueue] = None, workers: Optional[int] = None) -> None:
+        self.queue = queue or IngestJobQueue()
+        self.pool = IngestWorkerPool(self.queue, workers)
+        self._owner_lock = None
+        self._take_ownership()
+
+    @property
+    def owner(self) -> bool:
+        return self._owner_lock is not None
+
+    def _take_ownership(self):
+        if self._owner_lock is None:
+            self._owner_lock = _lock_file(self.queue.path + '.lock')
+            if self._owner_lock is not None:
+                self.pool.start()
+
+    def submit(self, bot_id: str, db_dir: str, source_dir: str) -> str:
+        job_id = self.queue.submit(bot_id, db_dir, source_dir)
+        self._take_ownership()
+        # The owner in another process picks the job up within its poll interval
+        self.pool.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.queue.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        return self.queue.cancel(job_id)
+
+
+_service: Optional[IngestService] = None
+_service_lock = threading.Lock()
+
+
+def ingest_owner() -> bool:
+    """Whether this process runs the ingestion jobs, without starting the service."""
+    return _service is not None and _service.owner
+
+
+def get_ingest_service() -> IngestService:
+    """Process-wide ingestion service; its workers start on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = IngestService()
+        return _service
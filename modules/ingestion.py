@@ -1,14 +1,21 @@
 import os
-import glob
-from langchain_community.vectorstores import Chroma
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List
-
-from .constants import CHROMA_SETTINGS, CHUNK_SIZE, CHUNK_OVERLAP
-from .utils import load_documents
+from typing import Callable, List, Optional
+
+from .chunk_store import backfill_chunk_store, get_chunk_store
+from .chunking import Chunker
+from .embeddings import get_embedding_model
+from .lexical import LexicalIndex
+from .manifest import Manifest, chunk_ids_for
+from .response_cache import mark_ingested
+from .utils import load_documents, list_source_files, iter_documents
+from .vector_store import TenantStore
 from langchain.docstore.document import Document
-from langchain_ollama import OllamaEmbeddings
+
+def split_documents(documents: List[Document], embedding_model=None) -> List[Document]:
+    # Semantic chunking when an embedding model is given, token-sized chunks otherwise
+    chunker = Chunker('semantic' if embedding_model else 'fast', embedding_model)
+    texts, _ = chunker.split_documents(documents)
+    return texts
 
 def process_documents(source_folder: str, embedding_model=None, ignored_files=None) -> List[Document]:
     print(f"Loading documents from {source_folder}")
@@ -16,45 +23,135 @@ def process_documents(source_folder: str, embedding_model=None, ignored_files=No
     if not documents:
         print("No new documents to load")
         return []
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP
-    )
-    # Optionally do semantic chunking
-    if embedding_model:
-        text_splitter_semantic = SemanticChunker(embedding_model)
-        documents = text_splitter_semantic.split_documents(documents)
-    texts = text_splitter.split_documents(documents)
-    print(f"Split into {len(texts)} chunks of text (max. {CHUNK_SIZE} tokens each)")
+    texts = split_documents(documents, embedding_model)
+    print(f"Split into {len(texts)} chunks of text")
     return texts
 
-def does_vectorstore_exist(persist_directory: str) -> bool:
-    if os.path.exists(os.path.join(persist_directory, 'index')):
-        if os.path.exists(os.path.join(persist_directory, 'chroma-collections.parquet')) and \
-           os.path.exists(os.path.join(persist_directory, 'chroma-embeddings.parquet')):
-            list_index_files = glob.glob(os.path.join(persist_directory, 'index/*.bin'))
-            list_index_files += glob.glob(os.path.join(persist_directory, 'index/*.pkl'))
-            if len(list_index_files) > 3:
-                return True
-    return False
-
-def ingest(db_folder: str, source_folder: str):
-    embedding_model = OllamaEmbeddings(model="mxbai-embed-large")
-    if does_vectorstore_exist(db_folder):
-        print(f"Appending to existing vectorstore at {db_folder}")
-        db = Chroma(persist_directory=db_folder, embedding_function=embedding_model, client_settings=CHROMA_SETTINGS)
-        collection = db.get()
-        texts = process_documents(
-            source_folder, 
-            embedding_model=embedding_model, 
-            ignored_files=[metadata['source'] for metadata in collection['metadatas']]
-        )
-        print(f"Creating embeddings. May take some minutes...")
-        db.add_documents(texts)
-    else:
-        print("Creating new vectorstore")
-        texts = process_documents(source_folder, embedding_model=embedding_model)
-        print(f"Creating embeddings. May take some minutes...")
-        db = Chroma.from_documents(texts, embedding_model, persist_directory=db_folder)
-    db.persist()
+def seed_manifest(db: TenantStore, manifest: Manifest, source_folder: str, batch_size: int = 500) -> bool:
+    """
+    Put chunks ingested before the bot had a manifest (random ids) into it, grouped by
+    their source file, so ingest replaces them instead of embedding every file again
+    next to them. Returns True if any were found.
+    """
+    seeded = 0
+    while True:
+        batch = db.get_page(include=['metadatas'], limit=batch_size, offset=seeded)
+        if not batch['ids']:
+            break
+        by_key = {}
+        for chunk_id, metadata in zip(batch['ids'], batch['metadatas']):
+            source = (metadata or {}).get('source')
+            # Chunks without a source match no file on disk and are deleted as removed
+            key = os.path.relpath(source, source_folder) if source else ''
+            by_key.setdefault(key, []).append(chunk_id)
+        for key, chunk_ids in by_key.items():
+            manifest.seed(key, chunk_ids)
+        seeded += len(batch['ids'])
+    if seeded:
+        print(f"Found {seeded} chunks ingested without a manifest, they are replaced by this ingest")
+    return seeded > 0
+
+def backfill_lexical_index(db: TenantStore, lexical_index: LexicalIndex, manifest: Manifest, batch_size: int = 500):
+    """Index chunks ingested before the bot had a lexical index, reading them from Chroma by id."""
+    chunk_ids = [chunk_id for key in manifest.files for chunk_id in manifest.chunk_ids(key)]
+    for i in range(0, len(chunk_ids), batch_size):
+        batch = db.get(ids=chunk_ids[i:i + batch_size], include=['documents', 'metadatas'])
+        lexical_index.add(batch['ids'], batch['documents'], batch['metadatas'])
+    print(f"Backfilled lexical index with {len(chunk_ids)} chunks")
+
+def ingest(db_folder: str, source_folder: str, progress: Optional[Callable[..., None]] = None,
+           should_cancel: Optional[Callable[[], bool]] = None, chunking_mode: Optional[str] = None,
+           bot_id: Optional[str] = None) -> bool:
+    """
+    Embed only new or changed files of source_folder into the vectorstore at db_folder.
+
+    Files are tracked in a per-bot manifest (content hash, mtime, chunk ids), so
+    chunks of modified or removed files are deleted by id and unchanged files are
+    never re-read, without loading the collection itself. Every chunk also goes into
+    the bot's lexical (BM25) index used by hybrid retrieval and its chunk store, which
+    sources are displayed and models re-embedded from.
+
+    :param progress: called as progress('start', files=n) once the changed files are
+        known, then progress('file', path=..., chunks=..., embeddings=...) per ingested file
+    :param should_cancel: polled between files, ingest stops early once it returns True
+    :param chunking_mode: 'semantic' or 'fast', defaults to CHUNKING_MODE
+    :param bot_id: owner of the chunks in a shared vector store, defaults to the name of db_folder
+    :return: False if cancelled, True otherwise
+    """
+    manifest = Manifest(db_folder)
+    lexical_index = LexicalIndex(db_folder)
+    chunk_store = get_chunk_store(db_folder)
+    bot_id = bot_id or os.path.basename(os.path.normpath(db_folder))
     db = None
+    # Seeded chunks are all replaced below, there is nothing to backfill from them
+    seeded = False
+    if not os.path.exists(manifest.path):
+        db = TenantStore(bot_id, db_dir=db_folder)
+        seeded = seed_manifest(db, manifest, source_folder)
+    needs_backfill = not seeded and lexical_index.count() == 0 and bool(manifest.files)
+    needs_store_backfill = not seeded and chunk_store.count() == 0 and bool(manifest.files)
+    changed, removed = manifest.diff(source_folder, list_source_files(source_folder))
+    if progress:
+        progress('start', files=len(changed))
+    if not changed and not removed and not needs_backfill and not needs_store_backfill:
+        print("No new documents to load")
+        manifest.save()
+        return True
+    print(f"{len(changed)} new or changed and {len(removed)} removed files in {source_folder}")
+
+    embedding_model = get_embedding_model()
+    db = TenantStore(bot_id, embedding_model, db_dir=db_folder)
+    if needs_backfill:
+        backfill_lexical_index(db, lexical_index, manifest)
+    if needs_store_backfill:
+        backfill_chunk_store(db, chunk_store, [i for key in manifest.files for i in manifest.chunk_ids(key)])
+
+    for key in removed:
+        stale_ids = manifest.chunk_ids(key)
+        if stale_ids:
+            db.delete(ids=stale_ids)
+            lexical_index.delete(stale_ids)
+            chunk_store.delete(stale_ids)
+        manifest.forget(key)
+    manifest.save()
+    # Cached answers may cite chunks that are about to change
+    mark_ingested(db_folder)
+
+    print(f"Creating embeddings. May take some minutes...")
+    chunker = Chunker(chunking_mode, embedding_model)
+    pending = {file_path: (key, content_hash) for file_path, key, content_hash in changed}
+    try:
+        # Files are parsed in parallel and embedded as soon as each one is ready
+        for file_path, documents in iter_documents(list(pending)):
+            if should_cancel and should_cancel():
+                print(f"Ingestion of {source_folder} cancelled")
+                return False
+            key, content_hash = pending[file_path]
+            embedded_before = embedding_model.embedded_in_thread()
+            stale_ids = manifest.chunk_ids(key)
+            if stale_ids:
+                db.delete(ids=stale_ids)
+                lexical_index.delete(stale_ids)
+                chunk_store.delete(stale_ids)
+                manifest.forget(key)
+            texts, embeddings = chunker.split_documents(documents)
+            ids = [db.scoped_id(chunk_id) for chunk_id in chunk_ids_for(key, content_hash, len(texts))]
+            for text, chunk_id in zip(texts, ids):
+                text.metadata['chunk_id'] = chunk_id
+            if texts:
+                db.add(texts, ids, embeddings)
+                contents, metadatas = [text.page_content for text in texts], [text.metadata for text in texts]
+                lexical_index.add(ids, contents, metadatas)
+                chunk_store.append(ids, contents, metadatas)
+            # Checkpoint per file so an interrupted ingest keeps the work already done
+            manifest.record(key, file_path, content_hash, ids)
+            manifest.save()
+            print(f"Ingested {file_path} ({len(texts)} chunks)")
+            if progress:
+                progress('file', path=file_path, chunks=len(texts),
+                         embeddings=embedding_model.embedded_in_thread() - embedded_before)
+    finally:
+        print(chunker.report())
+        mark_ingested(db_folder)
+        db = None
+    return True
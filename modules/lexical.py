@@ -0,0 +1,89 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+
+LEXICAL_INDEX_FILENAME = 'lexical.sqlite3'
+
+TERM_PATTERN = re.compile(r"[^\s\"]+")
+
+
+def to_match_query(text: str) -> str:
+    """
+    Turn free text into an FTS5 query matching any of its terms.
+
+    Each whitespace separated term is quoted, so part numbers, ISO dates and e-mail
+    addresses become exact phrase matches instead of FTS5 syntax.
+    """
+    terms = {}
+    for term in TERM_PATTERN.findall(text):
+        term = term.strip('.,?!:;\'()[]{}')
+        if term:
+            terms['"' + term + '"'] = None
+    return ' OR '.join(terms)
+
+
+class LexicalIndex:
+    """
+    Per-bot BM25 inverted index of the ingested chunks, kept in SQLite FTS5 next to
+    the Chroma DB. Chunks are added and deleted by chunk id as ingest goes.
+    """
+    def __init__(self, db_dir: str) -> None:
+        os.makedirs(db_dir, exist_ok=True)
+        self.path = os.path.join(db_dir, LEXICAL_INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5('
+            'content, chunk_id UNINDEXED, metadata UNINDEXED, tokenize="unicode61")'
+        )
+        # FTS5 cannot index UNINDEXED columns, keep chunk_id -> rowid for deletes
+        self._conn.execute('CREATE TABLE IF NOT EXISTS chunk_rowids (chunk_id TEXT PRIMARY KEY, row INTEGER NOT NULL)')
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM chunk_rowids').fetchone()[0]
+
+    def add(self, chunk_ids: List[str], texts: List[str], metadatas: List[Dict]):
+        with self._lock:
+            for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+                self._delete(chunk_id)
+                cursor = self._conn.execute(
+                    'INSERT INTO chunks (content, chunk_id, metadata) VALUES (?, ?, ?)',
+                    (text, chunk_id, json.dumps(metadata))
+                )
+                self._conn.execute('INSERT INTO chunk_rowids (chunk_id, row) VALUES (?, ?)', (chunk_id, cursor.lastrowid))
+            self._conn.commit()
+
+    def _delete(self, chunk_id: str):
+        row = self._conn.execute('SELECT row FROM chunk_rowids WHERE chunk_id = ?', (chunk_id,)).fetchone()
+        if row:
+            self._conn.execute('DELETE FROM chunks WHERE rowid = ?', row)
+            self._conn.execute('DELETE FROM chunk_rowids WHERE chunk_id = ?', (chunk_id,))
+
+    def delete(self, chunk_ids: List[str]):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._delete(chunk_id)
+            self._conn.commit()
+
+    def search(self, query: str, k: int = 10) -> List[Tuple['Document', float]]:
+        """Top k chunks by BM25, as (Document, score) with higher scores better."""
+        from langchain.docstore.document import Document
+        match = to_match_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT content, metadata, bm25(chunks) AS rank FROM chunks WHERE chunks MATCH ? ORDER BY rank LIMIT ?',
+                (match, k)
+            ).fetchall()
+        # SQLite's bm25() is negative, lower meaning more relevant
+        return [(Document(page_content=content, metadata=json.loads(metadata)), -rank) for content, metadata, rank in rows]
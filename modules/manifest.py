@@ -0,0 +1,97 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Tuple
+
+MANIFEST_FILENAME = 'manifest.json'
+
+
+def file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """sha256 of the file content, read in blocks so large PDFs are not loaded at once."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids_for(key: str, content_hash: str, count: int) -> List[str]:
+    """Stable Chroma ids for the chunks of one version of one source file."""
+    prefix = f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]}-{content_hash[:12]}"
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+class Manifest:
+    """
+    Per-bot record of ingested source files, persisted next to the vector store.
+
+    Each entry is keyed by the path relative to the source folder and stores the
+    content hash, mtime, size and the ids of the chunks it produced, so ingest can
+    skip unchanged files and delete stale chunks without reading the collection.
+    """
+    def __init__(self, db_dir: str) -> None:
+        self.path = os.path.join(db_dir, MANIFEST_FILENAME)
+        self.files: Dict[str, dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, mode='r', encoding='utf-8') as file:
+                self.files = json.load(file).get('files', {})
+
+    def save(self):
+        # Write to a temp file first so a crash never leaves a truncated manifest
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, mode='w', encoding='utf-8') as file:
+            json.dump({'version': 1, 'files': self.files}, file)
+        os.replace(tmp_path, self.path)
+
+    def diff(self, source_dir: str, file_paths: List[str]) -> Tuple[List[Tuple[str, str, str]], List[str]]:
+        """
+        Compare the files on disk with the manifest.
+
+        :param source_dir: folder the keys are relative to
+        :param file_paths: every source file currently on disk
+        :return: ([(file_path, key, content_hash)] new or changed, [key] removed)
+        """
+        changed = []
+        seen = set()
+        for file_path in file_paths:
+            key = os.path.relpath(file_path, source_dir)
+            seen.add(key)
+            stat = os.stat(file_path)
+            record = self.files.get(key)
+            # mtime and size unchanged: trust the record without hashing
+            if record and record['mtime'] == stat.st_mtime and record['size'] == stat.st_size:
+                continue
+            content_hash = file_hash(file_path)
+            if record and record['hash'] == content_hash:
+                # Touched but identical, refresh the stat fields only
+                record['mtime'] = stat.st_mtime
+                record['size'] = stat.st_size
+                continue
+            changed.append((file_path, key, content_hash))
+        removed = [key for key in self.files if key not in seen]
+        return changed, removed
+
+    def chunk_ids(self, key: str) -> List[str]:
+        record = self.files.get(key)
+        return list(record['chunk_ids']) if record else []
+
+    def record(self, key: str, file_path: str, content_hash: str, chunk_ids: List[str]):
+        stat = os.stat(file_path)
+        self.files[key] = {
+            'hash': content_hash,
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'chunk_ids': chunk_ids,
+        }
+
+    def seed(self, key: str, chunk_ids: List[str]):
+        """
+        Record chunks ingested before the manifest existed. The entry matches no file on
+        disk, so diff() reports the file as changed (or removed) and its chunks get replaced.
+        """
+        record = self.files.setdefault(key, {'hash': '', 'mtime': 0.0, 'size': -1, 'chunk_ids': []})
+        record['chunk_ids'].extend(chunk_ids)
+
+    def forget(self, key: str):
+        self.files.pop(key, None)
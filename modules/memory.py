@@ -0,0 +1,144 @@
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import constants, telemetry
+from .chunking import count_tokens
+
+MEMORY_FILENAME = 'memory.sqlite3'
+
+# Summaries are LLM calls made after the answer is sent, one at a time per process
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='memory')
+
+
+def _clip(text: str, tokens: int, max_tokens: int) -> str:
+    # Proportional cut by words, count_tokens is an estimate anyway
+    if tokens <= max_tokens:
+        return text
+    words = text.split()
+    return ' '.join(words[:max(1, len(words) * max_tokens // tokens)]) + ' ...'
+
+
+class ConversationMemory:
+    """
+    Per-bot chat history stored in SQLite next to the bot's indexes, so it survives
+    agent eviction and restarts.
+
+    Prompts get a window of it: a rolling summary of the older exchanges plus the
+    last max_exchanges question/answer pairs that fit max_tokens. Exchanges pushed
+    out of the window are folded into the summary by schedule_summary(), off the
+    request path, and then deleted.
+    """
+    def __init__(self, db_dir: str, max_tokens: Optional[int] = None, max_exchanges: Optional[int] = None) -> None:
+        os.makedirs(db_dir, exist_ok=True)
+        self.max_tokens = constants.MEMORY_TOKEN_BUDGET if max_tokens is None else max_tokens
+        self.max_exchanges = constants.MEMORY_MAX_EXCHANGES if max_exchanges is None else max_exchanges
+        self._lock = threading.Lock()
+        self._summarizing = False
+        # Bumped by clear(), so a summary of a cleared conversation is not stored
+        self._generation = 0
+        self._conn = sqlite3.connect(os.path.join(db_dir, MEMORY_FILENAME), timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS exchanges ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL, answer TEXT NOT NULL, '
+            'tokens INTEGER NOT NULL, created_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS summary (id INTEGER PRIMARY KEY CHECK (id = 0), '
+            'content TEXT NOT NULL, through INTEGER NOT NULL)'
+        )
+        self._conn.commit()
+
+    def append(self, question: str, answer: str):
+        tokens = count_tokens(question) + count_tokens(answer)
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO exchanges (question, answer, tokens, created_at) VALUES (?, ?, ?, ?)',
+                (question, answer, tokens, time.time())
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._conn.execute('DELETE FROM exchanges')
+            self._conn.execute('DELETE FROM summary')
+            self._conn.commit()
+
+    def has_history(self) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT EXISTS (SELECT 1 FROM exchanges) OR EXISTS (SELECT 1 FROM summary)'
+            ).fetchone()[0] == 1
+
+    def _split(self) -> Tuple[str, List[tuple], List[tuple]]:
+        # (summary, exchanges left for the summary, exchanges in the window), oldest first
+        row = self._conn.execute('SELECT content, through FROM summary').fetchone()
+        summary, through = row if row else ('', 0)
+        rows = self._conn.execute(
+            'SELECT id, question, answer, tokens FROM exchanges WHERE id > ? ORDER BY id', (through,)
+        ).fetchall()
+        window, budget = [], self.max_tokens
+        for row in reversed(rows):
+            if len(window) == self.max_exchanges or (window and row[3] > budget):
+                break
+            window.append(row)
+            budget -= row[3]
+        window.reverse()
+        return summary, rows[:len(rows) - len(window)], window
+
+    def window(self) -> Tuple[str, List[Dict[str, str]]]:
+        """The summary of older exchanges and the recent messages, alternating user/assistant."""
+        with self._lock:
+            summary, _, window = self._split()
+        messages = []
+        for _, question, answer, tokens in window:
+            # Only the newest exchange can be over budget on its own, shorten its answer
+            answer = _clip(answer, tokens, self.max_tokens)
+            messages.append({'role': 'user', 'content': question})
+            messages.append({'role': 'assistant', 'content': answer})
+        return summary, messages
+
+    def schedule_summary(self, summarize: Callable[[str, List[Dict[str, str]]], str]):
+        """
+        Fold the exchanges that left the window into the summary in the background.
+
+        :param summarize: summarize(summary, messages) -> the new summary, usually an LLM call
+        """
+        with self._lock:
+            _, pending, _ = self._split()
+            if not pending or self._summarizing:
+                return
+            self._summarizing = True
+        _summary_executor.submit(self._summarize, summarize)
+
+    def _summarize(self, summarize: Callable[[str, List[Dict[str, str]]], str]):
+        try:
+            with self._lock:
+                summary, pending, _ = self._split()
+                generation = self._generation
+            if not pending:
+                return
+            messages = []
+            for _, question, answer, _ in pending:
+                messages.append({'role': 'user', 'content': question})
+                messages.append({'role': 'assistant', 'content': answer})
+            with telemetry.span('summarize_history', exchanges=len(pending)):
+                summary = summarize(summary, messages).strip()
+            through = pending[-1][0]
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self._conn.execute('INSERT OR REPLACE INTO summary (id, content, through) VALUES (0, ?, ?)',
+                                   (summary, through))
+                self._conn.execute('DELETE FROM exchanges WHERE id <= ?', (through,))
+                self._conn.commit()
+        except Exception as e:
+            # The exchanges stay and are summarized with the next ones
+            print(f"Summarizing the chat history failed: {type(e).__name__}: {e}")
+        finally:
+            self._summarizing = False
@@ -0,0 +1,231 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from . import constants
+
+
+class _Entry:
+    """A loaded model together with its bookkeeping."""
+    __slots__ = ('model', 'refs', 'size_bytes', 'load_seconds', 'last_used', 'hits')
+
+    def __init__(self, model: Any, size_bytes: int, load_seconds: float) -> None:
+        self.model = model
+        self.refs = 0
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.last_used = time.monotonic()
+        self.hits = 0
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of heavy models (rerankers, LLM clients, ...) shared between agents.
+
+    Models are loaded once per (kind, name, options) and reference counted. Models
+    that nobody holds are evicted least-recently-used first when the memory budget
+    is exceeded, or once they have been idle for longer than idle_ttl seconds; a
+    background thread checks for those every sweep_interval seconds (at most a
+    minute by default) once the first model is loaded.
+    """
+    def __init__(self, memory_budget_mb: Optional[int] = None, idle_ttl: Optional[float] = None,
+                 sweep_interval: Optional[float] = None) -> None:
+        budget = constants.MODEL_MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+        self.memory_budget = budget * 1024 * 1024
+        self.idle_ttl = constants.MODEL_IDLE_TTL if idle_ttl is None else idle_ttl
+        self.sweep_interval = min(self.idle_ttl, 60) if sweep_interval is None else sweep_interval
+        self._sweeper: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+        self._load_locks: Dict[Hashable, threading.Lock] = {}
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._loaders: Dict[str, Tuple[Callable[..., Any], Optional[Callable[[Any], int]]]] = {}
+        self._evict_hooks: Dict[str, Callable[[Hashable], None]] = {}
+        self._counters = {'loads': 0, 'hits': 0, 'evictions': 0}
+
+    def register_loader(self, kind: str, loader: Callable[..., Any], sizer: Optional[Callable[[Any], int]] = None,
+                        on_evict: Optional[Callable[[Hashable], None]] = None):
+        """
+        Register how to build models of a given kind.
+
+        :param kind: model family, e.g. 'reranker' or 'llm'
+        :param loader: callable(name, **options) returning the model
+        :param sizer: optional callable(model) returning its resident size in bytes
+        :param on_evict: optional callable(key) dropping what else refers to an evicted model,
+            called with the registry lock held
+        """
+        with self._lock:
+            self._loaders[kind] = (loader, sizer)
+            if on_evict is not None:
+                self._evict_hooks[kind] = on_evict
+
+    @staticmethod
+    def _key(kind: str, name: str, options: Dict[str, Any]) -> Hashable:
+        return (kind, name, tuple(sorted(options.items())))
+
+    def key(self, kind: str, name: str, **options) -> Hashable:
+        """The identity of a model in the registry, as passed to on_evict."""
+        return self._key(kind, name, options)
+
+    def acquire(self, kind: str, name: str, **options) -> Any:
+        """Return the shared model, loading it on first use, and take a reference to it."""
+        key = self._key(kind, name, options)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._take(key, entry)
+            if kind not in self._loaders:
+                raise ValueError(f"No loader registered for model kind '{kind}'")
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so one slow load does not block every other agent
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return self._take(key, entry)
+                loader, sizer = self._loaders[kind]
+            start = time.perf_counter()
+            try:
+                model = loader(name, **options)
+            except Exception:
+                with self._lock:
+                    self._load_locks.pop(key, None)
+                raise
+            load_seconds = time.perf_counter() - start
+            size_bytes = sizer(model) if sizer else 0
+            print(f"Loaded {kind} '{name}' in {load_seconds:.2f}s ({size_bytes / 1024 / 1024:.0f} MB)")
+            with self._lock:
+                entry = _Entry(model, size_bytes, load_seconds)
+                self._entries[key] = entry
+                self._counters['loads'] += 1
+                self._load_locks.pop(key, None)
+                model = self._take(key, entry, hit=False)
+                self._enforce_budget()
+                self._start_sweeper()
+                return model
+
+    def _take(self, key: Hashable, entry: _Entry, hit: bool = True) -> Any:
+        entry.refs += 1
+        entry.last_used = time.monotonic()
+        if hit:
+            entry.hits += 1
+            self._counters['hits'] += 1
+        self._entries.move_to_end(key)
+        return entry.model
+
+    def release(self, kind: str, name: str, **options):
+        """Drop a reference taken with acquire(); the model stays cached until evicted."""
+        key = self._key(kind, name, options)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refs == 0:
+                return
+            entry.refs -= 1
+            entry.last_used = time.monotonic()
+            self.evict_idle()
+
+    def _evict(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._counters['evictions'] += 1
+        hook = self._evict_hooks.get(key[0])
+        if hook is not None:
+            hook(key)
+        print(f"Evicted {key[0]} '{key[1]}' ({entry.size_bytes / 1024 / 1024:.0f} MB)")
+
+    def _enforce_budget(self):
+        for key in list(self._entries):
+            if self.memory_bytes() <= self.memory_budget:
+                break
+            if self._entries[key].refs == 0:
+                self._evict(key)
+
+    def evict_idle(self):
+        """Evict unreferenced models idle for longer than idle_ttl, then enforce the memory budget."""
+        with self._lock:
+            now = time.monotonic()
+            for key, entry in list(self._entries.items()):
+                if entry.refs == 0 and now - entry.last_used > self.idle_ttl:
+                    self._evict(key)
+            self._enforce_budget()
+
+    def _start_sweeper(self):
+        # Otherwise an idle model stays resident until the next acquire or release
+        if self._sweeper is None and self.sweep_interval > 0:
+            self._sweeper = threading.Thread(target=self._sweep, name='model-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.evict_idle()
+
+    def memory_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of loaded models, their references, size and load time."""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                **self._counters,
+                'memory_mb': self.memory_bytes() / 1024 / 1024,
+                'memory_budget_mb': self.memory_budget / 1024 / 1024,
+                'models': [
+                    {
+                        'kind': key[0],
+                        'name': key[1],
+                        'options': dict(key[2]),
+                        'refs': entry.refs,
+                        'hits': entry.hits,
+                        'size_mb': entry.size_bytes / 1024 / 1024,
+                        'load_seconds': entry.load_seconds,
+                        'idle_seconds': now - entry.last_used,
+                    }
+                    for key, entry in self._entries.items()
+                ],
+            }
+
+
+def _load_reranker(name: str, device: str = 'cpu', backend: str = 'torch'):
+    from sentence_transformers import CrossEncoder
+    model = CrossEncoder(name, device=device)
+    if backend == 'int8':
+        from .reranking import quantize_int8
+        model = quantize_int8(model)
+    elif backend != 'torch':
+        raise ValueError(f"Unknown reranker backend '{backend}'")
+    return model
+
+
+def _drop_rerank_batcher(key: Hashable):
+    # Only set up once reranking was imported, the batcher would keep the CrossEncoder alive
+    reranking = sys.modules.get(f'{__package__}.reranking')
+    if reranking is not None:
+        reranking.drop_rerank_batcher(key)
+
+
+def _torch_model_size(model) -> int:
+    module = getattr(model, 'model', model)
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _load_llm(name: str):
+    from langchain_ollama import OllamaLLM
+    from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+    from .telemetry import ollama_token_callback
+    return OllamaLLM(
+        model=name,
+        device='cpu',
+        keep_alive=constants.OLLAMA_KEEP_ALIVE,
+        num_ctx=constants.OLLAMA_NUM_CTX,
+        callbacks=[StreamingStdOutCallbackHandler(), ollama_token_callback()],
+    )
+
+
+registry = ModelRegistry()
+registry.register_loader('reranker', _load_reranker, _torch_model_size, on_evict=_drop_rerank_batcher)
+# LLM weights live in the Ollama server, the client itself is tiny
+registry.register_loader('llm', _load_llm)
@@ -0,0 +1,150 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from . import constants
+from .batching import MicroBatcher
+from .retrieval import doc_key
+
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+
+
+class ScoreCache:
+    """Process-wide LRU of CrossEncoder scores keyed by (model, query hash, chunk id)."""
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._scores: "OrderedDict[tuple, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._scores.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key: tuple, score: float):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+
+score_cache = ScoreCache(constants.RERANK_CACHE_SIZE)
+
+
+# One batcher per shared CrossEncoder, keyed like the model registry, once enable_rerank_batching() was called
+_batching = None
+_batchers: dict = {}
+_batchers_lock = threading.Lock()
+# Batches of different leaders may run at once, keep the CPU bound the rerank executor had
+_predict_slots = threading.BoundedSemaphore(max(1, constants.RERANK_WORKERS))
+
+
+def enable_rerank_batching(max_batch_size: int, max_wait: float):
+    """Merge the (query, chunk) pairs of concurrent requests into shared predict calls."""
+    global _batching
+    _batching = (max_batch_size, max_wait)
+
+
+def rerank_batching_enabled() -> bool:
+    return _batching is not None
+
+
+def drop_rerank_batcher(key):
+    """Forget the batcher of an evicted model, so the model can be freed."""
+    with _batchers_lock:
+        _batchers.pop(key, None)
+
+
+def rerank_batching_stats() -> List[dict]:
+    with _batchers_lock:
+        return [dict(batcher.stats) for batcher in _batchers.values()]
+
+
+def _batched_predict(model, batch_size: int, requests: List[list]) -> List[list]:
+    # Each request is a list of pairs, run them as one predict and split the scores back
+    pairs = [pair for request in requests for pair in request]
+    with _predict_slots:
+        scores = model.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+    results, start = [], 0
+    for request in requests:
+        results.append(scores[start:start + len(request)])
+        start += len(request)
+    return results
+
+
+def quantize_int8(cross_encoder):
+    """Dynamic int8 quantization of the CrossEncoder's Linear layers for faster CPU inference."""
+    import torch
+    cross_encoder.model = torch.quantization.quantize_dynamic(cross_encoder.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return cross_encoder
+
+
+class RerankEngine:
+    """
+    CrossEncoder reranking with explicit batching, cached scores and candidate truncation.
+
+    Only the first max_candidates documents, in retrieval (vector/fusion score) order,
+    are scored; (query, chunk) pairs scored before are served from the score cache.
+    batch_key identifies the shared model when batching is on, usually its registry key.
+    """
+    def __init__(self, model, model_name: str, batch_size: Optional[int] = None,
+                 max_candidates: Optional[int] = None, cache: Optional[ScoreCache] = score_cache,
+                 batch_key=None) -> None:
+        self.model = model
+        self.model_name = model_name
+        self.batch_key = model_name if batch_key is None else batch_key
+        self.batch_size = batch_size or constants.RERANK_BATCH_SIZE
+        self.max_candidates = constants.RERANK_MAX_CANDIDATES if max_candidates is None else max_candidates
+        self.cache = cache
+
+    def rerank(self, query: str, retrieved_docs: List['Document']) -> List[Tuple['Document', float]]:
+        """
+        :param query: the query string
+        :param retrieved_docs: Documents in retrieval order
+        :return: list of (Document, float) sorted by score descending
+        """
+        if not retrieved_docs:
+            return []
+        candidates = retrieved_docs[:self.max_candidates] if self.max_candidates else retrieved_docs
+        query_hash = hashlib.sha1(query.encode('utf-8')).hexdigest()
+        keys = [(self.model_name, query_hash, doc_key(doc)) for doc in candidates]
+        scores = [self.cache.get(key) if self.cache else None for key in keys]
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            predicted = self._predict([(query, candidates[i].page_content) for i in missing])
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+                if self.cache:
+                    self.cache.put(keys[i], scores[i])
+        return sorted(zip(candidates, scores), key=lambda x: x[1], reverse=True)
+
+    def _predict(self, pairs: List[tuple]) -> list:
+        if _batching is None:
+            return self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        with _batchers_lock:
+            batcher = _batchers.get(self.batch_key)
+            if batcher is None:
+                model, batch_size = self.model, self.batch_size
+                batcher = MicroBatcher(lambda requests: _batched_predict(model, batch_size, requests), *_batching)
+                _batchers[self.batch_key] = batcher
+        return batcher.submit(pairs)
+
+
+def set_rerank_threads(threads: int):
+    """Limit the intra-op threads torch uses for reranking (process wide)."""
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
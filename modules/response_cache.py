@@ -0,0 +1,113 @@
+import os
+import time
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from . import constants
+
+INGEST_STAMP_FILENAME = 'ingest_stamp'
+
+
+def mark_ingested(db_dir: str):
+    """Record that the bot's documents changed, invalidating every response cache built on them."""
+    os.makedirs(db_dir, exist_ok=True)
+    with open(os.path.join(db_dir, INGEST_STAMP_FILENAME), mode='w', encoding='utf-8') as file:
+        file.write(str(time.time_ns()))
+
+
+def ingest_stamp(db_dir: str) -> Optional[int]:
+    """Changes whenever ingest touched the bot's documents, None if it never ran."""
+    try:
+        return os.stat(os.path.join(db_dir, INGEST_STAMP_FILENAME)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class ResponseCache:
+    """
+    Per-bot answer cache for repeated and near-duplicate questions.
+
+    Entries are keyed by the normalized embedding of the contextualized query; a
+    lookup hits when the cosine similarity to a stored query reaches threshold and
+    the entry is younger than ttl seconds. At most max_entries are kept, least
+    recently used first out, and the whole cache is dropped whenever ingest stamps
+    the bot's db_dir.
+    """
+    def __init__(self, db_dir: str, threshold: Optional[float] = None, ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None) -> None:
+        self.db_dir = db_dir
+        self.threshold = constants.RESPONSE_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl = constants.RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.max_entries = constants.RESPONSE_CACHE_SIZE if max_entries is None else max_entries
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._matrix = None
+        self._matrix_ids: List[int] = []
+        self._stamp = ingest_stamp(db_dir)
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _check_stamp(self):
+        stamp = ingest_stamp(self.db_dir)
+        if stamp != self._stamp:
+            self._stamp = stamp
+            if self._entries:
+                self.stats['invalidations'] += 1
+            self.clear()
+
+    def clear(self):
+        self._entries.clear()
+        self._matrix = None
+
+    def lookup(self, vector: List[float]) -> Optional[Dict[str, Any]]:
+        """Return {'response', 'sources', 'similarity'} for the closest fresh entry, or None."""
+        with self._lock:
+            self._check_stamp()
+            now = time.monotonic()
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry['created'] > self.ttl:
+                    del self._entries[entry_id]
+                    self._matrix = None
+            if not self._entries:
+                self.stats['misses'] += 1
+                return None
+            if self._matrix is None:
+                self._matrix_ids = list(self._entries)
+                self._matrix = np.stack([self._entries[i]['vector'] for i in self._matrix_ids])
+            similarities = self._matrix @ _normalize(vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.stats['misses'] += 1
+                return None
+            entry_id = self._matrix_ids[best]
+            self._entries.move_to_end(entry_id)
+            self.stats['hits'] += 1
+            entry = self._entries[entry_id]
+            return {'response': entry['response'], 'sources': entry['sources'], 'similarity': float(similarities[best])}
+
+    def store(self, vector: List[float], response: str, sources: List[Any]):
+        with self._lock:
+            self._check_stamp()
+            self._entries[next(self._ids)] = {
+                'vector': _normalize(vector),
+                'response': response,
+                'sources': sources,
+                'created': time.monotonic(),
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
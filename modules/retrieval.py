@@ -0,0 +1,91 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from . import constants, telemetry
+from .lexical import LexicalIndex
+from .text_normalization import DEFAULT_NORMALIZER
+
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+
+# Dense searches run here so a slow embedding server can be abandoned after a timeout
+_dense_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='dense-search')
+
+
+def search_query(content: str) -> str:
+    """Query text as the mxbai embedding model expects it for retrieval."""
+    return f"Represent this sentence for searching relevant passages: {content}"
+
+
+def doc_key(doc: 'Document') -> str:
+    return doc.metadata.get('chunk_id') or doc.page_content
+
+
+def reciprocal_rank_fusion(rankings: List[List['Document']], k: int, rrf_k: int = 60) -> List[Tuple['Document', float]]:
+    """
+    Fuse several ranked lists into one: score(d) = sum over lists of 1 / (rrf_k + rank).
+
+    :return: the top k (Document, score) sorted by fused score descending
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, 'Document'] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(docs[key], scores[key]) for key in best]
+
+
+class HybridRetriever:
+    """
+    Dense (Chroma) plus lexical (BM25) retrieval fused with reciprocal rank fusion.
+
+    mode is 'hybrid', 'dense' or 'lexical'. In hybrid mode, when the dense search
+    takes longer than dense_timeout seconds (usually a busy embedding server) or
+    fails, the lexical results are returned on their own.
+    """
+    def __init__(self, vectorstore, lexical_index: LexicalIndex, k: int = 10, mode: Optional[str] = None,
+                 dense_timeout: Optional[float] = None) -> None:
+        self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.k = k
+        self.mode = mode or constants.RETRIEVAL_MODE
+        self.dense_timeout = constants.DENSE_SEARCH_TIMEOUT if dense_timeout is None else dense_timeout
+        if self.mode not in ('hybrid', 'dense', 'lexical'):
+            raise ValueError(f"Unknown retrieval mode '{self.mode}'")
+
+    def dense_search(self, content: str) -> List['Document']:
+        # Same as similarity_search, split so embedding and the Chroma search are timed apart
+        with telemetry.span('embed_query'):
+            vector = self.vectorstore.embeddings.embed_query(search_query(content))
+        with telemetry.span('chroma_search'):
+            return self.vectorstore.similarity_search_by_vector(vector, k=self.k)
+
+    def lexical_search(self, content: str) -> List['Document']:
+        # PDF, HTML and TXT chunks went through clean_text (e.g. ISO dates), match both spellings
+        query = f"{content} {DEFAULT_NORMALIZER(content)}"
+        with telemetry.span('lexical_search'):
+            return [doc for doc, _ in self.lexical_index.search(query, k=self.k)]
+
+    def get_relevant_documents(self, content: str) -> List['Document']:
+        """Retrieve the top k chunks for the raw (not instruction-prefixed) user query."""
+        if self.mode == 'dense':
+            return self.dense_search(content)
+        if self.mode == 'lexical':
+            return self.lexical_search(content)
+
+        dense = _dense_executor.submit(contextvars.copy_context().run, self.dense_search, content)
+        lexical_docs = self.lexical_search(content)
+        try:
+            dense_docs = dense.result(timeout=self.dense_timeout)
+        except TimeoutError:
+            print(f"Dense search slower than {self.dense_timeout}s, answering from the lexical index only")
+            return lexical_docs
+        except Exception as e:
+            # Usually the embedding server being down, the lexical index does not need it
+            print(f"Dense search failed ({type(e).__name__}: {e}), answering from the lexical index only")
+            return lexical_docs
+        return [doc for doc, _ in reciprocal_rank_fusion([dense_docs, lexical_docs], self.k)]
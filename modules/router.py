@@ -0,0 +1,56 @@
+import re
+from typing import Optional
+
+# Messages that are clearly small talk, matched against the whole message
+CHIT_CHAT_PATTERN = re.compile(
+    r"^\W*(hi|hello|hey|yo|good (morning|afternoon|evening)|thanks?( you)?( so much)?|thank you|"
+    r"ok(ay)?|cool|great|nice|bye|goodbye|see you|how are you( doing)?|who are you|what'?s up)\W*$",
+    re.IGNORECASE
+)
+# Cues that the user is asking about the ingested documents
+DOCS_CUE_PATTERN = re.compile(
+    r"\b(document|documents|doc|docs|file|files|report|pdf|paper|section|table|page|according to|"
+    r"mentioned|states?|summar(y|ize|ise)|policy|contract|invoice)\b",
+    re.IGNORECASE
+)
+# Words pointing back at earlier turns, and openers of follow-up questions
+REFERENCE_PATTERN = re.compile(
+    r"\b(it|its|they|them|their|this|that|these|those|he|him|his|she|her|there|one|ones|former|latter|"
+    r"above|previous|earlier|same|else|again|more|other)\b",
+    re.IGNORECASE
+)
+FOLLOW_UP_PATTERN = re.compile(r"^\W*(and|but|so|also|then|what about|how about|why not)\b", re.IGNORECASE)
+QUESTION_PATTERN = re.compile(r"^\W*(what|which|who|when|where|why|how|does|do|is|are|can|list|explain|describe)\b",
+                              re.IGNORECASE)
+
+
+def quick_route(query: str) -> Optional[str]:
+    """
+    Cheap stand-in for the LLM router.
+
+    :param query: the (contextualized) user message
+    :return: 'DOCS' or 'DEFAULT' when the message is unambiguous, None to fall back to the LLM
+    """
+    text = query.strip()
+    if CHIT_CHAT_PATTERN.match(text):
+        return 'DEFAULT'
+    if DOCS_CUE_PATTERN.search(text):
+        return 'DOCS'
+    # Longer factual questions are what the documents are for
+    if QUESTION_PATTERN.match(text) and len(text.split()) >= 5:
+        return 'DOCS'
+    return None
+
+
+def is_standalone(query: str) -> bool:
+    """
+    Whether the message can be understood without the chat history, so it need not
+    be contextualized. Short messages and any reference to earlier turns count as
+    follow-ups, when in doubt the LLM reformulates.
+    """
+    text = query.strip()
+    if CHIT_CHAT_PATTERN.match(text):
+        return True
+    if len(text.split()) < 4 or FOLLOW_UP_PATTERN.match(text):
+        return False
+    return not REFERENCE_PATTERN.search(text)
@@ -0,0 +1,193 @@
+"""
+Headless HTTP (ASGI) serving mode for the RAG agents.
+
+    python -m modules.server --host 0.0.0.0 --port 8000 --workers 4
+
+Every worker keeps its own agent cache; agents, documents and vector stores live
+under data/ and are shared, so several workers can sit behind a load balancer.
+Chroma's local persistent mode is not safe with writers in several processes, so
+only one worker runs ingestion jobs (see IngestService); the others queue them and
+only read the vector stores.
+"""
+import os
+import json
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from . import constants, telemetry
+from .agent import Agent, warm_up, create_agent, find_bot_by_id, on_message, on_message_stream, overview, delete_agent
+from .bot import Bot, get_db_dir, get_source_dir
+from .embeddings import get_embedding_model
+from .ingest_jobs import get_ingest_service
+from .model_registry import registry
+from .reranking import enable_rerank_batching, rerank_batching_stats
+from .utils import write_file
+
+
+class AgentRequest(BaseModel):
+    name: str
+    description: str
+    starter: str = 'Hello! How can I assist you today?'
+    model: str = 'llama3'
+    pipeline: str = 'sequential'
+
+
+class MessageRequest(BaseModel):
+    content: str
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Concurrent requests share embedding and reranking calls instead of queueing one by one
+    max_wait = constants.BATCH_MAX_WAIT_MS / 1000
+    get_embedding_model().enable_query_batching(constants.BATCH_MAX_SIZE, max_wait)
+    enable_rerank_batching(constants.BATCH_MAX_SIZE, max_wait)
+    # Starts the ingestion workers, which also resume jobs interrupted by a previous shutdown
+    service = get_ingest_service()
+    if constants.WARMUP_MODELS:
+        # In the background, the server answers /health right away
+        asyncio.get_running_loop().run_in_executor(None, warm_up, constants.WARMUP_MODELS)
+    yield
+    service.pool.stop(wait=False)
+
+
+app = FastAPI(title="RAG Agent", lifespan=lifespan)
+
+
+def _require_agent(bot_id: str) -> Agent:
+    agent = find_bot_by_id(bot_id)
+    if agent is None:
+        raise HTTPException(status_code=404, detail=f"Bot with id {bot_id} does not exist")
+    return agent
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/stats")
+async def stats():
+    embedding_model = get_embedding_model()
+    query_batcher = embedding_model.query_batcher
+    return {
+        "models": registry.stats(),
+        "embeddings": embedding_model.stats_snapshot(),
+        "batching": {
+            "embed_query": query_batcher.stats if query_batcher else None,
+            "rerank": rerank_batching_stats(),
+        },
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format; empty unless TELEMETRY_ENABLED is set."""
+    return telemetry.metrics.render_prometheus()
+
+
+@app.get("/agents")
+async def list_agents(offset: int = 0, limit: Optional[int] = None):
+    agents = await asyncio.to_thread(overview, offset, limit)
+    return [agent.model_dump() for agent in agents]
+
+
+@app.post("/agents", status_code=201)
+async def create(request: AgentRequest):
+    if request.pipeline not in constants.PIPELINE_MODES:
+        raise HTTPException(status_code=422, detail=f"pipeline must be one of {constants.PIPELINE_MODES}")
+    if request.model not in constants.SUPPORTED_MODELS:
+        raise HTTPException(status_code=422, detail=f"model must be one of {constants.SUPPORTED_MODELS}")
+    bot = await asyncio.to_thread(Bot)
+    agent = Agent(bot_id=bot.bot_id, **request.model_dump())
+    await create_agent(agent)
+    return agent.model_dump()
+
+
+@app.get("/agents/{bot_id}")
+async def get(bot_id: str):
+    return (await asyncio.to_thread(_require_agent, bot_id)).model_dump()
+
+
+@app.delete("/agents/{bot_id}", status_code=204)
+async def delete(bot_id: str):
+    if not await asyncio.to_thread(delete_agent, bot_id):
+        raise HTTPException(status_code=404, detail=f"Bot with id {bot_id} does not exist")
+
+
+@app.put("/agents/{bot_id}/documents/{filename}", status_code=201)
+async def upload_document(bot_id: str, filename: str, request: Request):
+    """Store the raw request body as a source document of the bot; call /ingest afterwards."""
+    await asyncio.to_thread(_require_agent, bot_id)
+    if os.path.basename(filename) != filename:
+        raise HTTPException(status_code=422, detail="filename must not contain a path")
+    source_dir = get_source_dir(bot_id)
+    os.makedirs(source_dir, exist_ok=True)
+    await write_file(await request.body(), os.path.join(source_dir, filename))
+    return {"filename": filename}
+
+
+@app.post("/agents/{bot_id}/ingest", status_code=202)
+async def ingest_documents(bot_id: str):
+    """Queue a background ingestion of the bot's documents; poll /jobs/{job_id} for progress."""
+    await asyncio.to_thread(_require_agent, bot_id)
+    job_id = await asyncio.to_thread(get_ingest_service().submit, bot_id, get_db_dir(bot_id), get_source_dir(bot_id))
+    return {"job_id": job_id}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(get_ingest_service().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} does not exist")
+    return job
+
+
+@app.delete("/jobs/{job_id}", status_code=202)
+async def cancel_job(job_id: str):
+    if not await asyncio.to_thread(get_ingest_service().cancel, job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is not queued or running")
+    return await asyncio.to_thread(get_ingest_service().get, job_id)
+
+
+@app.post("/agents/{bot_id}/messages")
+async def message(bot_id: str, request: MessageRequest):
+    await asyncio.to_thread(_require_agent, bot_id)
+    return await on_message(bot_id, request.content)
+
+
+@app.post("/agents/{bot_id}/messages/stream")
+async def message_stream(bot_id: str, request: MessageRequest):
+    """Newline-delimited JSON events, see agent.on_message_stream."""
+    await asyncio.to_thread(_require_agent, bot_id)
+
+    async def events():
+        async for event in on_message_stream(bot_id, request.content):
+            yield json.dumps(event) + '\n'
+
+    return StreamingResponse(events(), media_type='application/x-ndjson')
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the RAG agents over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--warmup', metavar='MODELS', help="comma separated LLMs to load at startup, see WARMUP_MODELS")
+    args = parser.parse_args()
+    if args.warmup:
+        # Read by constants in each worker process
+        os.environ['WARMUP_MODELS'] = args.warmup
+    uvicorn.run('modules.server:app', host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
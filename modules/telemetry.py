@@ -0,0 +1,311 @@
+"""
+Spans and metrics for the question answering pipeline.
+
+Spans nest through contextvars (also across asyncio tasks and to_thread), record
+their duration into the rag_span_seconds histogram and, when a trace file is set,
+are appended to it as OpenTelemetry-style JSON lines. Metrics are rendered in the
+Prometheus text format by render_prometheus().
+
+Everything is a no-op until enable() is called (see TELEMETRY_ENABLED).
+"""
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import constants
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320)
+
+enabled = False
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Thread-safe counters and histograms keyed by (name, labels)."""
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]] = []
+
+    def describe(self, name: str, help_text: str, buckets: Optional[Tuple[float, ...]] = None):
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = buckets
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self._buckets.get(name, SECONDS_BUCKETS))
+            histogram.observe(value)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]):
+        """collector() yields (name, labels, value) gauges read at scrape time, e.g. cache statistics."""
+        self._collectors.append(collector)
+
+    @staticmethod
+    def _labels(labels: Iterable[Tuple[str, Any]]) -> str:
+        labels = list(labels)
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{k}="{str(v)}"'.replace('\n', ' ') for k, v in labels) + '}'
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{self._labels(key)} {value}" for key, value in series.items())
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._labels((*key, ('le', bound)))} {cumulative}")
+                    lines.append(f"{name}_sum{self._labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{self._labels(key)} {histogram.count}")
+        gauges: Dict[str, List[str]] = {}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                gauges.setdefault(name, []).append(f"{name}{self._labels(sorted(labels.items()))} {value}")
+        for name, samples in sorted(gauges.items()):
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+metrics.describe('rag_span_seconds', 'Duration of each pipeline span (stage)')
+metrics.describe('rag_requests_total', 'Messages answered, by pipeline and outcome')
+metrics.describe('rag_response_cache_total', 'Response cache lookups by result')
+metrics.describe('rag_retrieved_docs', 'Chunks returned by retrieval per message', COUNT_BUCKETS)
+metrics.describe('rag_reranked_docs', 'Chunks scored by the reranker per message', COUNT_BUCKETS)
+metrics.describe('rag_llm_prompt_tokens_total', 'Prompt tokens evaluated by Ollama')
+metrics.describe('rag_llm_completion_tokens_total', 'Tokens generated by Ollama')
+metrics.describe('rag_llm_tokens_per_second', 'Generation speed reported by Ollama', RATE_BUCKETS)
+
+
+class _TraceFile:
+    """Appends finished spans as JSON lines, shaped like OTLP/JSON spans."""
+    def __init__(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, mode='a', encoding='utf-8')
+
+    def export(self, span: 'Span'):
+        record = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'parentSpanId': span.parent_id or '',
+            'name': span.name,
+            'startTimeUnixNano': span.start_ns,
+            'endTimeUnixNano': span.end_ns,
+            'attributes': [{'key': key, 'value': value} for key, value in span.attributes.items()],
+            'status': {'code': 'ERROR', 'message': span.error} if span.error else {'code': 'OK'},
+        }
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+
+_trace_file: Optional[_TraceFile] = None
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'error',
+                 '_start', '_token')
+
+    def __init__(self, name: str, attributes: Dict[str, Any]) -> None:
+        parent = _current_span.get()
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(seconds * 1e9)
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Exited in another context than entered (e.g. an async generator closed elsewhere)
+            pass
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        metrics.observe('rag_span_seconds', seconds, span=self.name)
+        if _trace_file is not None:
+            _trace_file.export(self)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """Context manager timing one stage; nests under the current span."""
+    if not enabled:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def current_span():
+    return _current_span.get() or _NOOP_SPAN
+
+
+def inc(name: str, value: float = 1, **labels):
+    if enabled:
+        metrics.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    if enabled:
+        metrics.observe(name, value, **labels)
+
+
+def enable(trace_path: Optional[str] = None):
+    """Start recording; spans are also written to trace_path when given."""
+    global enabled, _trace_file
+    if trace_path and _trace_file is None:
+        _trace_file = _TraceFile(trace_path)
+    enabled = True
+
+
+def _record_ollama_tokens(info: Optional[Dict[str, Any]]):
+    if not enabled or not info or not info.get('done'):
+        return
+    prompt_tokens = info.get('prompt_eval_count') or 0
+    completion_tokens = info.get('eval_count') or 0
+    model = info.get('model', '')
+    metrics.inc('rag_llm_prompt_tokens_total', prompt_tokens, model=model)
+    metrics.inc('rag_llm_completion_tokens_total', completion_tokens, model=model)
+    eval_seconds = (info.get('eval_duration') or 0) / 1e9
+    tokens_per_second = completion_tokens / eval_seconds if eval_seconds else 0.0
+    if tokens_per_second:
+        metrics.observe('rag_llm_tokens_per_second', tokens_per_second, model=model)
+    current = current_span()
+    current.set_attribute('llm.prompt_tokens', prompt_tokens)
+    current.set_attribute('llm.completion_tokens', completion_tokens)
+    current.set_attribute('llm.tokens_per_second', round(tokens_per_second, 2))
+
+
+_token_callback_class = None
+
+
+def ollama_token_callback():
+    """
+    Callback handler recording token counts and speed from the final response Ollama
+    streams back (done=True). Built on first use, langchain_core is slow to import.
+    """
+    global _token_callback_class
+    if _token_callback_class is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class OllamaTokenCallback(BaseCallbackHandler):
+            run_inline = True
+
+            def on_llm_end(self, response, **kwargs: Any) -> None:
+                # OllamaLLM's streaming passes no chunk to on_llm_new_token, but the generation
+                # handed to on_llm_end, streamed or not, merges the final chunk's generation_info
+                for generations in response.generations:
+                    for generation in generations:
+                        _record_ollama_tokens(generation.generation_info)
+
+        _token_callback_class = OllamaTokenCallback
+    return _token_callback_class()
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics on its own thread, for processes without the HTTP server (e.g. Streamlit)."""
+    global _metrics_server
+    if _metrics_server is not None:
+        return
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            payload = metrics.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    _metrics_server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    threading.Thread(target=_metrics_server.serve_forever, name='metrics', daemon=True).start()
+    print(f"Serving metrics on :{port}/metrics")
+
+
+if constants.TELEMETRY_ENABLED:
+    enable(constants.TELEMETRY_TRACE_PATH)
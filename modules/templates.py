@@ -1,20 +1,21 @@
 from jinja2 import Template
 
-# Template for user/assistant conversation
+from . import constants
+
+# Template for user/assistant conversation, one line per message so no prompt tokens go to indentation
 for_llama3_history = """
-{% for message in messages %}
-    {% if (message['role'] == 'user') != (loop.index0 % 2 == 0) %}
-        {{ raise_exception('Conversation roles must alternate user/assistant/user/assistant/...') }}
-    {% endif %}
-    {% if message['role'] == 'user' %}
-        USER: {{ message['content'] }}
-    {% elif message['role'] == 'assistant' %}
-        MACHINE: {{ message['content'] }}
-    {% else %}
-        {{ raise_exception('Only user and assistant roles are supported!') }}
-    {% endif %}
-{% endfor %}
-"""
+{%- if summary %}SUMMARY OF EARLIER TURNS: {{ summary }}
+{% endif %}
+{%- for message in messages %}
+    {%- if (message['role'] == 'user') != (loop.index0 % 2 == 0) %}
+        {{- raise_exception('Conversation roles must alternate user/assistant/user/assistant/...') }}
+    {%- endif %}
+    {%- if message['role'] == 'user' %}USER: {{ message['content'] }}
+{% elif message['role'] == 'assistant' %}MACHINE: {{ message['content'] }}
+{% else %}
+        {{- raise_exception('Only user and assistant roles are supported!') }}
+    {%- endif %}
+{%- endfor %}"""
 
 for_llama3_route_query = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
     You help triage user request, \
@@ -61,6 +62,16 @@ for_llama3_contextualize_in_history = """<|begin_of_text|><|start_header_id|>sys
     Ok, what is your most recent question that needs formulated? <|eot_id|><|start_header_id|>user<|end_header_id|>
     {query} <|eot_id|><|start_header_id|>assistant<|end_header_id|>"""
 
+for_llama3_summarize_history = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+    You help keep a running summary of a conversation. \
+    Given the summary so far and the turns that followed it, output an updated summary of a few sentences. \
+    Keep the names, numbers and topics the user asked about, drop small talk. \
+    Output only the summary. <|eot_id|><|start_header_id|>assistant<|end_header_id|>
+    Ok, tell me the summary so far <|eot_id|><|start_header_id|>user<|end_header_id|>
+    SUMMARY: {summary} <|eot_id|><|start_header_id|>assistant<|end_header_id|>
+    Ok, tell me what was said since. Use USER:, and MACHINE: to show whose turn it is <|eot_id|><|start_header_id|>user<|end_header_id|>
+    CHAT HISTORY: {chat_history} <|eot_id|><|start_header_id|>assistant<|end_header_id|>"""
+
 for_llama3_clarify = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
     You help gather more information. \
     Given some documents, and a human question, which is not directly relevant to the documents, \
@@ -72,33 +83,130 @@ for_llama3_clarify = """<|begin_of_text|><|start_header_id|>system<|end_header_i
     Ok, what is your question <|eot_id|><|start_header_id|>user<|end_header_id|>
     {query} <|eot_id|><|start_header_id|>assistant<|end_header_id|>"""
 
+for_llama3_answer_or_clarify = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+    You help answer humans's questions, only based on the given documents. \
+    Given some documents, and a human question, first decide if the documents CAN help you derive an answer. \
+    If they can, output your answer. Keep it short. \
+    If the documents are NOT relevant to the question, do NOT answer the question, \
+    but output CLARIFY: followed by one single clarification question, for users to elaborate on their question. \
+    <|eot_id|><|start_header_id|>assistant<|end_header_id|>
+    Ok, give me the documents <|eot_id|><|start_header_id|>user<|end_header_id|>
+    DOCUMENTS: {context} <|eot_id|><|start_header_id|>assistant<|end_header_id|>
+    Ok, what is your question <|eot_id|><|start_header_id|>user<|end_header_id|>
+    {query} <|eot_id|><|start_header_id|>assistant<|end_header_id|>"""
+
+
+# Layout for Ollama's prompt cache: every prompt starts with the same system block, and
+# the documents and question come before the stage's task, so the relevancy check and
+# the answer share everything up to the TASK and the second call only evaluates its task
+prefix_cache_system = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+    You are an assistant for questions about a collection of documents. \
+    Each request ends with a TASK, do exactly what it says and output only what it asks for. <|eot_id|>"""
+
+prefix_cache_documents = """<|start_header_id|>user<|end_header_id|>
+    DOCUMENTS: {context}
+    QUESTION: {query} <|eot_id|>"""
+
+prefix_cache_question = """<|start_header_id|>user<|end_header_id|>
+    QUESTION: {query} <|eot_id|>"""
+
+prefix_cache_history = """<|start_header_id|>user<|end_header_id|>
+    CHAT HISTORY: {chat_history}
+    QUESTION: {query} <|eot_id|>"""
+
+prefix_cache_summary = """<|start_header_id|>user<|end_header_id|>
+    SUMMARY: {summary}
+    CHAT HISTORY: {chat_history} <|eot_id|>"""
+
+
+def _task(text: str) -> str:
+    return f"<|start_header_id|>user<|end_header_id|>\n    TASK: {text} <|eot_id|><|start_header_id|>assistant<|end_header_id|>"
+
+
+prefix_cache_route_query = prefix_cache_system + prefix_cache_question + _task(
+    "Triage the QUESTION, do NOT answer it, do NOT explain yourself. "
+    "Given a text input, output either DOCS or DEFAULT, according to these definitions: "
+    "DOCS if it is a question that seems to require knowledge from some external documentation, "
+    "DEFAULT if the user is just chit-chatting. Output ONE word answer: DOCS or DEFAULT."
+)
+
+prefix_cache_sort_relevancy = prefix_cache_system + prefix_cache_documents + _task(
+    "Classify the relevancy of the DOCUMENTS to the QUESTION, do NOT answer it, do NOT explain yourself. "
+    "Given the documents and the question, output either YES or NO: YES if the DOCUMENTS CAN help you "
+    "derive an answer, NO if they are NOT relevant. Output ONE word answer: YES or NO."
+)
+
+prefix_cache_qa_from_docs = prefix_cache_system + prefix_cache_documents + _task(
+    "Answer the QUESTION only based on the DOCUMENTS. Keep it short."
+)
+
+prefix_cache_clarify = prefix_cache_system + prefix_cache_documents + _task(
+    "The QUESTION is not directly relevant to the DOCUMENTS. Do NOT answer it, "
+    "but output one single clarification question asking the user to elaborate on their question."
+)
+
+prefix_cache_answer_or_clarify = prefix_cache_system + prefix_cache_documents + _task(
+    "First decide if the DOCUMENTS CAN help you derive an answer to the QUESTION. If they can, output "
+    "your answer, only based on the DOCUMENTS. Keep it short. If the DOCUMENTS are NOT relevant, do NOT "
+    "answer, but output CLARIFY: followed by one single clarification question, for users to elaborate on their question."
+)
+
+prefix_cache_contextualize_in_history = prefix_cache_system + prefix_cache_history + _task(
+    "Formulate the QUESTION into a standalone question that can be understood without the CHAT HISTORY "
+    "(USER: and MACHINE: show whose turn it was). Do NOT answer it, just reformulate it if needed and "
+    "otherwise return it as is. Output only that formulated question."
+)
+
+prefix_cache_summarize_history = prefix_cache_system + prefix_cache_summary + _task(
+    "Keep a running summary of the conversation: output an updated SUMMARY of a few sentences covering "
+    "the CHAT HISTORY that followed it. Keep the names, numbers and topics the user asked about, drop small talk."
+)
+
 
 class CustomTemplates:
     """Handles Jinja2 template rendering for user/assistant history."""
     def __init__(self, model: str) -> None:
-        models = ['llama3']
+        models = list(constants.SUPPORTED_MODELS)
         if model not in models:
             raise RuntimeError('No Models Found')
         self.active = models.index(model)
         if self.active == 0:
             self.history = Template(for_llama3_history)
 
-    def render_template(self, content):
+    def render_template(self, content, summary: str = ''):
         if self.active == 0:
-            return self.history.render({"messages": content})
+            return self.history.render({"messages": content, "summary": summary})
         return ""  # Extend for more models if needed
 
 
 class Prompts:
-    """Holds all prompt strings (Jinja not needed for these)"""
-    def __init__(self, model: str) -> None:
-        models = ['llama3']
+    """
+    Holds all prompt strings (Jinja not needed for these)
+
+    layout is 'classic' or 'prefix_cache' (see PROMPT_LAYOUT), the placeholders are the same.
+    """
+    def __init__(self, model: str, layout: str = None) -> None:
+        models = list(constants.SUPPORTED_MODELS)
         if model not in models:
             raise RuntimeError('No Models Found')
+        self.layout = layout or constants.PROMPT_LAYOUT
+        if self.layout not in constants.PROMPT_LAYOUTS:
+            raise ValueError(f"Unknown prompt layout '{self.layout}', expected one of {constants.PROMPT_LAYOUTS}")
         self.active = models.index(model)
-        if self.active == 0:
+        if self.active == 0 and self.layout == 'prefix_cache':
+            self.route_query = prefix_cache_route_query
+            self.sort_relevancy = prefix_cache_sort_relevancy
+            self.qa_from_docs = prefix_cache_qa_from_docs
+            self.contextualize_in_history = prefix_cache_contextualize_in_history
+            self.summarize_history = prefix_cache_summarize_history
+            self.clarify = prefix_cache_clarify
+            self.answer_or_clarify = prefix_cache_answer_or_clarify
+        elif self.active == 0:
             self.route_query = for_llama3_route_query
             self.sort_relevancy = for_llama3_sort_relevancy
             self.qa_from_docs = for_llama3_qa_from_docs
             self.contextualize_in_history = for_llama3_contextualize_in_history
+            self.summarize_history = for_llama3_summarize_history
             self.clarify = for_llama3_clarify
+            # Relevancy check and answer in a single call, see the 'fast' pipeline
+            self.answer_or_clarify = for_llama3_answer_or_clarify
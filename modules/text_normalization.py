@@ -0,0 +1,91 @@
+import re
+from datetime import date
+from typing import Dict, List, Optional
+
+# Separates pages in a batch; removed from the input and kept by every rule
+PAGE_SEPARATOR = '\x00'
+# Joining only pays off for short texts (CSV rows, snippets); long pages are cleaned one by one
+JOIN_MAX_AVG_CHARS = 2048
+
+DISALLOWED_CHARS = re.compile(r'[^\w\s\'\".,?@:/\x00]+')
+US_DATE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+
+
+def _iso_date(match: re.Match) -> str:
+    month, day, year = match.groups()
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        # Not a real date (e.g. 13/45/2020 or a fraction), leave it as written
+        return match.group(0)
+
+
+class TextNormalizer:
+    """
+    Cleans extracted text with precompiled patterns, dates rewritten in one pass.
+
+    :param lowercase: lower-case everything
+    :param strip_symbols: drop characters other than word characters, whitespace and '".,?@:/
+    :param collapse_whitespace: turn runs of whitespace into one space and strip the ends
+    :param iso_dates: rewrite MM/DD/YYYY dates as YYYY-MM-DD, invalid dates are kept
+    """
+    def __init__(self, lowercase: bool = True, strip_symbols: bool = True, collapse_whitespace: bool = True,
+                 iso_dates: bool = True) -> None:
+        self.lowercase = lowercase
+        self.strip_symbols = strip_symbols
+        self.collapse_whitespace = collapse_whitespace
+        self.iso_dates = iso_dates
+
+    def _apply(self, text: str) -> str:
+        if self.lowercase:
+            text = text.lower()
+        if self.strip_symbols:
+            text = DISALLOWED_CHARS.sub('', text)
+        if self.collapse_whitespace:
+            # Same as re.sub(r'\s+', ' ', text).strip(), the separator is not whitespace and survives
+            text = ' '.join(text.split())
+        if self.iso_dates:
+            text = US_DATE.sub(_iso_date, text)
+        return text
+
+    def __call__(self, text: str) -> str:
+        text = self._apply(text.replace(PAGE_SEPARATOR, ''))
+        return text.strip() if self.collapse_whitespace else text
+
+    def normalize_many(self, texts: List[str]) -> List[str]:
+        """Clean a list of pages; short ones are joined so each pattern runs once over the batch."""
+        if not texts:
+            return []
+        if sum(len(text) for text in texts) > JOIN_MAX_AVG_CHARS * len(texts):
+            return [self(text) for text in texts]
+        joined = PAGE_SEPARATOR.join(text.replace(PAGE_SEPARATOR, '') for text in texts)
+        pages = self._apply(joined).split(PAGE_SEPARATOR)
+        return [page.strip() for page in pages] if self.collapse_whitespace else pages
+
+
+DEFAULT_NORMALIZER = TextNormalizer()
+
+# Extensions whose loaded text is cleaned, and how; other file types are left as loaded
+NORMALIZERS: Dict[str, TextNormalizer] = {
+    '.pdf': DEFAULT_NORMALIZER,
+    '.html': DEFAULT_NORMALIZER,
+    '.txt': DEFAULT_NORMALIZER,
+}
+
+
+def set_normalizer(ext: str, normalizer: Optional[TextNormalizer]):
+    """Configure the cleaning of one file type, None disables it."""
+    if normalizer is None:
+        NORMALIZERS.pop(ext, None)
+    else:
+        NORMALIZERS[ext] = normalizer
+
+
+def normalizer_for(ext: str) -> Optional[TextNormalizer]:
+    return NORMALIZERS.get(ext)
+
+
+def clean_texts(texts: List[str], ext: Optional[str] = None) -> List[str]:
+    """Clean a batch of pages with the rules of ext (the default rules when ext is None)."""
+    normalizer = DEFAULT_NORMALIZER if ext is None else normalizer_for(ext)
+    return normalizer.normalize_many(texts) if normalizer else list(texts)
@@ -1,34 +1,30 @@
 import os
-import re
 import aiofiles
-from datetime import datetime
 import glob
-from typing import List
-from langchain.docstore.document import Document
+import importlib
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple
 
 from . import constants
-from langchain_community.document_loaders import (
-    CSVLoader,
-    PyMuPDFLoader,
-    TextLoader,
-    UnstructuredHTMLLoader,
-    UnstructuredMarkdownLoader,
-    UnstructuredODTLoader,
-    UnstructuredPowerPointLoader,
-    UnstructuredWordDocumentLoader,
-)
+from .text_normalization import DEFAULT_NORMALIZER, NORMALIZERS, clean_texts, normalizer_for
 
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+
+# Loader classes of langchain_community.document_loaders by name, imported when a file is loaded
 LOADER_MAPPING = {
-    ".csv": (CSVLoader, {}),
-    ".doc": (UnstructuredWordDocumentLoader, {}),
-    ".docx": (UnstructuredWordDocumentLoader, {}),
-    ".html": (UnstructuredHTMLLoader, {}),
-    ".md": (UnstructuredMarkdownLoader, {}),
-    ".odt": (UnstructuredODTLoader, {}),
-    ".pdf": (PyMuPDFLoader, {}),
-    ".ppt": (UnstructuredPowerPointLoader, {}),
-    ".pptx": (UnstructuredPowerPointLoader, {}),
-    ".txt": (TextLoader, {"encoding": "utf8"}),
+    ".csv": ("CSVLoader", {}),
+    ".doc": ("UnstructuredWordDocumentLoader", {}),
+    ".docx": ("UnstructuredWordDocumentLoader", {}),
+    ".html": ("UnstructuredHTMLLoader", {}),
+    ".md": ("UnstructuredMarkdownLoader", {}),
+    ".odt": ("UnstructuredODTLoader", {}),
+    ".pdf": ("PyMuPDFLoader", {}),
+    ".ppt": ("UnstructuredPowerPointLoader", {}),
+    ".pptx": ("UnstructuredPowerPointLoader", {}),
+    ".txt": ("TextLoader", {"encoding": "utf8"}),
 }
 
 async def write_file(file_content: bytes, file_path: str):
@@ -36,39 +32,132 @@ async def write_file(file_content: bytes, file_path: str):
         await out_file.write(file_content)
 
 def clean_text(text: str) -> str:
-    text = text.lower()
-    text = re.sub(r'[^\w\s\'\".,?@:/]', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    dates = re.findall(r'\d{1,2}/\d{1,2}/\d{4}', text)
-    for date in dates:
-        standardized_date = datetime.strptime(date, '%m/%d/%Y').strftime('%Y-%m-%d')
-        text = text.replace(date, standardized_date)
-    return text
-
-def load_single_document(file_path: str) -> List[Document]:
+    return DEFAULT_NORMALIZER(text)
+
+def load_single_document(file_path: str) -> List['Document']:
     ext = "." + file_path.rsplit(".", 1)[-1]
     if ext in LOADER_MAPPING:
-        loader_class, loader_args = LOADER_MAPPING[ext]
+        loader_name, loader_args = LOADER_MAPPING[ext]
+        loader_class = getattr(importlib.import_module("langchain_community.document_loaders"), loader_name)
         loader = loader_class(file_path, **loader_args)
         docs = loader.load()
-        if ext in ['.pdf', '.html', '.txt']:
-            for doc in docs:
-                doc.page_content = clean_text(doc.page_content)
+        if normalizer_for(ext):
+            for doc, text in zip(docs, clean_texts([doc.page_content for doc in docs], ext)):
+                doc.page_content = text
         return docs
     raise ValueError(f"Unsupported file extension '{ext}'")
 
-def load_documents(source_dir: str, ignored_files=None) -> List[Document]:
-    if ignored_files is None:
-        ignored_files = []
+def list_source_files(source_dir: str) -> List[str]:
     all_files = []
     for ext in LOADER_MAPPING:
         all_files.extend(
             glob.glob(os.path.join(source_dir, f"**/*{ext}"), recursive=True)
         )
+    return all_files
+
+def _load_file_safe(file_path: str) -> Tuple[str, List['Document'], Optional[str]]:
+    # Runs in the worker process, never raise so one bad file cannot abort the batch
+    try:
+        return file_path, load_single_document(file_path), None
+    except Exception as e:
+        return file_path, [], f"{type(e).__name__}: {e}"
+
+def _init_load_worker(normalizers: dict):
+    # Spawned workers start from a fresh import, bring over rules set with set_normalizer
+    NORMALIZERS.clear()
+    NORMALIZERS.update(normalizers)
+
+def _new_load_pool(workers: int) -> ProcessPoolExecutor:
+    # Called from ingest worker threads of the UI or the server: forking a process with
+    # other threads holding locks (SQLite, logging, ...) can deadlock the children
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_load_worker, initargs=(dict(NORMALIZERS),))
+
+def iter_documents(file_paths: Iterable[str], workers: Optional[int] = None,
+                   max_pending: Optional[int] = None) -> Iterator[Tuple[str, List['Document']]]:
+    """
+    Load and clean files, yielding (file_path, documents) as each one finishes.
+    Files that fail to load are reported and skipped.
+
+    :param file_paths: files to load
+    :param workers: size of the process pool, 1 loads serially in this process
+    :param max_pending: bound on files submitted but not yet yielded (default 2 * workers)
+    """
+    workers = workers or constants.LOAD_WORKERS
+    if workers <= 1:
+        for file_path in file_paths:
+            file_path, docs, error = _load_file_safe(file_path)
+            if error:
+                print(f"Failed to load {file_path}: {error}")
+                continue
+            yield file_path, docs
+        return
+
+    max_pending = max_pending or workers * 2
+    paths = iter(file_paths)
+    pool = _new_load_pool(workers)
+    try:
+        pending = {}
+        # In flight when a worker died: retried one at a time, so the file that kills its worker is found
+        suspects = []
+
+        def submit_next() -> bool:
+            if suspects:
+                if pending:
+                    return False
+                file_path = suspects.pop(0)
+            else:
+                file_path = next(paths, None)
+                if file_path is None:
+                    return False
+            try:
+                pending[pool.submit(_load_file_safe, file_path)] = file_path
+            except BrokenProcessPool:
+                # A worker died and the pool is found out below, through the futures in flight
+                suspects.append(file_path)
+                return False
+            return True
+
+        while submit_next() and len(pending) < max_pending:
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = pending.pop(future)
+                try:
+                    file_path, docs, error = future.result()
+                except BrokenProcessPool as e:
+                    if pending:
+                        # Any of the files in flight may have done it, the others are loaded again
+                        suspects[:0] = [file_path, *pending.values()]
+                        pending.clear()
+                        file_path = None
+                    else:
+                        # Loaded alone, this file crashed its worker (e.g. inside a native parser)
+                        docs, error = [], f"{type(e).__name__}: {e}"
+                    pool.shutdown(wait=True)
+                    pool = _new_load_pool(workers)
+                except Exception as e:
+                    docs, error = [], f"{type(e).__name__}: {e}"
+                while submit_next() and len(pending) < max_pending:
+                    pass
+                if file_path is None:
+                    # The other futures of this round belong to the broken pool
+                    break
+                if error:
+                    print(f"Failed to load {file_path}: {error}")
+                    continue
+                yield file_path, docs
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def load_documents(source_dir: str, ignored_files=None, workers: Optional[int] = None) -> List['Document']:
+    if ignored_files is None:
+        ignored_files = []
+    ignored_files = set(ignored_files)
+    all_files = [f for f in list_source_files(source_dir) if f not in ignored_files]
     documents = []
-    for file_path in all_files:
-        if file_path in ignored_files:
-            continue
-        documents.extend(load_single_document(file_path))
+    for file_path, docs in iter_documents(all_files, workers):
+        documents.extend(docs)
         print(f"Loaded document {file_path}")
     return documents
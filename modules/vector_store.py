@@ -0,0 +1,257 @@
+"""
+Where the bots' chunks live in Chroma.
+
+In 'per_bot' mode (the original layout) every bot has its own persistent Chroma DB
+under data/vector_db/<bot_id>. In 'shared' mode the bots are spread over
+VECTOR_STORE_SHARDS shards under VECTOR_STORE_DIR, one collection each, picked by
+hashing the bot id. Chunks there carry the bot_id in their metadata and in their
+id, and every search filters on it inside Chroma. Either way, clients are pooled
+per directory, so a process opens each DB once.
+
+Bots ingested in 'per_bot' mode are moved into the shards with
+
+    python -m modules.vector_store migrate [--bots ID ...] [--delete-old]
+"""
+import os
+import uuid
+import zlib
+import shutil
+import argparse
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from . import constants
+from .bot import get_db_dir
+
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+
+# Files Chroma keeps in a persist directory: chroma.sqlite3 and one folder (named by uuid) per segment
+CHROMA_SQLITE_FILENAME = 'chroma.sqlite3'
+PER_BOT_COLLECTION = 'langchain'
+SHARED_COLLECTION = 'chunks'
+# Collection metadata key holding the name of the embedding model of its vectors
+EMBEDDING_MODEL_KEY = 'embedding_model'
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(path: str):
+    """The process-wide Chroma client of the persistent DB at path."""
+    path = os.path.abspath(path)
+    with _clients_lock:
+        client = _clients.get(path)
+        if client is None:
+            import chromadb
+            from chromadb.config import Settings
+            os.makedirs(path, exist_ok=True)
+            client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+            _clients[path] = client
+        return client
+
+
+def close_client(path: str):
+    """Stop the client of path so its files can be removed; later get_client calls reopen it."""
+    path = os.path.abspath(path)
+    with _clients_lock:
+        client = _clients.pop(path, None)
+    if client is None:
+        return
+    from chromadb.api.client import SharedSystemClient
+    # Chroma keeps one system per directory for the life of the process, drop ours
+    system = SharedSystemClient._identifier_to_system.pop(path, None)
+    if system is not None:
+        system.stop()
+
+
+def reopen_client(path: str):
+    """
+    Forget the pooled client of path, so the next get_client loads the DB from disk again
+    and sees what a writer in another process added. Stores holding the old client keep it.
+    """
+    path = os.path.abspath(path)
+    with _clients_lock:
+        if _clients.pop(path, None) is None:
+            return
+        from chromadb.api.client import SharedSystemClient
+        # Not stopped, requests still searching through it finish normally
+        SharedSystemClient._identifier_to_system.pop(path, None)
+
+
+def shard_for(bot_id: str, shards: Optional[int] = None) -> int:
+    return zlib.crc32(bot_id.encode('utf-8')) % (shards or constants.VECTOR_STORE_SHARDS)
+
+
+def shard_dir(shard: int) -> str:
+    return os.path.join(constants.VECTOR_STORE_DIR, f"shard_{shard:03d}")
+
+
+def has_per_bot_db(bot_id: str) -> bool:
+    return os.path.exists(os.path.join(get_db_dir(bot_id), CHROMA_SQLITE_FILENAME))
+
+
+class TenantStore:
+    """
+    The chunks of one bot, with the calls ingest and HybridRetriever make on a Chroma
+    vector store: its own DB in 'per_bot' mode, its slice of a shard in 'shared' mode.
+
+    :param bot_id: the bot whose chunks are read and written
+    :param embedding_function: embeddings used by Chroma for add_documents without vectors
+    :param mode: 'per_bot' or 'shared', defaults to VECTOR_STORE_MODE
+    :param db_dir: the bot's directory in 'per_bot' mode, defaults to get_db_dir(bot_id)
+    """
+    def __init__(self, bot_id: str, embedding_function=None, mode: Optional[str] = None,
+                 db_dir: Optional[str] = None) -> None:
+        from langchain_community.vectorstores import Chroma
+        self.bot_id = bot_id
+        self.mode = mode or constants.VECTOR_STORE_MODE
+        if self.mode not in constants.VECTOR_STORE_MODES:
+            raise ValueError(f"Unknown vector store mode '{self.mode}', expected one of {constants.VECTOR_STORE_MODES}")
+        if self.mode == 'per_bot':
+            self.path = db_dir or get_db_dir(bot_id)
+            collection_name = PER_BOT_COLLECTION
+            self.filter = None
+        else:
+            self.path = shard_dir(shard_for(bot_id))
+            collection_name = SHARED_COLLECTION
+            self.filter = {'bot_id': bot_id}
+        self.db = Chroma(collection_name=collection_name, embedding_function=embedding_function,
+                         client=get_client(self.path))
+        self._check_embedding_model(getattr(embedding_function, 'model', None))
+
+    def _check_embedding_model(self, model: Optional[str]):
+        # The collection records the model its vectors come from, vectors of another one would
+        # fail on a dimension mismatch or, worse, silently return unrelated chunks
+        if model is None:
+            return
+        collection = self.db._collection
+        metadata = collection.metadata or {}
+        recorded = metadata.get(EMBEDDING_MODEL_KEY)
+        if recorded is None:
+            # Created by this or an older version, record the model in use (hnsw settings are immutable)
+            if not any(key.startswith('hnsw:') for key in metadata):
+                collection.modify(metadata=dict(metadata, **{EMBEDDING_MODEL_KEY: model}))
+        elif recorded != model:
+            raise ValueError(
+                f"The vectors at {self.path} were embedded with '{recorded}', not '{model}'. Set "
+                f"EMBEDDING_MODEL={recorded}, or run python -m modules.chunk_store reembed --model {model}"
+            )
+
+    @property
+    def embeddings(self):
+        return self.db.embeddings
+
+    def scoped_id(self, chunk_id: str) -> str:
+        """Chunk ids are unique per bot; in a shared collection they are prefixed with the bot id."""
+        if self.filter is None:
+            return chunk_id
+        prefix = f"{self.bot_id}:"
+        return chunk_id if chunk_id.startswith(prefix) else prefix + chunk_id
+
+    def add(self, texts: List['Document'], ids: List[str], embeddings: Optional[List[List[float]]] = None):
+        if self.filter is not None:
+            for text in texts:
+                text.metadata['bot_id'] = self.bot_id
+        if embeddings is None:
+            self.db.add_documents(texts, ids=ids)
+            return
+        # Reuse the pooled sentence embeddings from chunking instead of embedding every chunk again
+        self.upsert(ids, embeddings, [text.page_content for text in texts], [text.metadata for text in texts])
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[dict]):
+        if self.filter is not None:
+            metadatas = [dict(metadata or {}, bot_id=self.bot_id) for metadata in metadatas]
+        self.db._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids: List[str]):
+        self.db.delete(ids=ids)
+
+    def get(self, ids: List[str], include: List[str]) -> Dict[str, Any]:
+        return self.db.get(ids=ids, include=include)
+
+    def get_page(self, include: List[str], limit: int, offset: int = 0) -> Dict[str, Any]:
+        """A page of the bot's chunks in storage order."""
+        return self.db.get(where=self.filter, include=include, limit=limit, offset=offset)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List['Document']:
+        # The bot_id filter runs inside Chroma, a bot never sees (or pays for) other bots' chunks
+        return self.db.similarity_search_by_vector(embedding, k=k, filter=self.filter)
+
+
+def _is_segment_dir(path: str) -> bool:
+    try:
+        uuid.UUID(os.path.basename(path))
+    except ValueError:
+        return False
+    return os.path.isdir(path)
+
+
+def migrate_bot(bot_id: str, delete_old: bool = False, batch_size: int = 500) -> int:
+    """
+    Copy a bot's per-bot Chroma DB into its shard, vectors included so nothing is
+    embedded again, and rename its chunk ids in the manifest, the lexical index and
+    the chunk store. Running it again is harmless. Returns the number of chunks copied.
+    """
+    from .chunk_store import get_chunk_store
+    from .lexical import LexicalIndex
+    from .manifest import Manifest
+
+    db_dir = get_db_dir(bot_id)
+    if not has_per_bot_db(bot_id):
+        return 0
+    old = TenantStore(bot_id, mode='per_bot')
+    new = TenantStore(bot_id, mode='shared')
+    # The shard must hold vectors of the same model as the bot's
+    new._check_embedding_model((old.db._collection.metadata or {}).get(EMBEDDING_MODEL_KEY))
+    lexical_index = LexicalIndex(db_dir)
+    chunk_store = get_chunk_store(db_dir)
+    manifest = Manifest(db_dir)
+
+    copied = 0
+    while True:
+        batch = old.db.get(include=['documents', 'metadatas', 'embeddings'], limit=batch_size, offset=copied)
+        if not batch['ids']:
+            break
+        ids = [new.scoped_id(chunk_id) for chunk_id in batch['ids']]
+        metadatas = [dict(metadata or {}, chunk_id=chunk_id, bot_id=bot_id)
+                     for chunk_id, metadata in zip(ids, batch['metadatas'])]
+        new.upsert(ids, batch['embeddings'], batch['documents'], metadatas)
+        lexical_index.delete(batch['ids'])
+        lexical_index.add(ids, batch['documents'], metadatas)
+        chunk_store.rename(dict(zip(batch['ids'], ids)))
+        copied += len(ids)
+    for record in manifest.files.values():
+        record['chunk_ids'] = [new.scoped_id(chunk_id) for chunk_id in record['chunk_ids']]
+    manifest.save()
+
+    if delete_old:
+        close_client(db_dir)
+        os.remove(os.path.join(db_dir, CHROMA_SQLITE_FILENAME))
+        for name in os.listdir(db_dir):
+            if _is_segment_dir(os.path.join(db_dir, name)):
+                shutil.rmtree(os.path.join(db_dir, name))
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the Chroma storage of the bots")
+    commands = parser.add_subparsers(dest='command', required=True)
+    migrate = commands.add_parser('migrate', help="move per-bot Chroma DBs into the shared shards")
+    migrate.add_argument('--bots', nargs='*', help="bot ids, defaults to every bot under data/vector_db")
+    migrate.add_argument('--delete-old', action='store_true', help="remove the per-bot Chroma files afterwards")
+    args = parser.parse_args()
+
+    bot_ids = args.bots
+    if not bot_ids:
+        root = os.path.join('data', 'vector_db')
+        bot_ids = sorted(os.listdir(root)) if os.path.isdir(root) else []
+    for bot_id in bot_ids:
+        copied = migrate_bot(bot_id, delete_old=args.delete_old)
+        if copied:
+            print(f"Migrated {copied} chunks of bot {bot_id} to {shard_dir(shard_for(bot_id))}")
+    print(f"Done, set VECTOR_STORE_MODE=shared to serve the bots from {constants.VECTOR_STORE_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from modules import agent
+
+
+def primitives():
+    return dict(agent._loop_primitives.get(asyncio.get_running_loop(), {}))
+
+
+def test_per_bot_primitives_are_shared_while_in_use_then_dropped():
+    async def main():
+        lock = agent._per_bot('load', 'bot-1', asyncio.Lock)
+        async with lock:
+            waiter = asyncio.ensure_future(agent._per_bot('load', 'bot-1', asyncio.Lock).acquire())
+            await asyncio.sleep(0)
+            assert not waiter.done()
+            assert agent._per_bot('load', 'bot-1', asyncio.Lock) is lock
+            assert agent._per_bot('messages', 'bot-1', asyncio.Lock) is not lock
+        await waiter
+        lock.release()
+        del lock, waiter
+        assert primitives() == {}
+
+    asyncio.run(main())
+
+
+def test_messages_of_unknown_bots_leave_no_primitives(monkeypatch):
+    monkeypatch.setattr(agent, 'find_bot_by_id', lambda bot_id: None)
+
+    async def main():
+        for i in range(20):
+            with pytest.raises(ValueError, match='does not exist'):
+                async for _ in agent.on_message_stream(f"bot-{i}", 'hello'):
+                    pass
+        assert primitives() == {}
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import csv
+import os
+
+from modules.agent_registry import AgentRegistry
+
+CSV_COLUMNS = ['bot_id', 'name', 'description', 'starter', 'model']
+
+
+def seed_overview(path, count):
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for i in range(count):
+            writer.writerow({'bot_id': f"bot-{i}", 'name': f"Bot {i}", 'description': 'd', 'starter': 'hi',
+                             'model': 'llama3'})
+
+
+def open_registry(tmp_path):
+    return AgentRegistry(str(tmp_path / 'agents.sqlite3'), str(tmp_path / 'overview.csv'))
+
+
+def test_overview_csv_is_imported_once(tmp_path):
+    csv_path = tmp_path / 'overview.csv'
+    seed_overview(csv_path, 5)
+    registry = open_registry(tmp_path)
+    assert registry.count() == 5
+    assert registry.get('bot-3') == {'bot_id': 'bot-3', 'name': 'Bot 3', 'description': 'd', 'starter': 'hi',
+                                     'model': 'llama3'}
+    assert not csv_path.exists() and os.path.exists(str(csv_path) + '.migrated')
+
+    registry.upsert({'bot_id': 'bot-3', 'name': 'Renamed', 'description': 'd', 'starter': 'hi',
+                     'model': 'llama3', 'pipeline': 'fast'})
+    assert open_registry(tmp_path).count() == 5
+    # A CSV showing up again adds its new agents but never overwrites the registry
+    seed_overview(csv_path, 6)
+    registry = open_registry(tmp_path)
+    assert registry.count() == 6
+    assert registry.get('bot-3')['name'] == 'Renamed'
+
+
+def test_upsert_updates_in_place_and_keeps_the_listing_order(tmp_path):
+    registry = open_registry(tmp_path)
+    for i in range(3):
+        registry.upsert({'bot_id': f"bot-{i}", 'name': f"Bot {i}", 'description': 'd', 'starter': 'hi',
+                         'model': 'llama3', 'pipeline': 'sequential'})
+    registry.upsert({'bot_id': 'bot-0', 'name': 'First', 'description': 'd', 'starter': 'hi',
+                     'model': 'llama3', 'pipeline': 'fast'})
+    assert registry.count() == 3
+    assert [agent['bot_id'] for agent in registry.list()] == ['bot-0', 'bot-1', 'bot-2']
+    assert registry.get('bot-0')['pipeline'] == 'fast'
+    assert registry.delete('bot-1') and not registry.delete('bot-1')
+    assert registry.get('bot-1') is None
+
+
+def test_list_pages_in_csv_order(tmp_path):
+    seed_overview(tmp_path / 'overview.csv', 7)
+    registry = open_registry(tmp_path)
+    pages = [[agent['bot_id'] for agent in registry.list(offset, 3)] for offset in (0, 3, 6, 9)]
+    assert pages == [['bot-0', 'bot-1', 'bot-2'], ['bot-3', 'bot-4', 'bot-5'], ['bot-6'], []]
+    assert [agent['bot_id'] for agent in registry.list(5)] == ['bot-5', 'bot-6']
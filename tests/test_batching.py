@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from modules.batching import MicroBatcher
+
+
+def submit_all(batcher, items):
+    """Submit every item from its own thread at once; returns {item: result or exception}."""
+    results = {}
+    barrier = threading.Barrier(len(items))
+
+    def call(item):
+        barrier.wait()
+        try:
+            results[item] = batcher.submit(item)
+        except Exception as e:
+            results[item] = e
+
+    threads = [threading.Thread(target=call, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_concurrent_calls_share_batches_and_get_their_own_results():
+    batches = []
+
+    def double(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait=0.2)
+    results = submit_all(batcher, list(range(8)))
+    assert results == {item: item * 2 for item in range(8)}
+    assert sorted(item for batch in batches for item in batch) == list(range(8))
+    assert len(batches) < 8 and all(len(batch) <= 8 for batch in batches)
+    assert batcher.stats == {'items': 8, 'batches': len(batches)}
+
+
+def test_a_full_batch_does_not_wait_for_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=3, max_wait=5)
+    start = time.perf_counter()
+    assert submit_all(batcher, [1, 2, 3]) == {1: 1, 2: 2, 3: 3}
+    assert time.perf_counter() - start < 2
+
+
+def test_a_lone_call_runs_after_max_wait():
+    batcher = MicroBatcher(lambda items: [item + 1 for item in items], max_batch_size=32, max_wait=0.05)
+    start = time.perf_counter()
+    assert batcher.submit(1) == 2
+    assert 0.04 <= time.perf_counter() - start < 1
+    # The next call leads a new batch
+    assert batcher.submit(2) == 3
+    assert batcher.stats == {'items': 2, 'batches': 2}
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    def broken(items):
+        raise RuntimeError('model crashed')
+
+    batcher = MicroBatcher(broken, max_batch_size=4, max_wait=0.2)
+    results = submit_all(batcher, [1, 2, 3, 4])
+    assert all(isinstance(result, RuntimeError) for result in results.values()) and len(results) == 4
+    # The batcher keeps working afterwards
+    batcher.batch_fn = lambda items: items
+    assert batcher.submit(5) == 5
+
+
+def test_missing_results_are_an_error_not_none():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=2, max_wait=0.2)
+    results = submit_all(batcher, [1, 2])
+    assert all(isinstance(result, ValueError) for result in results.values())
+    with pytest.raises(ValueError):
+        MicroBatcher(lambda items: [], max_wait=0).submit(1)
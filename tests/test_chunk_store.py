@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from modules.chunk_store import CHUNK_BLOB_FILENAME, ChunkStore, get_chunk_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkStore(str(tmp_path))
+
+
+def test_append_and_get(store):
+    assert store.count() == 0 and store.get(['missing']) == [None]
+    store.append(['a', 'b'], ['first chunk', 'zweiter Abschnitt ü'], [{'source': 'a.txt'}, {'source': 'b.txt'}])
+    store.append(['c'], ['third'], [{}])
+    assert store.count() == 3
+    assert store.get(['c', 'missing', 'b', 'a']) == ['third', None, 'zweiter Abschnitt ü', 'first chunk']
+    assert list(store.iter_chunks(batch_size=2)) == [
+        (['a', 'b'], ['first chunk', 'zweiter Abschnitt ü'], [{'source': 'a.txt'}, {'source': 'b.txt'}]),
+        (['c'], ['third'], [{}]),
+    ]
+
+
+def test_appending_an_existing_id_replaces_it(store):
+    store.append(['a'], ['old'], [{}])
+    store.append(['a'], ['new'], [{}])
+    assert store.count() == 1 and store.get(['a']) == ['new']
+    assert store.dead_bytes() == len('old')
+
+
+def test_preview_decodes_only_the_start(store):
+    store.append(['a', 'b'], ['ü' * 1000, 'short'], [{}, {}])
+    assert store.preview('a', max_chars=10) == 'ü' * 10
+    assert store.preview('b', max_chars=10) == 'short'
+    assert store.preview('missing') is None
+
+
+def test_delete_and_rename(store):
+    store.append(['a', 'b', 'c'], ['one', 'two', 'three'], [{}, {}, {}])
+    store.delete(['b', 'missing'])
+    store.rename({'c': 'bot:c', 'a': 'a'})
+    assert store.get(['a', 'b', 'c', 'bot:c']) == ['one', None, None, 'three']
+    assert store.dead_bytes() == len('two')
+
+
+def test_compact_drops_deleted_texts(store):
+    texts = [f"chunk {i} " * (i + 1) for i in range(20)]
+    store.append([str(i) for i in range(20)], texts, [{'i': i} for i in range(20)])
+    # Map the blob before compacting, reads afterwards must see the rewritten file
+    assert store.get(['19']) == [texts[19]]
+    store.delete([str(i) for i in range(0, 20, 2)])
+    store.compact()
+
+    assert store.dead_bytes() == 0
+    assert os.path.getsize(store.blob_path) == sum(len(texts[i]) for i in range(1, 20, 2))
+    assert store.get([str(i) for i in range(20)]) == [None if i % 2 == 0 else texts[i] for i in range(20)]
+    assert store.preview('19', max_chars=5) == 'chunk'
+    ids, _, metadatas = zip(*store.iter_chunks())
+    assert sum(ids, []) == [str(i) for i in range(1, 20, 2)]
+    assert sum(metadatas, []) == [{'i': i} for i in range(1, 20, 2)]
+    # Appends after compaction land after the live chunks
+    store.append(['new'], ['appended'], [{}])
+    assert store.get(['new', '1']) == ['appended', texts[1]]
+
+
+def test_another_store_sees_appends_and_compaction(tmp_path):
+    writer, reader = ChunkStore(str(tmp_path)), ChunkStore(str(tmp_path))
+    writer.append(['a', 'b'], ['one', 'two'], [{}, {}])
+    assert reader.get(['a']) == ['one']
+    writer.append(['c'], ['three'], [{}])
+    writer.delete(['a'])
+    writer.compact()
+    assert reader.get(['a', 'b', 'c']) == [None, 'two', 'three']
+
+
+def test_empty_store_compacts(store):
+    store.compact()
+    assert store.count() == 0 and store.get(['a']) == [None]
+    assert os.path.basename(store.blob_path) == CHUNK_BLOB_FILENAME and os.path.getsize(store.blob_path) == 0
+
+
+def test_get_chunk_store_is_shared_per_directory(tmp_path):
+    store = get_chunk_store(str(tmp_path / 'bot'))
+    assert get_chunk_store(os.path.join(str(tmp_path), 'bot', '.')) is store
+    assert get_chunk_store(str(tmp_path / 'other')) is not store
@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.embeddings import BatchedEmbeddings
+
+
+class FakeClient:
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def make_embeddings(cache_path=''):
+    embeddings = BatchedEmbeddings(model='fake-embed', batch_size=4, max_concurrency=4, cache_path=cache_path)
+    embeddings.client = FakeClient()
+    return embeddings
+
+
+def test_counters_add_up_across_threads():
+    embeddings = make_embeddings()
+    batches = [[f"text {i} {j}" for j in range(10)] for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(embeddings.embed_documents, batches))
+
+    assert results[0][0] == [float(len('text 0 0')), 1.0]
+    # Each call sends 10 texts in batches of at most 4
+    assert embeddings.stats_snapshot() == {'texts': 2000, 'cache_hits': 0, 'embedded': 2000, 'requests': 600}
+
+
+def test_cached_and_repeated_texts_are_not_embedded_again(tmp_path):
+    embeddings = make_embeddings(str(tmp_path / 'cache.sqlite3'))
+    assert embeddings.embed_documents(['a', 'b', 'a']) == [[1.0, 1.0], [1.0, 1.0], [1.0, 1.0]]
+    assert embeddings.embedded_in_thread() == 2
+    embeddings.embed_documents(['b', 'c'])
+    assert embeddings.stats_snapshot() == {'texts': 5, 'cache_hits': 1, 'embedded': 3, 'requests': 2}
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from modules import ingestion
+from modules.ingest_jobs import IngestJobQueue, IngestWorkerPool
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return IngestJobQueue(str(tmp_path / 'jobs.sqlite3'), stale_after=60)
+
+
+def wait_for(queue, job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job still {queue.get(job_id)['status']}")
+
+
+def test_jobs_are_claimed_oldest_first_one_per_bot(queue):
+    first = queue.submit('bot-1', 'db1', 'src1')
+    second = queue.submit('bot-1', 'db1', 'src1')
+    other = queue.submit('bot-2', 'db2', 'src2')
+
+    job = queue.claim()
+    assert job['job_id'] == first and job['status'] == 'running' and job['attempts'] == 1
+    # bot-1 is busy, its next job waits
+    assert queue.claim()['job_id'] == other
+    assert queue.claim() is None
+    queue.finish(first, 'done')
+    assert queue.claim()['job_id'] == second
+
+
+def test_jobs_with_a_stale_heartbeat_are_claimed_again(tmp_path):
+    queue = IngestJobQueue(str(tmp_path / 'jobs.sqlite3'), stale_after=0.2)
+    job_id = queue.submit('bot-1', 'db1', 'src1')
+    job = queue.claim()
+    queue.add_progress(job_id, files=2, chunks=10)
+    assert queue.claim() is None
+
+    time.sleep(0.3)
+    resumed = queue.claim()
+    assert resumed['job_id'] == job_id and resumed['attempts'] == 2
+    assert resumed['started_at'] == job['started_at'] and resumed['files_done'] == 2
+    # A resumed job counts the files it still has on top of those already done
+    queue.set_remaining(job_id, 3)
+    assert queue.get(job_id)['files_total'] == 5
+
+    # Beating keeps it from being claimed a third time
+    queue.heartbeat([job_id])
+    assert queue.claim() is None
+
+
+def test_cancel(queue):
+    queued = queue.submit('bot-1', 'db1', 'src1')
+    assert queue.cancel(queued)
+    assert queue.get(queued)['status'] == 'cancelled' and queue.claim() is None
+
+    running = queue.submit('bot-1', 'db1', 'src1')
+    queue.claim()
+    assert queue.cancel(running)
+    job = queue.get(running)
+    assert job['status'] == 'running' and job['cancel_requested']
+    assert queue.cancel_requested(running)
+
+    queue.finish(running, 'cancelled')
+    assert not queue.cancel(running)
+    assert not queue.cancel('unknown')
+
+
+def test_workers_run_cancel_and_fail_jobs(queue, monkeypatch):
+    started = threading.Event()
+
+    def fake_ingest(db_dir, source_dir, progress=None, should_cancel=None, bot_id=None):
+        if source_dir == 'broken':
+            raise RuntimeError('unreadable')
+        progress('start', files=2)
+        if source_dir == 'slow':
+            started.set()
+            while not should_cancel():
+                time.sleep(0.01)
+            return False
+        for _ in range(2):
+            progress('file', path='f', chunks=3, embeddings=3)
+        return True
+
+    monkeypatch.setattr(ingestion, 'ingest', fake_ingest)
+    pool = IngestWorkerPool(queue, workers=2, poll_interval=0.05)
+    pool.start()
+    try:
+        done = queue.submit('bot-1', 'db1', 'ok')
+        broken = queue.submit('bot-2', 'db2', 'broken')
+        slow = queue.submit('bot-3', 'db3', 'slow')
+        pool.notify()
+
+        job = wait_for(queue, done, ('done',))
+        assert (job['files_done'], job['files_total'], job['chunks'], job['progress']) == (2, 2, 6, 1.0)
+        assert wait_for(queue, broken, ('failed',))['error'] == 'RuntimeError: unreadable'
+        assert started.wait(5)
+        queue.cancel(slow)
+        assert wait_for(queue, slow, ('cancelled',))['finished_at'] is not None
+    finally:
+        pool.stop()
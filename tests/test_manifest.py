@@ -0,0 +1,50 @@
+import os
+
+from modules.manifest import Manifest
+
+
+def write(path, text):
+    with open(path, mode='w', encoding='utf-8') as file:
+        file.write(text)
+
+
+def test_diff_reports_new_changed_and_removed_files(tmp_path):
+    source_dir, db_dir = tmp_path / 'source', tmp_path / 'db'
+    source_dir.mkdir()
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        write(source_dir / name, name)
+    paths = sorted(str(source_dir / name) for name in ('a.txt', 'b.txt', 'c.txt'))
+
+    manifest = Manifest(str(db_dir))
+    changed, removed = manifest.diff(str(source_dir), paths)
+    assert [key for _, key, _ in changed] == ['a.txt', 'b.txt', 'c.txt'] and removed == []
+    for file_path, key, content_hash in changed:
+        manifest.record(key, file_path, content_hash, [f"{key}-0"])
+    manifest.save()
+
+    manifest = Manifest(str(db_dir))
+    assert manifest.diff(str(source_dir), paths) == ([], [])
+
+    # Touched but identical content is not reported
+    os.utime(paths[0], (0, 0))
+    assert manifest.diff(str(source_dir), paths) == ([], [])
+
+    write(source_dir / 'b.txt', 'b changed')
+    os.remove(paths[2])
+    changed, removed = manifest.diff(str(source_dir), paths[:2])
+    assert [key for _, key, _ in changed] == ['b.txt'] and removed == ['c.txt']
+    assert manifest.chunk_ids('c.txt') == ['c.txt-0']
+
+
+def test_seeded_chunks_are_replaced_or_removed(tmp_path):
+    source_dir = tmp_path / 'source'
+    source_dir.mkdir()
+    write(source_dir / 'a.txt', 'a')
+    manifest = Manifest(str(tmp_path / 'db'))
+    manifest.seed('a.txt', ['legacy-1'])
+    manifest.seed('a.txt', ['legacy-2'])
+    manifest.seed('', ['legacy-3'])
+
+    changed, removed = manifest.diff(str(source_dir), [str(source_dir / 'a.txt')])
+    assert [key for _, key, _ in changed] == ['a.txt'] and removed == ['']
+    assert manifest.chunk_ids('a.txt') == ['legacy-1', 'legacy-2']
@@ -0,0 +1,126 @@
+import threading
+
+from modules import agent
+from modules.chunking import count_tokens
+from modules.memory import ConversationMemory, _summary_executor
+from modules.templates import CustomTemplates, Prompts
+
+
+class StubLLM:
+    """Answers summary prompts with numbered summaries and keeps the prompts it got."""
+    def __init__(self, fail=False, gate=None):
+        self.prompts = []
+        self.fail = fail
+        self.gate = gate
+        self.called = threading.Event()
+
+    def invoke(self, prompt, stop=None):
+        self.prompts.append(prompt)
+        self.called.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise ConnectionError('ollama is down')
+        return f" summary {len(self.prompts)} "
+
+
+def bot_info(memory, llm):
+    return {'memory': memory, 'llm': llm, 'prompts': Prompts('llama3'), 'jinja_templates': CustomTemplates('llama3')}
+
+
+def wait_for_summaries():
+    # One summary worker, anything submitted after the summary runs after it
+    _summary_executor.submit(lambda: None).result(timeout=5)
+
+
+def questions(window):
+    return [message['content'] for message in window[1] if message['role'] == 'user']
+
+
+def test_window_keeps_the_last_exchanges(tmp_path):
+    memory = ConversationMemory(str(tmp_path), max_tokens=1000, max_exchanges=2)
+    assert not memory.has_history() and memory.window() == ('', [])
+    for i in range(3):
+        memory.append(f"question {i}", f"answer {i}")
+
+    summary, messages = memory.window()
+    assert summary == ''
+    assert messages == [
+        {'role': 'user', 'content': 'question 1'}, {'role': 'assistant', 'content': 'answer 1'},
+        {'role': 'user', 'content': 'question 2'}, {'role': 'assistant', 'content': 'answer 2'},
+    ]
+    # Stored on disk, a reloaded agent continues the conversation
+    assert questions(ConversationMemory(str(tmp_path), max_tokens=1000, max_exchanges=2).window()) == \
+        ['question 1', 'question 2']
+
+
+def test_window_stays_within_the_token_budget(tmp_path):
+    answer = ' '.join(['word'] * 20)
+    tokens = count_tokens('question 0') + count_tokens(answer)
+    memory = ConversationMemory(str(tmp_path), max_tokens=2 * tokens + 1, max_exchanges=10)
+    for i in range(4):
+        memory.append(f"question {i}", answer)
+    assert questions(memory.window()) == ['question 2', 'question 3']
+
+    # The newest exchange is always kept, its answer shortened to the budget
+    memory.append('question 4', ' '.join(['long'] * 500))
+    assert questions(memory.window()) == ['question 4']
+    clipped = memory.window()[1][1]['content']
+    assert clipped.endswith(' ...') and len(clipped.split()) - 1 <= memory.max_tokens
+
+
+def test_old_exchanges_roll_into_the_summary(tmp_path):
+    memory = ConversationMemory(str(tmp_path), max_tokens=1000, max_exchanges=2)
+    llm = StubLLM()
+    info = bot_info(memory, llm)
+    for i in range(2):
+        agent._remember(info, f"question {i}", f"answer {i}")
+    wait_for_summaries()
+    assert llm.prompts == []
+
+    agent._remember(info, 'question 2', 'answer 2')
+    wait_for_summaries()
+    assert len(llm.prompts) == 1
+    assert 'question 0' in llm.prompts[0] and 'question 1' not in llm.prompts[0]
+    assert memory.window()[0] == 'summary 1'
+    assert questions(memory.window()) == ['question 1', 'question 2']
+
+    # The next rollover extends the previous summary
+    agent._remember(info, 'question 3', 'answer 3')
+    wait_for_summaries()
+    assert 'summary 1' in llm.prompts[1] and 'question 1' in llm.prompts[1]
+    assert memory.window()[0] == 'summary 2'
+    assert questions(memory.window()) == ['question 2', 'question 3']
+    assert memory._conn.execute('SELECT COUNT(*) FROM exchanges').fetchone()[0] == 2
+
+
+def test_failed_summaries_keep_the_exchanges(tmp_path):
+    memory = ConversationMemory(str(tmp_path), max_tokens=1000, max_exchanges=1)
+    info = bot_info(memory, StubLLM(fail=True))
+    for i in range(3):
+        agent._remember(info, f"question {i}", f"answer {i}")
+    wait_for_summaries()
+    assert memory.window()[0] == ''
+    assert memory._conn.execute('SELECT COUNT(*) FROM exchanges').fetchone()[0] == 3
+
+    llm = StubLLM()
+    agent._remember(bot_info(memory, llm), 'question 3', 'answer 3')
+    wait_for_summaries()
+    assert all(f"question {i}" in llm.prompts[0] for i in range(3))
+    assert memory.window()[0] == 'summary 1' and questions(memory.window()) == ['question 3']
+
+
+def test_clear_drops_a_summary_in_progress(tmp_path):
+    memory = ConversationMemory(str(tmp_path), max_tokens=1000, max_exchanges=1)
+    gate = threading.Event()
+    llm = StubLLM(gate=gate)
+    info = bot_info(memory, llm)
+    agent._remember(info, 'question 0', 'answer 0')
+    agent._remember(info, 'question 1', 'answer 1')
+    try:
+        assert llm.called.wait(5)
+        memory.clear()
+    finally:
+        gate.set()
+    wait_for_summaries()
+    assert not memory.has_history()
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+from modules import agent, constants
+from modules.model_registry import ModelRegistry
+
+MB = 1024 * 1024
+
+
+class FakeModel:
+    def __init__(self, name, size_mb=100):
+        self.name = name
+        self.size_mb = size_mb
+
+
+def make_registry(budget_mb=250, idle_ttl=900, sweep_interval=0):
+    registry = ModelRegistry(memory_budget_mb=budget_mb, idle_ttl=idle_ttl, sweep_interval=sweep_interval)
+    registry.loads = []
+
+    def loader(name, **options):
+        registry.loads.append(name)
+        return FakeModel(name, **options)
+
+    registry.register_loader('fake', loader, lambda model: model.size_mb * MB)
+    return registry
+
+
+def refs(registry):
+    return {model['name']: model['refs'] for model in registry.stats()['models']}
+
+
+def test_models_are_loaded_once_and_reference_counted():
+    registry = make_registry()
+    first = registry.acquire('fake', 'a')
+    assert registry.acquire('fake', 'a') is first
+    assert registry.loads == ['a'] and refs(registry) == {'a': 2}
+    registry.release('fake', 'a')
+    registry.release('fake', 'a')
+    registry.release('fake', 'a')
+    assert refs(registry) == {'a': 0}
+    assert registry.stats()['hits'] == 1
+
+
+def test_over_budget_evicts_least_recently_used_unreferenced_models():
+    registry = make_registry(budget_mb=250)
+    for name in ('a', 'b'):
+        registry.acquire('fake', name)
+        registry.release('fake', name)
+    # Using a again makes b the least recently used
+    registry.acquire('fake', 'a')
+    registry.release('fake', 'a')
+    registry.acquire('fake', 'c')
+    assert sorted(refs(registry)) == ['a', 'c']
+    assert registry.stats()['evictions'] == 1
+
+
+def test_referenced_models_are_never_evicted():
+    registry = make_registry(budget_mb=150)
+    registry.acquire('fake', 'a')
+    registry.acquire('fake', 'b')
+    assert refs(registry) == {'a': 1, 'b': 1}
+    assert registry.memory_bytes() > registry.memory_budget
+    registry.release('fake', 'a')
+    assert refs(registry) == {'b': 1}
+
+
+def test_idle_models_are_swept_without_further_calls():
+    registry = make_registry(idle_ttl=0.05, sweep_interval=0.02)
+    registry.acquire('fake', 'a')
+    registry.acquire('fake', 'b')
+    registry.release('fake', 'a')
+    deadline = time.monotonic() + 2
+    while 'a' in refs(registry) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert refs(registry) == {'b': 1}
+
+
+def test_failed_loads_leave_nothing_behind():
+    registry = make_registry()
+
+    def broken(name):
+        raise RuntimeError('no weights')
+
+    registry.register_loader('broken', broken)
+    with pytest.raises(RuntimeError):
+        registry.acquire('broken', 'x')
+    assert registry.stats()['models'] == [] and registry._load_locks == {}
+    with pytest.raises(ValueError):
+        registry.acquire('unknown', 'x')
+
+
+def test_failed_agent_load_releases_its_models(monkeypatch, tmp_path):
+    registry = ModelRegistry(memory_budget_mb=1000, idle_ttl=900, sweep_interval=0)
+    registry.register_loader('llm', lambda name: FakeModel(name))
+    registry.register_loader('reranker', lambda name, **options: FakeModel(name))
+    monkeypatch.setattr(agent, 'registry', registry)
+    monkeypatch.setattr(agent, 'get_db_dir', lambda bot_id: str(tmp_path / bot_id))
+
+    def broken_retriever(bot_id):
+        raise RuntimeError('Chroma is gone')
+
+    monkeypatch.setattr(agent, 'load_retriever', broken_retriever)
+    new_agent = agent.Agent(bot_id='bot', name='n', description='d', starter='hi',
+                            model=constants.SUPPORTED_MODELS[0])
+    with pytest.raises(RuntimeError):
+        agent.load_agent_sync(new_agent)
+    assert set(refs(registry).values()) == {0}
+    assert 'bot' not in agent.session_cache
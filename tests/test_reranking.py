@@ -0,0 +1,58 @@
+from langchain.docstore.document import Document
+
+from modules.reranking import RerankEngine, ScoreCache
+
+
+class FakeCrossEncoder:
+    """Scores a pair by the number in its passage, and remembers what it was asked."""
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls.append(list(pairs))
+        return [float(passage.split()[-1]) for _, passage in pairs]
+
+
+def docs(*scores):
+    return [Document(page_content=f"chunk {score}", metadata={'chunk_id': f"c{i}"}) for i, score in enumerate(scores)]
+
+
+def test_rerank_sorts_by_score():
+    engine = RerankEngine(FakeCrossEncoder(), 'fake', max_candidates=0, cache=None)
+    ranked = engine.rerank('q', docs(1, 5, 3))
+    assert [(doc.metadata['chunk_id'], score) for doc, score in ranked] == [('c1', 5.0), ('c2', 3.0), ('c0', 1.0)]
+    assert engine.rerank('q', []) == []
+
+
+def test_only_the_top_candidates_are_scored():
+    model = FakeCrossEncoder()
+    engine = RerankEngine(model, 'fake', max_candidates=2, cache=None)
+    ranked = engine.rerank('q', docs(1, 2, 9))
+    assert [doc.metadata['chunk_id'] for doc, _ in ranked] == ['c1', 'c0']
+    assert len(model.calls[0]) == 2
+
+
+def test_scores_are_cached_per_query_and_chunk():
+    model = FakeCrossEncoder()
+    engine = RerankEngine(model, 'fake', max_candidates=0, cache=ScoreCache(100))
+    first = engine.rerank('q', docs(1, 2))
+    assert engine.rerank('q', docs(1, 2, 3))[1:] == first
+    # Only the new chunk was scored the second time, and another query starts over
+    assert [len(pairs) for pairs in model.calls] == [2, 1]
+    engine.rerank('other q', docs(1))
+    assert [len(pairs) for pairs in model.calls] == [2, 1, 1]
+
+
+def test_score_cache_is_a_bounded_lru():
+    cache = ScoreCache(2)
+    cache.put('a', 1.0)
+    cache.put('b', 2.0)
+    assert cache.get('a') == 1.0
+    cache.put('c', 3.0)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1.0, 3.0)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    disabled = ScoreCache(0)
+    disabled.put('a', 1.0)
+    assert disabled.get('a') is None
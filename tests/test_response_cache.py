@@ -0,0 +1,89 @@
+import pytest
+
+from modules import response_cache
+from modules.response_cache import ResponseCache, mark_ingested
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(response_cache.time, 'monotonic', clock.monotonic)
+    return clock
+
+
+def make_cache(tmp_path, **options):
+    options = {'threshold': 0.95, 'ttl': 60, 'max_entries': 3, **options}
+    return ResponseCache(str(tmp_path), **options)
+
+
+def test_hits_only_above_the_similarity_threshold(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.store([1.0, 0.0, 0.0], 'answer', ['chunk-1'])
+
+    hit = cache.lookup([2.0, 0.1, 0.0])
+    assert hit['response'] == 'answer' and hit['sources'] == ['chunk-1']
+    assert hit['similarity'] == pytest.approx(0.99875, abs=1e-4)
+    # cos = 0.8, a different question
+    assert cache.lookup([0.8, 0.6, 0.0]) is None
+    assert cache.lookup([0.0, 0.0, 1.0]) is None
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 2
+
+
+def test_closest_entry_wins(tmp_path, clock):
+    cache = make_cache(tmp_path, threshold=0.5)
+    cache.store([1.0, 0.0], 'x axis', [])
+    cache.store([0.0, 1.0], 'y axis', [])
+    assert cache.lookup([0.3, 1.0])['response'] == 'y axis'
+    assert cache.lookup([1.0, 0.3])['response'] == 'x axis'
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.store([1.0, 0.0], 'answer', [])
+    clock.now += 59
+    assert cache.lookup([1.0, 0.0]) is not None
+    clock.now += 2
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache._entries == {}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.store([1.0, 0.0, 0.0], 'a', [])
+    cache.store([0.0, 1.0, 0.0], 'b', [])
+    # A hit makes 'a' the most recently used, 'b' goes first
+    assert cache.lookup([1.0, 0.0, 0.0])['response'] == 'a'
+    cache.store([0.0, 0.0, 1.0], 'c', [])
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.lookup([1.0, 0.0, 0.0])['response'] == 'a'
+    assert cache.lookup([0.0, 0.0, 1.0])['response'] == 'c'
+
+
+def test_ingest_invalidates_cached_answers(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    other = make_cache(tmp_path)
+    for each in (cache, other):
+        each.store([1.0, 0.0], 'stale', [])
+    mark_ingested(str(tmp_path))
+    # Every cache of the bot's db_dir sees the stamp, also one living in another agent or process
+    assert cache.lookup([1.0, 0.0]) is None
+    assert other.lookup([1.0, 0.0]) is None
+    assert cache.stats['invalidations'] == 1
+
+    cache.store([1.0, 0.0], 'fresh', [])
+    assert cache.lookup([1.0, 0.0])['response'] == 'fresh'
+
+
+def test_disabled_cache_keeps_nothing(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=0)
+    assert not cache.enabled
+    cache.store([1.0, 0.0], 'answer', [])
+    assert cache.lookup([1.0, 0.0]) is None
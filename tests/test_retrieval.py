@@ -0,0 +1,91 @@
+import threading
+import time
+import types
+
+import pytest
+from langchain.docstore.document import Document
+
+from modules.lexical import LexicalIndex, to_match_query
+from modules.retrieval import HybridRetriever, reciprocal_rank_fusion
+
+
+def doc(chunk_id):
+    return Document(page_content=f"text of {chunk_id}", metadata={'chunk_id': chunk_id})
+
+
+def ids(docs):
+    return [d.metadata['chunk_id'] for d in docs]
+
+
+def test_rrf_rewards_documents_ranked_well_in_both_lists():
+    dense = [doc('a'), doc('b'), doc('c')]
+    lexical = [doc('b'), doc('d')]
+    fused = reciprocal_rank_fusion([dense, lexical], k=3, rrf_k=60)
+    assert ids(d for d, _ in fused) == ['b', 'a', 'd']
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[2][1] == pytest.approx(1 / 62)
+
+
+def test_rrf_keeps_the_top_k():
+    fused = reciprocal_rank_fusion([[doc('a'), doc('b')], [doc('c')]], k=2)
+    assert ids(d for d, _ in fused) == ['a', 'c']
+
+
+@pytest.fixture
+def lexical_index(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    index.add(['part', 'mail', 'other'],
+              ['part AB-123 ships on 2024-01-05', 'write to bob@example.com NOT later', 'nothing to see'],
+              [{'chunk_id': 'part'}, {'chunk_id': 'mail'}, {'chunk_id': 'other'}])
+    return index
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('AB-123?', ['part']),
+    ('"2024-01-05"', ['part']),
+    ('bob@example.com', ['mail']),
+    ('NOT OR AND', ['mail']),
+    ('bar* NEAR(a b) col:val ^x', []),
+    ('"unterminated (paren', []),
+    ('* - + : """', []),
+])
+def test_user_text_is_never_parsed_as_fts5_syntax(lexical_index, query, expected):
+    assert ids(d for d, _ in lexical_index.search(query)) == expected
+
+
+def test_match_query_quotes_every_term_once():
+    assert to_match_query('What is AB-123? AB-123!') == '"What" OR "is" OR "AB-123"'
+    assert to_match_query('"" ...') == ''
+
+
+class FakeVectorStore:
+    def __init__(self, embed):
+        self.embeddings = types.SimpleNamespace(embed_query=embed)
+
+    def similarity_search_by_vector(self, vector, k=4):
+        return [doc('other'), doc('part')]
+
+
+def test_hybrid_fuses_dense_and_lexical(lexical_index):
+    retriever = HybridRetriever(FakeVectorStore(lambda text: [1.0]), lexical_index, k=3, mode='hybrid')
+    assert ids(retriever.get_relevant_documents('AB-123')) == ['part', 'other']
+
+
+def test_slow_dense_search_falls_back_to_lexical(lexical_index):
+    release = threading.Event()
+    retriever = HybridRetriever(FakeVectorStore(lambda text: release.wait(5) and [1.0]), lexical_index,
+                                k=3, mode='hybrid', dense_timeout=0.05)
+    start = time.perf_counter()
+    try:
+        assert ids(retriever.get_relevant_documents('AB-123')) == ['part']
+        assert time.perf_counter() - start < 1
+    finally:
+        release.set()
+
+
+def test_failed_dense_search_falls_back_to_lexical(lexical_index):
+    def down(text):
+        raise ConnectionError('embedding server down')
+
+    retriever = HybridRetriever(FakeVectorStore(down), lexical_index, k=3, mode='hybrid')
+    assert ids(retriever.get_relevant_documents('bob@example.com')) == ['mail']
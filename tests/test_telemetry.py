@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from langchain_ollama import OllamaLLM
+
+from modules import telemetry
+
+RESPONSES = [
+    {'model': 'llama3', 'response': 'Hello', 'done': False},
+    {'model': 'llama3', 'response': ' there', 'done': False},
+    {'model': 'llama3', 'response': '', 'done': True, 'prompt_eval_count': 7, 'eval_count': 2,
+     'eval_duration': 500_000_000},
+]
+
+
+class ScriptedOllama(OllamaLLM):
+    """The real OllamaLLM client, with the server's responses played back."""
+    def _create_generate_stream(self, prompt, stop=None, **kwargs):
+        yield from RESPONSES
+
+    async def _acreate_generate_stream(self, prompt, stop=None, **kwargs):
+        for response in RESPONSES:
+            yield response
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setattr(telemetry, 'enabled', True)
+    monkeypatch.setattr(telemetry, 'metrics', telemetry.Metrics())
+    return telemetry.metrics
+
+
+def completion_tokens(metrics):
+    return metrics._counters.get('rag_llm_completion_tokens_total', {}).get((('model', 'llama3'),), 0)
+
+
+def test_streamed_answers_record_ollama_token_counts(metrics):
+    llm = ScriptedOllama(model='llama3', callbacks=[telemetry.ollama_token_callback()])
+
+    async def stream():
+        return [token async for token in llm.astream('hi')]
+
+    assert ''.join(asyncio.run(stream())) == 'Hello there'
+    assert completion_tokens(metrics) == 2
+    assert metrics._counters['rag_llm_prompt_tokens_total'][(('model', 'llama3'),)] == 7
+    histogram = metrics._histograms['rag_llm_tokens_per_second'][(('model', 'llama3'),)]
+    assert histogram.count == 1 and histogram.sum == pytest.approx(4.0)
+
+
+def test_invoked_prompts_are_counted_once(metrics):
+    llm = ScriptedOllama(model='llama3', callbacks=[telemetry.ollama_token_callback()])
+    assert llm.invoke('hi') == 'Hello there'
+    assert completion_tokens(metrics) == 2
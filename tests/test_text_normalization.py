@@ -0,0 +1,75 @@
+import re
+from datetime import datetime
+
+import pytest
+
+from modules.text_normalization import PAGE_SEPARATOR, TextNormalizer, clean_texts
+from modules.utils import clean_text
+
+
+def original_clean_text(text: str) -> str:
+    # clean_text as it was before TextNormalizer, kept as the reference
+    text = text.lower()
+    text = re.sub(r'[^\w\s\'\".,?@:/]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    dates = re.findall(r'\d{1,2}/\d{1,2}/\d{4}', text)
+    for date in dates:
+        standardized_date = datetime.strptime(date, '%m/%d/%Y').strftime('%Y-%m-%d')
+        text = text.replace(date, standardized_date)
+    return text
+
+
+SAMPLES = [
+    '',
+    '   \n\t ',
+    'Attention Is All You Need!',
+    'Signed on 03/14/2021, due 1/2/2022 and again on 12/31/1999.',
+    'Same date twice: 7/4/1776 and 7/4/1776.',
+    'Dates at the edges 5/6/2020',
+    '1/1/2000 opens the page',
+    'Dates glued to words: on5/6/2020, (5/6/2020) and 5/6/2020.',
+    'A hyphenated state-of-the-art model, a well–known en dash — and an em dash.',
+    'Line-break hyphen-\nation inside trans-\r\nformer.',
+    'Tabs\tand\nnewlines\r\nand\x0bvertical\x0cform feeds',
+    'Non-breaking\xa0space, em\u2003space and line\u2028separator',
+    'Keep "quotes", \'apostrophes\', e-mail@example.com: http://x.io/a?b.',
+    'Drop #hash, $dollar, 100% (parens) [brackets] {braces} & ampersand * star.',
+    'Ünïcödé Straße ÇA VA, 東京 ١٢٣',
+    'Underscores_are_word_chars and digits 3.14159',
+    'Fractions like 1/2 or 10/20/30 are not dates',
+]
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_clean_text_matches_the_original(text):
+    assert clean_text(text) == original_clean_text(text)
+
+
+def test_batched_cleaning_matches_the_original():
+    assert clean_texts(SAMPLES) == [original_clean_text(text) for text in SAMPLES]
+    # Long pages take the per-page path
+    pages = [text * 500 for text in SAMPLES]
+    assert clean_texts(pages) == [original_clean_text(text) for text in pages]
+
+
+def test_differences_from_the_original():
+    # The original failed on impossible dates, they are now kept as written
+    with pytest.raises(ValueError):
+        original_clean_text('due 13/45/2020')
+    assert clean_text('due 13/45/2020') == 'due 13/45/2020'
+    # and rewrote a short date inside a longer one it had already replaced
+    assert original_clean_text('1/2/2020 and 11/2/2020') == '2020-01-02 and 12020-01-02'
+    assert clean_text('1/2/2020 and 11/2/2020') == '2020-01-02 and 2020-11-02'
+
+
+def test_separator_cannot_split_a_page():
+    assert clean_text(f"a{PAGE_SEPARATOR}b") == 'ab'
+    assert clean_texts([f"a{PAGE_SEPARATOR}b", 'c']) == ['ab', 'c']
+
+
+def test_rules_can_be_switched_off():
+    normalizer = TextNormalizer(lowercase=False, strip_symbols=False, collapse_whitespace=False, iso_dates=False)
+    text = ' Keep  ALL #of it 1/2/2020 '
+    assert normalizer(text) == text
+    assert normalizer.normalize_many([text, text]) == [text, text]
+    assert TextNormalizer(iso_dates=False)('On 1/2/2020') == 'on 1/2/2020'
@@ -0,0 +1,28 @@
+import os
+
+from modules.text_normalization import DEFAULT_NORMALIZER, NORMALIZERS, TextNormalizer, set_normalizer
+from modules.utils import iter_documents
+
+
+class CrashingNormalizer(TextNormalizer):
+    """Kills the loading process on files containing CRASH, like a segfault in a native parser."""
+    def normalize_many(self, texts):
+        if any('CRASH' in text for text in texts):
+            os._exit(1)
+        return super().normalize_many(texts)
+
+
+def test_a_file_killing_its_worker_does_not_abort_the_batch(tmp_path):
+    paths = []
+    for i in range(12):
+        path = tmp_path / f"{i}.txt"
+        path.write_text('CRASH' if i == 1 else f"file {i}", encoding='utf-8')
+        paths.append(str(path))
+    set_normalizer('.txt', CrashingNormalizer())
+    try:
+        loaded = dict(iter_documents(paths, workers=2))
+    finally:
+        NORMALIZERS['.txt'] = DEFAULT_NORMALIZER
+
+    assert sorted(loaded) == sorted(paths[:1] + paths[2:])
+    assert [doc.page_content for doc in loaded[paths[11]]] == ['file 11']
@@ -0,0 +1,126 @@
+import os
+
+import pytest
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+
+from modules import constants, vector_store
+from modules.chunk_store import get_chunk_store
+from modules.lexical import LexicalIndex
+from modules.manifest import Manifest
+from modules.vector_store import TenantStore, close_client, migrate_bot, shard_dir, shard_for
+
+
+class FakeEmbeddings(Embeddings):
+    """Three dimensional vectors from a few keywords, named like an Ollama model."""
+    KEYWORDS = ('cat', 'dog', 'fish')
+
+    def __init__(self, model='fake-embed'):
+        self.model = model
+
+    def embed_query(self, text):
+        return [float(text.count(word)) + 0.01 for word in self.KEYWORDS]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(constants, 'VECTOR_STORE_DIR', str(tmp_path / 'vector_store'))
+    monkeypatch.setattr(constants, 'VECTOR_STORE_SHARDS', 1)
+    monkeypatch.setattr(constants, 'VECTOR_STORE_MODE', 'shared')
+    yield
+    for path in list(vector_store._clients):
+        if path.startswith(str(tmp_path)):
+            close_client(path)
+
+
+def texts_of(documents):
+    return sorted(doc.page_content for doc in documents)
+
+
+def test_shard_for_is_stable_and_in_range():
+    bots = [f"bot-{i}" for i in range(200)]
+    shards = [shard_for(bot_id, 8) for bot_id in bots]
+    assert shards == [shard_for(bot_id, 8) for bot_id in bots]
+    assert set(shards) == set(range(8))
+    assert shard_for('bot-1', 1) == 0
+
+
+def test_shard_dir_uses_the_configured_directory(stores):
+    assert shard_dir(3) == os.path.join(constants.VECTOR_STORE_DIR, 'shard_003')
+    store = TenantStore('bot-a')
+    assert store.path == shard_dir(0) and store.filter == {'bot_id': 'bot-a'}
+
+
+def test_bots_sharing_a_shard_only_see_their_own_chunks(stores):
+    embeddings = FakeEmbeddings()
+    a = TenantStore('bot-a', embeddings)
+    b = TenantStore('bot-b', embeddings)
+    assert a.path == b.path
+
+    a.add([Document(page_content='a cat'), Document(page_content='a dog')], ids=[a.scoped_id('1'), a.scoped_id('2')])
+    # Same chunk ids, kept apart by the bot prefix
+    b.add([Document(page_content='b cat'), Document(page_content='b fish')], ids=[b.scoped_id('1'), b.scoped_id('2')],
+          embeddings=embeddings.embed_documents(['b cat', 'b fish']))
+
+    assert texts_of(a.similarity_search_by_vector(embeddings.embed_query('cat'), k=10)) == ['a cat', 'a dog']
+    assert texts_of(b.similarity_search_by_vector(embeddings.embed_query('cat'), k=10)) == ['b cat', 'b fish']
+    page = b.get_page(include=['metadatas'], limit=10)
+    assert sorted(page['ids']) == ['bot-b:1', 'bot-b:2']
+    assert {metadata['bot_id'] for metadata in page['metadatas']} == {'bot-b'}
+
+    b.delete([b.scoped_id('1')])
+    assert texts_of(a.similarity_search_by_vector(embeddings.embed_query('cat'), k=10)) == ['a cat', 'a dog']
+    assert texts_of(b.similarity_search_by_vector(embeddings.embed_query('cat'), k=10)) == ['b fish']
+
+
+def test_chunk_ids_are_prefixed_in_shared_mode_only(stores):
+    assert TenantStore('bot-a', mode='per_bot').scoped_id('1') == '1'
+    shared = TenantStore('bot-a')
+    assert shared.scoped_id('1') == 'bot-a:1'
+    assert shared.scoped_id('bot-a:1') == 'bot-a:1'
+
+
+def test_a_collection_refuses_vectors_of_another_model(stores):
+    TenantStore('bot-a', FakeEmbeddings('model-1'))
+    TenantStore('bot-b', FakeEmbeddings('model-1'))
+    with pytest.raises(ValueError, match="embedded with 'model-1'"):
+        TenantStore('bot-c', FakeEmbeddings('model-2'))
+
+
+def test_migrate_copies_a_per_bot_db_into_its_shard(stores):
+    embeddings = FakeEmbeddings()
+    db_dir = vector_store.get_db_dir('bot-a')
+    old = TenantStore('bot-a', embeddings, mode='per_bot')
+    texts = ['old cat', 'old dog', 'old fish']
+    metadatas = [{'source': f"{i}.txt", 'chunk_id': str(i)} for i in range(3)]
+    old.add([Document(page_content=text, metadata=dict(metadata)) for text, metadata in zip(texts, metadatas)],
+            ids=['0', '1', '2'])
+    LexicalIndex(db_dir).add(['0', '1', '2'], texts, metadatas)
+    get_chunk_store(db_dir).append(['0', '1', '2'], texts, metadatas)
+    manifest = Manifest(db_dir)
+    manifest.seed('notes.txt', ['0', '1', '2'])
+    manifest.save()
+    # Another bot already in the shard is left alone
+    TenantStore('bot-b', embeddings).add([Document(page_content='b cat')], ids=['bot-b:0'])
+
+    assert migrate_bot('bot-a', batch_size=2) == 3
+    assert migrate_bot('bot-a') == 3
+
+    new = TenantStore('bot-a', embeddings)
+    assert texts_of(new.similarity_search_by_vector(embeddings.embed_query('cat'), k=10)) == texts
+    stored = new.get(['bot-a:0'], include=['embeddings', 'metadatas'])
+    assert list(stored['embeddings'][0]) == pytest.approx(embeddings.embed_query('old cat'))
+    assert stored['metadatas'][0]['chunk_id'] == 'bot-a:0'
+    assert Manifest(db_dir).chunk_ids('notes.txt') == ['bot-a:0', 'bot-a:1', 'bot-a:2']
+    assert get_chunk_store(db_dir).get(['bot-a:1', '1']) == ['old dog', None]
+    assert [doc.metadata['chunk_id'] for doc, _ in LexicalIndex(db_dir).search('dog')] == ['bot-a:1']
+    assert texts_of(TenantStore('bot-b', embeddings).similarity_search_by_vector([1, 0, 0], k=10)) == ['b cat']
+
+    migrate_bot('bot-a', delete_old=True)
+    assert not vector_store.has_per_bot_db('bot-a')
+    assert migrate_bot('bot-a') == 0
+    assert os.path.exists(os.path.join(db_dir, 'chunks.bin'))